@@ -1,10 +1,25 @@
 from django.contrib import admin
-from .models import Symptom, Disease, Diagnosis, DiagnosisSymptom
+from .models import (
+    Symptom, Disease, Diagnosis, DiagnosisSymptom, DiagnosisArtifact, DiagnosisDailyStats, DiagnosisFeedback,
+    DiagnosisFeedbackStats, ModelVersion
+)
 
 
 class DiagnosisSymptomInline(admin.TabularInline):
     model = DiagnosisSymptom
     extra = 0
+    # Diagnosis.symptom_mask is derived from these rows when the diagnosis is saved
+    readonly_fields = ('symptom', 'is_present')
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class DiagnosisArtifactInline(admin.TabularInline):
+    model = DiagnosisArtifact
+    extra = 0
+    readonly_fields = ('kind', 'path', 'content_hash', 'size', 'status', 'created_at', 'updated_at')
 
 
 @admin.register(Symptom)
@@ -25,12 +40,61 @@ class DiagnosisAdmin(admin.ModelAdmin):
     list_filter = ('created_at', 'primary_disease')
     search_fields = ('user__username', 'primary_disease__name')
     date_hierarchy = 'created_at'
-    inlines = [DiagnosisSymptomInline]
-    readonly_fields = ('created_at', 'prediction_data')
+    inlines = [DiagnosisSymptomInline, DiagnosisArtifactInline]
+    exclude = ('packed_prediction',)
+    readonly_fields = ('created_at', 'model_version', 'prediction_data', 'result')
+
+
+@admin.register(ModelVersion)
+class ModelVersionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'digest', 'created_at')
+    search_fields = ('name', 'digest')
+    readonly_fields = ('digest', 'created_at')
 
 
 @admin.register(DiagnosisSymptom)
 class DiagnosisSymptomAdmin(admin.ModelAdmin):
     list_display = ('diagnosis', 'symptom', 'is_present')
     list_filter = ('is_present', 'symptom')
-    search_fields = ('diagnosis__id', 'symptom__name')
\ No newline at end of file
+    search_fields = ('diagnosis__id', 'symptom__name')
+
+    # View only, like the inline: edits would not reach Diagnosis.symptom_mask
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DiagnosisArtifact)
+class DiagnosisArtifactAdmin(admin.ModelAdmin):
+    list_display = ('diagnosis', 'kind', 'status', 'size', 'created_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('diagnosis__id', 'content_hash', 'path')
+
+
+@admin.register(DiagnosisFeedback)
+class DiagnosisFeedbackAdmin(admin.ModelAdmin):
+    list_display = ('diagnosis', 'user', 'accuracy_rating', 'created_at')
+    list_filter = ('accuracy_rating', 'created_at')
+    search_fields = ('diagnosis__id', 'user__username', 'comments')
+    raw_id_fields = ('diagnosis',)
+
+
+@admin.register(DiagnosisFeedbackStats)
+class DiagnosisFeedbackStatsAdmin(admin.ModelAdmin):
+    list_display = ('disease', 'model_version', 'feedback_count', 'average_rating', 'updated_at')
+    list_filter = ('model_version',)
+    readonly_fields = ('feedback_count', 'rating_total', 'updated_at')
+
+
+@admin.register(DiagnosisDailyStats)
+class DiagnosisDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'disease', 'model_version', 'diagnosis_count', 'mean_confidence', 'mean_uncertainty')
+    list_filter = ('disease', 'model_version')
+    date_hierarchy = 'date'
+    readonly_fields = ('diagnosis_count', 'confidence_total', 'uncertainty_total', 'updated_at')
+
@@ -1,7 +1,12 @@
 # ai_model/api/serializers.py
 from rest_framework import serializers
-from ..models import Symptom, Disease, Diagnosis, DiagnosisSymptom
+from ..models import (
+    Symptom, Disease, Diagnosis, DiagnosisSymptom, DiagnosisArtifact, DiagnosisDailyStats, DiagnosisFeedbackStats
+)
+from ..services import CHART_ARTIFACT_KINDS, refresh_artifact
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.urls import reverse
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -31,29 +36,92 @@ class DiagnosisSymptomSerializer(serializers.ModelSerializer):
         fields = ['symptom', 'symptom_name', 'is_present']
 
 
+def artifact_url(artifact, request=None):
+    """
+    URL of a stored artifact (charts go through the chart view, audio is a media file)
+    """
+    if artifact.kind in CHART_ARTIFACT_KINDS:
+        url = reverse('diagnosis-chart', args=[artifact.content_hash])
+    else:
+        url = settings.MEDIA_URL + artifact.path
+    return request.build_absolute_uri(url) if request else url
+
+
+class DiagnosisArtifactSerializer(serializers.ModelSerializer):
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DiagnosisArtifact
+        fields = ['kind', 'url', 'content_hash', 'size', 'status']
+
+    def to_representation(self, instance):
+        return super().to_representation(refresh_artifact(instance))
+
+    def get_url(self, obj):
+        if obj.status == 'failed':
+            return None
+        return artifact_url(obj, self.context.get('request'))
+
+
 class DiagnosisSerializer(serializers.ModelSerializer):
     symptoms = DiagnosisSymptomSerializer(source='diagnosissymptom_set', many=True, read_only=True)
     disease_name = serializers.CharField(source='primary_disease.name', read_only=True)
+    # Expanded from the packed arrays, in the format returned by the diagnose endpoint.
+    # Read-only: results come from the model and are packed against its diseases.
+    prediction_data = serializers.JSONField(source='result', read_only=True)
     user_details = UserSerializer(source='user', read_only=True)
+    artifacts = DiagnosisArtifactSerializer(many=True, read_only=True)
     chart_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Diagnosis
         fields = ['id', 'created_at', 'primary_disease', 'disease_name',
-                  'symptoms', 'prediction_data', 'user', 'user_details', 'chart_url']
-        read_only_fields = ['id', 'created_at', 'user_details', 'chart_url']
+                  'symptoms', 'prediction_data', 'user', 'user_details', 'artifacts', 'chart_url']
+        read_only_fields = ['id', 'created_at', 'user_details', 'artifacts', 'chart_url']
 
     def get_chart_url(self, obj):
-        # Logic để lấy URL của biểu đồ (nếu có)
-        if hasattr(obj, 'chart_path') and obj.chart_path:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.chart_path)
+        # Uses the prefetched artifacts, so listing diagnoses adds no query per row
+        for artifact in obj.artifacts.all():
+            if artifact.kind == 'chart':
+                return artifact_url(artifact, self.context.get('request'))
         return None
 
 
+class DiagnosisFeedbackStatsSerializer(serializers.ModelSerializer):
+    disease_name = serializers.CharField(source='disease.name', read_only=True)
+    model_version_name = serializers.CharField(source='model_version.name', read_only=True, default=None)
+    average_rating = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = DiagnosisFeedbackStats
+        fields = ['disease', 'disease_name', 'model_version', 'model_version_name',
+                  'feedback_count', 'average_rating', 'updated_at']
+
+
+class DiagnosisDailyStatsSerializer(serializers.ModelSerializer):
+    disease_name = serializers.CharField(source='disease.name', read_only=True)
+    model_version_name = serializers.CharField(source='model_version.name', read_only=True, default=None)
+    mean_confidence = serializers.FloatField(read_only=True)
+    mean_uncertainty = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = DiagnosisDailyStats
+        fields = ['date', 'disease', 'disease_name', 'model_version', 'model_version_name',
+                  'diagnosis_count', 'mean_confidence', 'mean_uncertainty']
+
+
 class DiagnosisInputSerializer(serializers.Serializer):
     symptom_values = serializers.ListField(
         child=serializers.IntegerField(min_value=0, max_value=1),
         help_text="List of binary values (0 or 1) for each symptom"
-    )
\ No newline at end of file
+    )
+
+
+class DiagnosisBatchInputSerializer(serializers.Serializer):
+    # Items are validated one by one in the view so each gets its own errors
+    items = serializers.ListField(
+        child=serializers.JSONField(),
+        allow_empty=False,
+        max_length=getattr(settings, 'AI_MODEL_BATCH_API_MAX_ITEMS', 1000),
+        help_text="List of symptom value lists, each in the same format as symptom_values"
+    )
@@ -1,32 +1,35 @@
 # ai_model/api/urls.py
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
-from .views import SymptomViewSet, DiseaseViewSet, DiagnosisViewSet
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework import permissions
+from .views import (
+    SymptomViewSet, DiseaseViewSet, DiagnosisViewSet, DiagnosisDailyStatsViewSet, DiagnosisFeedbackStatsViewSet,
+    ModelMetricsViewSet
+)
+from ..views import chart_image
+from healthcare.schema import LazySchemaView
 
-# Schema view for API documentation
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Health Assistant API",
-      default_version='v1',
-      description="REST API for AI Health Assistant",
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="contact@example.com"),
-      license=openapi.License(name="MIT License"),
-   ),
-   public=True,
-   permission_classes=[permissions.AllowAny],
+# Schema view for API documentation (built on first request)
+schema_view = LazySchemaView(
+   title="Health Assistant API",
+   default_version='v1',
+   description="REST API for AI Health Assistant",
+   terms_of_service="https://www.google.com/policies/terms/",
+   contact_email="contact@example.com",
+   license_name="MIT License",
 )
 
 router = DefaultRouter()
 router.register(r'symptoms', SymptomViewSet, basename='symptom')
 router.register(r'diseases', DiseaseViewSet, basename='disease')
 router.register(r'diagnoses', DiagnosisViewSet, basename='diagnosis')
+router.register(r'feedback-stats', DiagnosisFeedbackStatsViewSet, basename='feedback-stats')
+router.register(r'diagnosis-stats', DiagnosisDailyStatsViewSet, basename='diagnosis-stats')
+router.register(r'model-metrics', ModelMetricsViewSet, basename='model-metrics')
 
 urlpatterns = [
     path('', include(router.urls)),
+    # Content-addressed chart images
+    re_path(r'^charts/(?P<key>[0-9a-f]{64})\.png$', chart_image, name='diagnosis-chart'),
     # Swagger documentation
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
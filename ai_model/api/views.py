@@ -1,16 +1,23 @@
 # ai_model/api/views.py
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from ..models import Symptom, Disease, Diagnosis, DiagnosisSymptom
+from ..models import Symptom, Disease, Diagnosis, DiagnosisDailyStats, DiagnosisFeedbackStats
 from .serializers import (
-    SymptomSerializer, DiseaseSerializer, DiagnosisSerializer,
-    DiagnosisInputSerializer
+    SymptomSerializer, DiseaseSerializer, DiagnosisSerializer, DiagnosisDailyStatsSerializer,
+    DiagnosisFeedbackStatsSerializer,
+    DiagnosisInputSerializer, DiagnosisBatchInputSerializer
 )
-from ..ml.prediction import get_diagnosis
-from ..ml.model_builder import load_trained_model
-from ..ml.visualizer import create_diagnosis_chart, save_diagnosis_chart
+from ..ml.prediction import get_batcher_stats, get_diagnosis, diagnose_batch
+from ..ml.model_builder import get_registry_stats, load_trained_model, ModelNotAvailable
+from ..ml.chart_store import diagnosis_chart_keys
+from ..services import chart_artifacts, filter_by_symptoms, save_artifacts, save_diagnosis, save_diagnoses
+from django.conf import settings
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from healthcare.pagination import CreatedAtPagination
+from datetime import timedelta
 import uuid
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -55,18 +62,106 @@ class DiseaseViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.AllowAny]
 
 
+class DiagnosisFeedbackStatsViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint with the feedback rating totals per disease and model version (staff only).
+    """
+    serializer_class = DiagnosisFeedbackStatsSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def get_queryset(self):
+        queryset = DiagnosisFeedbackStats.objects.select_related('disease', 'model_version').order_by('disease__name', 'id')
+        disease = self.request.query_params.get('disease')
+        if disease:
+            queryset = queryset.filter(disease__name__iexact=disease)
+        return queryset
+
+
+class DiagnosisDailyStatsViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint with diagnoses per day, disease and model version (staff only).
+
+    Reads the rollup table for a bounded date window: ?since=YYYY-MM-DD&until=YYYY-MM-DD
+    (the last AI_MODEL_STATS_DEFAULT_DAYS days by default), optionally narrowed
+    with ?disease=<name> and ?model_version=<id>.
+    """
+    serializer_class = DiagnosisDailyStatsSerializer
+    permission_classes = [permissions.IsAdminUser]
+    # The window bounds the response size
+    pagination_class = None
+
+    def _date_param(self, name, default):
+        value = self.request.query_params.get(name)
+        if not value:
+            return default
+        date = parse_date(value)
+        if date is None:
+            raise ValidationError({name: "Expected a date (YYYY-MM-DD)."})
+        return date
+
+    def get_queryset(self):
+        until = self._date_param('until', timezone.localdate())
+        default_days = getattr(settings, 'AI_MODEL_STATS_DEFAULT_DAYS', 30)
+        since = self._date_param('since', until - timedelta(days=default_days - 1))
+        max_days = getattr(settings, 'AI_MODEL_STATS_MAX_DAYS', 366)
+        if since > until or (until - since).days >= max_days:
+            raise ValidationError({"since": f"The date window must be 1 to {max_days} days."})
+
+        queryset = DiagnosisDailyStats.objects.filter(date__range=(since, until)).select_related(
+            'disease', 'model_version'
+        ).order_by('date', 'disease__name', 'model_version_id')
+
+        disease = self.request.query_params.get('disease')
+        if disease:
+            queryset = queryset.filter(disease__name__iexact=disease)
+        model_version = self.request.query_params.get('model_version')
+        if model_version:
+            queryset = queryset.filter(model_version_id=model_version)
+        return queryset
+
+
+class ModelMetricsViewSet(viewsets.ViewSet):
+    """
+    API endpoint with the inference metrics of the worker process that answers (staff only).
+
+    Each server process batches on its own, so successive requests may report
+    different workers.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def list(self, request):
+        return Response({"batcher": get_batcher_stats(), "registries": get_registry_stats()})
+
+
 class DiagnosisViewSet(viewsets.ModelViewSet):
     """
     API endpoint that allows diagnoses to be viewed or edited.
     """
     serializer_class = DiagnosisSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
+    pagination_class = CreatedAtPagination
 
     def get_queryset(self):
         """
         This view returns a list of all diagnoses for the currently authenticated user.
+
+        The list can be narrowed by symptom combination with comma-separated
+        names: ?has_symptoms=Fever,Cough&lacks_symptoms=Chills
         """
-        return Diagnosis.objects.filter(user=self.request.user).order_by('-created_at')
+        queryset = Diagnosis.objects.filter(user=self.request.user).prefetch_related('artifacts').order_by('-created_at', '-id')
+
+        present = self._symptom_names('has_symptoms')
+        absent = self._symptom_names('lacks_symptoms')
+        if present or absent:
+            try:
+                queryset = filter_by_symptoms(queryset, present, absent)
+            except ValueError as e:
+                raise ValidationError({"symptoms": str(e)})
+        return queryset
+
+    def _symptom_names(self, param):
+        value = self.request.query_params.get(param, '')
+        return [name.strip() for name in value.split(',') if name.strip()]
 
     @swagger_auto_schema(
         operation_summary="Create a new diagnosis",
@@ -105,42 +200,12 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
 
             # Create diagnosis object if user is authenticated
             if request.user.is_authenticated:
-                # Get or create disease
-                disease, _ = Disease.objects.get_or_create(
-                    name=result["diagnosis"],
-                    defaults={
-                        'test_recommendation': result["test_recommendation"],
-                        'medicine_recommendation': result["medicine_recommendation"]
-                    }
-                )
-
-                # Create diagnosis
-                diagnosis = Diagnosis.objects.create(
-                    user=request.user,
-                    primary_disease=disease,
-                    prediction_data=result
-                )
+                # Diagnosis and symptom rows in one transaction
+                diagnosis = save_diagnosis(request.user, symptoms, symptom_values, result, metadata)
 
-                # Create symptom relationships
-                for i, symptom_name in enumerate(symptoms):
-                    if i < len(symptom_values):
-                        symptom, _ = Symptom.objects.get_or_create(name=symptom_name)
-                        DiagnosisSymptom.objects.create(
-                            diagnosis=diagnosis,
-                            symptom=symptom,
-                            is_present=bool(symptom_values[i])
-                        )
-
-                # Generate chart
-                diseases = list(result["probabilities"].keys())
-                probabilities = list(result["probabilities"].values())
-                uncertainties = list(result["uncertainties"].values())
-
-                chart_filename = f"diagnosis_{diagnosis.id}_{timezone.now().strftime('%Y%m%d%H%M%S')}.png"
-                chart_path = save_diagnosis_chart(diseases, probabilities, uncertainties, chart_filename)
-
-                diagnosis.chart_path = chart_path
-                diagnosis.save()
+                # Queue the charts (shared with every diagnosis that plots the same data)
+                chart_keys = diagnosis_chart_keys(result, symptoms, symptom_values)
+                save_artifacts(chart_artifacts(diagnosis, chart_keys))
 
                 serializer = self.get_serializer(diagnosis)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -148,8 +213,101 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
             # For anonymous users, just return the result
             return Response(result, status=status.HTTP_200_OK)
 
+        except ModelNotAvailable as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
         except Exception as e:
             return Response(
                 {"error": str(e)},
                 status=status.HTTP_400_BAD_REQUEST
-            )
\ No newline at end of file
+            )
+
+    @swagger_auto_schema(
+        operation_summary="Diagnose a batch of symptom lists",
+        operation_description="Score many symptom lists in one call. Results are returned in input order; "
+                              "invalid items get an 'errors' entry instead of a result.",
+        request_body=DiagnosisBatchInputSerializer,
+        responses={
+            200: 'Batch processed',
+            400: 'Bad request'
+        }
+    )
+    @action(detail=False, methods=['post'], url_path='batch', permission_classes=[permissions.AllowAny])
+    def batch_diagnose(self, request):
+        """
+        Perform diagnosis for many symptom lists at once.
+        """
+        serializer = DiagnosisBatchInputSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        items = serializer.validated_data['items']
+        results = [None] * len(items)
+
+        try:
+            # Get model metadata
+            _, metadata = load_trained_model()
+            symptoms = metadata.get("symptoms", [])
+
+            # Validate each item on its own so one bad row doesn't reject the batch
+            valid = []
+            for index, item in enumerate(items):
+                item_serializer = DiagnosisInputSerializer(data={'symptom_values': item})
+                if not item_serializer.is_valid():
+                    results[index] = {'index': index, 'errors': item_serializer.errors}
+                    continue
+
+                symptom_values = item_serializer.validated_data['symptom_values']
+                if len(symptom_values) != len(symptoms):
+                    results[index] = {
+                        'index': index,
+                        'errors': {
+                            'symptom_values': [f"Expected {len(symptoms)} symptom values, got {len(symptom_values)}"]
+                        }
+                    }
+                    continue
+
+                valid.append((index, symptom_values))
+
+            # Score in vectorized chunks
+            chunk_size = getattr(settings, 'AI_MODEL_BATCH_API_CHUNK_SIZE', 64)
+            scored = []
+            for start in range(0, len(valid), chunk_size):
+                chunk = valid[start:start + chunk_size]
+                chunk_results = diagnose_batch([symptom_values for _, symptom_values in chunk])
+                scored.extend(zip(chunk, chunk_results))
+
+            # Save diagnoses if user is authenticated
+            diagnoses = [None] * len(scored)
+            if request.user.is_authenticated and scored:
+                diagnoses = save_diagnoses(
+                    request.user,
+                    symptoms,
+                    [(symptom_values, result) for (_, symptom_values), result in scored],
+                    metadata
+                )
+
+            for ((index, _), result), diagnosis in zip(scored, diagnoses):
+                results[index] = {'index': index, 'result': result}
+                if diagnosis is not None:
+                    results[index]['diagnosis_id'] = diagnosis.id
+
+            return Response({
+                'count': len(results),
+                'error_count': len(results) - len(scored),
+                'results': results
+            }, status=status.HTTP_200_OK)
+
+        except ModelNotAvailable as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        except ValueError as e:
+            # Input the model rejected; anything else is a server error, not the client's
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
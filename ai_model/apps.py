@@ -1,6 +1,9 @@
 from django.apps import AppConfig
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 
 class AiModelConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
@@ -12,10 +15,15 @@ class AiModelConfig(AppConfig):
         from .ml import model_builder
 
         # Create the model directory if it doesn't exist
-        model_path = os.path.join(os.path.dirname(__file__), 'ml', 'saved_models')
-        os.makedirs(model_path, exist_ok=True)
+        os.makedirs(model_builder.get_model_root(), exist_ok=True)
+
+        # Training is done offline; only report a missing model here
+        if not model_builder.model_available():
+            logger.error(
+                "No model for the %s engine in %s, run 'python manage.py train_model' "
+                "(or 'export_numpy_model' for the NumPy engines) before serving diagnoses",
+                model_builder.get_engine(), model_builder.get_model_dir()
+            )
 
-        # Check if model exists, otherwise train and save it
-        model_file = os.path.join(model_path, 'health_model.h5')
-        if not os.path.exists(model_file):
-            model_builder.train_and_save_model()
\ No newline at end of file
+        # Warm-up runs from the gunicorn hooks (gunicorn.conf.py), not here: ready()
+        # also runs for migrate, shell, tests and every other management command
@@ -0,0 +1,141 @@
+import threading
+import time
+
+from django.conf import settings
+
+from .packing import VERSION_FIELDS, model_version_digest
+
+# name -> primary key of the Symptom and Disease rows, per process
+_symptom_ids = {}
+_disease_ids = {}
+# metadata digest -> ModelVersion id, and id -> ModelVersion (rows never change)
+_model_version_ids = {}
+_model_versions = {}
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+def clear_catalog():
+    """
+    Forget the cached ids (connected to the save/delete signals of Symptom, Disease and ModelVersion)
+    """
+    with _lock:
+        _symptom_ids.clear()
+        _disease_ids.clear()
+        _model_version_ids.clear()
+        _model_versions.clear()
+
+
+def _check_expiry():
+    # Signals only reach the process that saved; the TTL bounds how long other
+    # workers keep ids of renamed or deleted rows
+    global _loaded_at
+    ttl = getattr(settings, 'AI_MODEL_CATALOG_TTL', 300)
+    now = time.monotonic()
+    if now - _loaded_at > ttl:
+        clear_catalog()
+        with _lock:
+            _loaded_at = now
+
+
+def get_symptom_ids(names):
+    """
+    Primary keys of the named symptoms, creating missing ones
+
+    Args:
+        names: Symptom names
+
+    Returns:
+        ids: List of Symptom ids in the order of names
+    """
+    from .models import Symptom
+
+    _check_expiry()
+    missing = [name for name in names if name not in _symptom_ids]
+    if missing:
+        found = {}
+        for symptom_id, name in Symptom.objects.filter(name__in=missing).order_by('-id').values_list('id', 'name'):
+            # Lowest id wins if a name is duplicated
+            found[name] = symptom_id
+        for name in missing:
+            if name not in found:
+                found[name] = Symptom.objects.get_or_create(name=name)[0].id
+        with _lock:
+            _symptom_ids.update(found)
+
+    return [_symptom_ids[name] for name in names]
+
+
+def get_disease_id(name, defaults=None):
+    """
+    Primary key of the named disease, creating it with defaults if missing
+
+    Args:
+        name: Disease name
+        defaults: Field values used if the disease has to be created
+
+    Returns:
+        id: Disease id
+    """
+    from .models import Disease
+
+    _check_expiry()
+    disease_id = _disease_ids.get(name)
+    if disease_id is None:
+        disease = Disease.objects.filter(name=name).order_by('id').first()
+        if disease is None:
+            disease = Disease.objects.create(name=name, **(defaults or {}))
+        disease_id = disease.id
+        with _lock:
+            _disease_ids[name] = disease_id
+    return disease_id
+
+
+def get_model_version_id(metadata):
+    """
+    Primary key of the ModelVersion matching the model metadata, creating it if missing
+
+    Args:
+        metadata: Dictionary with model metadata
+
+    Returns:
+        id: ModelVersion id
+    """
+    from .models import ModelVersion
+
+    _check_expiry()
+    digest = model_version_digest(metadata)
+    version_id = _model_version_ids.get(digest)
+    if version_id is None:
+        version, _ = ModelVersion.objects.get_or_create(
+            digest=digest,
+            defaults=dict(
+                {field: metadata[field] for field in VERSION_FIELDS},
+                name=metadata.get('version') or ''
+            )
+        )
+        version_id = version.id
+        with _lock:
+            _model_version_ids[digest] = version_id
+            _model_versions[version_id] = version
+    return version_id
+
+
+def get_model_version(version_id):
+    """
+    ModelVersion by primary key, read from the database once per process
+
+    Args:
+        version_id: ModelVersion id
+
+    Returns:
+        version: ModelVersion
+    """
+    from .models import ModelVersion
+
+    version = _model_versions.get(version_id)
+    if version is None:
+        version = ModelVersion.objects.get(id=version_id)
+        with _lock:
+            _model_versions[version_id] = version
+    return version
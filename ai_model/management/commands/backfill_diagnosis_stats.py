@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from ai_model.models import Diagnosis, DiagnosisDailyStats
+from ai_model.services import daily_stats_totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily diagnosis rollup from the Diagnosis table, streaming rows in chunks. "
+        "Rollup rows in the date range are replaced, so diagnoses saved while this runs "
+        "(for dates in the range) may be missed; run it when traffic is low."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', default=None, help="First date to rebuild (YYYY-MM-DD, default: all history)")
+        parser.add_argument('--until', default=None, help="Last date to rebuild (YYYY-MM-DD, default: today)")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Diagnosis rows fetched per query")
+
+    def _date(self, options, name):
+        if options[name] is None:
+            return None
+        value = parse_date(options[name])
+        if value is None:
+            raise CommandError(f"--{name} must be a date (YYYY-MM-DD)")
+        return value
+
+    def handle(self, *args, **options):
+        since = self._date(options, 'since')
+        until = self._date(options, 'until')
+        chunk_size = options['chunk_size']
+
+        diagnoses = Diagnosis.objects.only(
+            'id', 'created_at', 'primary_disease', 'model_version', 'packed_prediction', 'prediction_data'
+        )
+        stats = DiagnosisDailyStats.objects.all()
+        if since:
+            diagnoses = diagnoses.filter(created_at__date__gte=since)
+            stats = stats.filter(date__gte=since)
+        if until:
+            diagnoses = diagnoses.filter(created_at__date__lte=until)
+            stats = stats.filter(date__lte=until)
+
+        # Only the per-day totals are held in memory, not the rows
+        totals = None
+        chunk = []
+        processed = 0
+        for diagnosis in diagnoses.iterator(chunk_size=chunk_size):
+            chunk.append(diagnosis)
+            if len(chunk) >= chunk_size:
+                totals = daily_stats_totals(chunk, totals)
+                processed += len(chunk)
+                chunk = []
+                self.stdout.write(f"Processed {processed} diagnoses")
+        totals = daily_stats_totals(chunk, totals)
+        processed += len(chunk)
+
+        with transaction.atomic():
+            deleted, _ = stats.delete()
+            DiagnosisDailyStats.objects.bulk_create([
+                DiagnosisDailyStats(
+                    date=date,
+                    disease_id=disease_id,
+                    model_version_id=model_version_id,
+                    diagnosis_count=count,
+                    confidence_total=confidence,
+                    uncertainty_total=uncertainty
+                )
+                for (date, disease_id, model_version_id), (count, confidence, uncertainty) in totals.items()
+            ], batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(totals)} rollup rows from {processed} diagnoses (replaced {deleted})"
+        ))
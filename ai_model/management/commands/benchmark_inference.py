@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ENGINES = ['keras', 'numpy', 'quantized']
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark MC Dropout inference across engines, sample counts and batch sizes, "
+        "each engine in a fresh interpreter"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engines', nargs='+', choices=ENGINES, default=ENGINES, help="Engines to benchmark")
+        parser.add_argument('--n-iter', nargs='+', type=int, default=[20, 50, 100], help="MC Dropout sample counts")
+        parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8, 32], help="Inputs per call")
+        parser.add_argument('--repeat', type=int, default=30, help="Timed calls per configuration")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed calls per configuration")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the random symptom vectors")
+        parser.add_argument('--no-charts', action='store_true', help="Skip the chart renderer benchmark")
+        parser.add_argument('--output', default=None, help="Write the JSON results to this file")
+        parser.add_argument(
+            '--baseline',
+            default=None,
+            help="JSON results of an earlier run; fail if any p95 latency regressed by more than --threshold"
+        )
+        parser.add_argument('--threshold', type=float, default=0.2, help="Allowed p95 slowdown (0.2 means 20%%)")
+        parser.add_argument('--json', action='store_true', help="Print results as JSON")
+        # Used by the parent process to run one target per interpreter
+        parser.add_argument('--target', default=None, help=argparse.SUPPRESS)
+        parser.add_argument('--model-root', default=None, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['target']:
+            self.stdout.write(json.dumps(self._run_target(options['target'], options)))
+            return
+
+        from ai_model.ml.benchmark import environment_info, find_regressions
+
+        targets = list(options['engines']) + ([] if options['no_charts'] else ['charts'])
+        model_root = self._export_missing_weights(options['engines'])
+        try:
+            runs = [self._spawn(target, options, model_root) for target in targets]
+        finally:
+            if model_root:
+                shutil.rmtree(model_root, ignore_errors=True)
+
+        results = {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'environment': environment_info(),
+            'config': {
+                'n_iter': options['n_iter'],
+                'batch_sizes': options['batch_sizes'],
+                'repeat': options['repeat'],
+                'seed': options['seed'],
+            },
+            'results': runs,
+        }
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+        else:
+            self._print_table(results)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = find_regressions(baseline, results, options['threshold'])
+            for key, before, after in regressions:
+                self.stderr.write(f"Regression: {key} p95 {before:.2f} ms -> {after:.2f} ms")
+            if regressions:
+                raise CommandError(f"{len(regressions)} configurations regressed by more than "
+                                   f"{options['threshold']:.0%} against {options['baseline']}")
+
+    def _export_missing_weights(self, engines):
+        """
+        Export the weights the NumPy engines need but the published model lacks
+
+        The served model directory is never written to: the model is copied to a
+        temporary directory and exported there.
+
+        Returns:
+            model_root: The temporary directory (removed by the caller), or None
+                if nothing was missing
+        """
+        from ai_model.ml.model_builder import get_model_dir, get_quantization
+        from ai_model.ml.numpy_engine import NUMPY_WEIGHTS_FILENAME, QUANTIZED_WEIGHTS_FILENAME
+        from ai_model.ml.registry import METADATA_FILENAME, MODEL_FILENAME
+
+        model_dir = get_model_dir()
+        exports = {
+            'numpy': (NUMPY_WEIGHTS_FILENAME, []),
+            'quantized': (QUANTIZED_WEIGHTS_FILENAME, ['--quantize', get_quantization()]),
+        }
+        missing = [
+            engine for engine in engines
+            if engine in exports and not os.path.exists(os.path.join(model_dir, exports[engine][0]))
+        ]
+        if not missing:
+            return None
+
+        model_root = tempfile.mkdtemp(prefix='benchmark-model-')
+        self.stderr.write(f"Exporting weights for {', '.join(missing)} to {model_root} (not in {model_dir})")
+        try:
+            for filename in (MODEL_FILENAME, METADATA_FILENAME, NUMPY_WEIGHTS_FILENAME, QUANTIZED_WEIGHTS_FILENAME):
+                if os.path.exists(os.path.join(model_dir, filename)):
+                    shutil.copy2(os.path.join(model_dir, filename), model_root)
+            # Exported in a separate interpreter: the export loads TensorFlow, and on
+            # Linux a child process starts with its parent's peak RSS
+            for engine in missing:
+                self._manage('export_numpy_model', '--model-dir', model_root, *exports[engine][1])
+        except Exception:
+            shutil.rmtree(model_root, ignore_errors=True)
+            raise
+        return model_root
+
+    def _run_target(self, target, options):
+        from ai_model.ml.benchmark import benchmark_charts, benchmark_engine
+
+        if target == 'charts':
+            return benchmark_charts()
+        return benchmark_engine(
+            target,
+            options['n_iter'],
+            options['batch_sizes'],
+            repeat=options['repeat'],
+            warmup=options['warmup'],
+            seed=options['seed'],
+            model_root=options['model_root'],
+        )
+
+    def _spawn(self, target, options, model_root=None):
+        return json.loads(self._manage(
+            'benchmark_inference',
+            '--target', target,
+            *(['--model-root', model_root] if model_root else []),
+            '--n-iter', *map(str, options['n_iter']),
+            '--batch-sizes', *map(str, options['batch_sizes']),
+            '--repeat', str(options['repeat']),
+            '--warmup', str(options['warmup']),
+            '--seed', str(options['seed']),
+        ).strip().splitlines()[-1])
+
+    def _manage(self, *args):
+        command = [sys.executable, os.path.join(str(settings.BASE_DIR), 'manage.py'), *args]
+        process = subprocess.run(command, cwd=str(settings.BASE_DIR), capture_output=True, text=True)
+        if process.returncode != 0:
+            raise CommandError(f"{' '.join(args[:3])} failed:\n{process.stderr}")
+        return process.stdout
+
+    def _print_table(self, results):
+        self.stdout.write(
+            f"{'engine':<11}{'n_iter':>7}{'batch':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'inputs/s':>11}"
+        )
+        for result in results['results']:
+            for run in result.get('predict_with_uncertainty', []):
+                self.stdout.write(
+                    f"{result['engine']:<11}{run['n_iter']:>7}{run['batch_size']:>7}{run['p50_ms']:>9.2f}"
+                    f"{run['p95_ms']:>9.2f}{run['p99_ms']:>9.2f}{run['throughput']:>11.0f}"
+                )
+
+        self.stdout.write("")
+        for result in results['results']:
+            rss = result['peak_rss_kb']
+            rss = f"{rss / 1024:.0f} MiB" if rss is not None else "n/a"
+            if result['engine'] == 'charts':
+                self.stdout.write(
+                    f"charts: bar p50 {result['create_diagnosis_chart']['p50_ms']:.1f} ms, "
+                    f"radar p50 {result['create_symptoms_radar_chart']['p50_ms']:.1f} ms, peak RSS {rss}"
+                )
+                continue
+
+            parity = result['parity']['deterministic']
+            self.stdout.write(
+                f"{result['engine']}: load {result['load_time'] * 1000:.0f} ms, "
+                f"get_diagnosis p50 {result['get_diagnosis']['p50_ms']:.2f} ms, peak RSS {rss}, "
+                f"max |diff| vs Keras {parity['max_abs_diff']:.1e}, top-1 agreement {parity['top1_agreement']:.2%}"
+            )
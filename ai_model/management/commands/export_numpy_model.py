@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from ai_model.ml.model_builder import export_numpy_model, get_model_dir
+from ai_model.ml.numpy_engine import QUANTIZATION_MODES
+
+
+class Command(BaseCommand):
+    help = "Export the saved Keras diagnosis model to NumPy weights for the 'numpy' and 'quantized' engines"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model-dir',
+            default=None,
+            help="Directory with health_model.h5 and metadata.json (defaults to AI_MODEL_PATH)"
+        )
+        parser.add_argument(
+            '--quantize',
+            choices=QUANTIZATION_MODES,
+            default=None,
+            help="Write quantized weights for the 'quantized' engine instead of float32"
+        )
+        parser.add_argument(
+            '--report',
+            action='store_true',
+            help="Compare the quantized weights against the float32 model on every symptom vector"
+        )
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        model_dir = options['model_dir'] or get_model_dir()
+
+        if not options['report']:
+            path = export_numpy_model(model_dir, quantization=options['quantize'])
+            self.stdout.write(self.style.SUCCESS(f"Exported NumPy weights to {path}"))
+            return
+
+        from ai_model.ml.quantization import quantization_report
+
+        report = quantization_report(model_dir, mode=options['quantize'])
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        sizes = report['sizes']
+        self.stdout.write(f"Quantization: {report['mode']} ({report['inputs']} symptom vectors)")
+        self.stdout.write(
+            f"Artifact size: keras {sizes['keras']} B, numpy {sizes['numpy']} B, quantized {sizes['quantized']} B"
+        )
+        weights = report['weight_bytes']
+        self.stdout.write(f"Resident weights: numpy {weights['numpy']} B, quantized {weights['quantized']} B")
+        for label, key in (("Deterministic vs Keras", 'deterministic'), ("MC mean vs float32", 'mc_mean')):
+            stats = report[key]
+            self.stdout.write(
+                f"{label}: max |diff| {stats['max_abs_diff']:.2e}, mean |diff| {stats['mean_abs_diff']:.2e}, "
+                f"top-1 agreement {stats['top1_agreement']:.2%}"
+            )
+        self.stdout.write(f"MC std vs float32: max |diff| {report['mc_std_max_abs_diff']:.2e}")
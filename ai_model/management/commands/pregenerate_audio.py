@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_model.ml.model_builder import ModelNotAvailable, load_trained_model
+from ai_model.ml.prediction import diagnosis_speech_text
+from ai_model.ml.tts import TTS_BACKENDS, get_audio_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Synthesize the diagnosis audio for every (disease, confidence percent) pair, "
+        "so no request has to wait for text-to-speech"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-confidence',
+            type=int,
+            default=None,
+            help="Lowest confidence percent to generate (defaults to 100 / number of diseases, "
+                 "the lowest possible top-class confidence)"
+        )
+        parser.add_argument('--max-confidence', type=int, default=100, help="Highest confidence percent to generate")
+        parser.add_argument('--diseases', nargs='+', default=None, help="Only these diseases")
+
+    def handle(self, *args, **options):
+        try:
+            _, metadata = load_trained_model()
+        except ModelNotAvailable as e:
+            raise CommandError(str(e))
+
+        diseases = options['diseases'] or metadata["diseases"]
+        unknown = set(diseases) - set(metadata["diseases"])
+        if unknown:
+            raise CommandError(f"Unknown diseases: {', '.join(sorted(unknown))}")
+
+        min_confidence = options['min_confidence']
+        if min_confidence is None:
+            min_confidence = 100 // len(metadata["diseases"])
+        confidences = range(min_confidence, options['max_confidence'] + 1)
+
+        cache = get_audio_cache()
+        self.stdout.write(
+            f"Generating {len(diseases) * len(confidences)} phrases with the {cache.backend.name} backend "
+            f"(available: {', '.join(TTS_BACKENDS)})"
+        )
+
+        generated = skipped = failed = 0
+        for disease in diseases:
+            for confidence in confidences:
+                text = diagnosis_speech_text(
+                    disease,
+                    confidence,
+                    metadata["test_recommendations"][disease],
+                    metadata["medicine_recommendations"][disease]
+                )
+                if cache.exists(text):
+                    skipped += 1
+                    continue
+                try:
+                    cache.render(text)
+                except Exception:
+                    failed += 1
+                    continue
+                generated += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {generated}, already cached {skipped}, failed {failed}"
+        ))
+        if failed:
+            raise CommandError(f"{failed} phrases could not be synthesized")
@@ -0,0 +1,97 @@
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Imports that should only happen when a request actually needs them
+HEAVY_MODULES = ['tensorflow', 'matplotlib', 'gtts', 'drf_yasg.views']
+
+PROBE = """
+import importlib, json, os, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', {settings_module!r})
+started = time.perf_counter()
+import django
+django.setup()
+setup_time = time.perf_counter() - started
+started = time.perf_counter()
+for name in {modules!r}:
+    importlib.import_module(name)
+import_time = time.perf_counter() - started
+print(json.dumps({{
+    'setup_time': setup_time,
+    'import_time': import_time,
+    'heavy_modules': [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Measure cold import time of each local app's URL and view modules in a fresh interpreter"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per app (the median is reported)")
+        parser.add_argument('--json', action='store_true', help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        targets = [(app_config.label, self._app_modules(app_config.name)) for app_config in self._local_apps()]
+        targets.append(('ROOT_URLCONF', [settings.ROOT_URLCONF]))
+
+        results = []
+        for label, modules in targets:
+            runs = [self._probe(modules) for _ in range(options['repeat'])]
+            results.append({
+                'app': label,
+                'modules': modules,
+                'setup_time': statistics.median(run['setup_time'] for run in runs),
+                'import_time': statistics.median(run['import_time'] for run in runs),
+                'heavy_modules': runs[-1]['heavy_modules'],
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'app':<16}{'setup (s)':>11}{'imports (s)':>13}  heavy modules loaded")
+        for result in results:
+            self.stdout.write(
+                f"{result['app']:<16}{result['setup_time']:>11.3f}{result['import_time']:>13.3f}  "
+                f"{', '.join(result['heavy_modules']) or '-'}"
+            )
+
+    def _local_apps(self):
+        base_dir = str(settings.BASE_DIR)
+        return [
+            app_config for app_config in apps.get_app_configs()
+            if os.path.abspath(app_config.path).startswith(base_dir)
+        ]
+
+    def _app_modules(self, app_name):
+        candidates = [f'{app_name}.urls', f'{app_name}.views', f'{app_name}.api.urls', f'{app_name}.api.views']
+        return [name for name in candidates if self._module_exists(name)]
+
+    def _module_exists(self, name):
+        try:
+            return importlib.util.find_spec(name) is not None
+        except ModuleNotFoundError:
+            return False
+
+    def _probe(self, modules):
+        code = PROBE.format(
+            settings_module=os.environ.get('DJANGO_SETTINGS_MODULE', 'healthcare.settings'),
+            modules=modules,
+            heavy=HEAVY_MODULES,
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=str(settings.BASE_DIR),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
@@ -0,0 +1,80 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_model.ml.model_builder import (
+    VERSIONS_DIRNAME,
+    ModelNotAvailable,
+    activate_model_version,
+    get_current_version,
+    get_model_root,
+    publish_model,
+    train_model,
+)
+
+
+class Command(BaseCommand):
+    help = "Train the diagnosis model offline and publish it as a new model version"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--epochs', type=int, default=200, help="Number of training epochs")
+        parser.add_argument(
+            '--name',
+            dest='model_version',
+            default=None,
+            help="Version name (a UTC timestamp by default)"
+        )
+        parser.add_argument(
+            '--no-activate',
+            action='store_true',
+            help="Write the new version without pointing CURRENT at it"
+        )
+        parser.add_argument(
+            '--activate',
+            metavar='VERSION',
+            default=None,
+            help="Don't train; point CURRENT at an existing version (e.g. to roll back)"
+        )
+        parser.add_argument('--list', action='store_true', help="List published versions and exit")
+
+    def handle(self, *args, **options):
+        if options['list']:
+            self._list_versions()
+            return
+
+        if options['activate']:
+            try:
+                activate_model_version(options['activate'])
+            except ModelNotAvailable as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"Activated model version {options['activate']}"))
+            return
+
+        self.stdout.write(f"Training for {options['epochs']} epochs...")
+        model, metadata = train_model(epochs=options['epochs'])
+
+        try:
+            version = publish_model(
+                model,
+                metadata,
+                version=options['model_version'],
+                activate=not options['no_activate']
+            )
+        except FileExistsError as e:
+            raise CommandError(str(e))
+
+        state = "published" if options['no_activate'] else "published and activated"
+        self.stdout.write(self.style.SUCCESS(f"Model version {version} {state}"))
+
+    def _list_versions(self):
+        versions_dir = os.path.join(get_model_root(), VERSIONS_DIRNAME)
+        current = get_current_version()
+        versions = sorted(
+            name for name in os.listdir(versions_dir) if not name.startswith('.')
+        ) if os.path.isdir(versions_dir) else []
+
+        if not versions:
+            self.stdout.write("No published model versions")
+        for version in versions:
+            marker = '*' if version == current else ' '
+            self.stdout.write(f"{marker} {version}")
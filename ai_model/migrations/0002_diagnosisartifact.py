@@ -0,0 +1,32 @@
+# Generated by Django 4.2.8 on 2026-10-17 12:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_model', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiagnosisArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('chart', 'Diagnosis chart'), ('symptoms_chart', 'Symptom chart'), ('audio', 'Audio summary')], max_length=20)),
+                ('path', models.CharField(blank=True, max_length=255)),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('size', models.PositiveIntegerField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('diagnosis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='artifacts', to='ai_model.diagnosis')),
+            ],
+            options={
+                'unique_together': {('diagnosis', 'kind')},
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 4.2.8 on 2026-10-17 12:49
+
+import json
+import logging
+import os
+
+from django.conf import settings
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def read_model_metadata():
+    # Frozen copy of ai_model.ml.model_builder.read_model_metadata, so later
+    # changes to the model layout don't break this migration
+    default_root = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'ml', 'saved_models')
+    root = getattr(settings, 'AI_MODEL_PATH', default_root)
+    try:
+        with open(os.path.join(root, 'CURRENT')) as f:
+            version = f.read().strip() or None
+    except FileNotFoundError:
+        version = None
+    model_dir = os.path.join(root, 'versions', version) if version else root
+    with open(os.path.join(model_dir, 'metadata.json')) as f:
+        return json.load(f)
+
+
+def backfill_symptom_masks(apps, schema_editor):
+    try:
+        symptoms = read_model_metadata()["symptoms"]
+    except FileNotFoundError:
+        logger.warning("No trained model, symptom_mask was not backfilled")
+        return
+
+    bits = {name: 1 << i for i, name in enumerate(symptoms)}
+    Diagnosis = apps.get_model('ai_model', 'Diagnosis')
+    DiagnosisSymptom = apps.get_model('ai_model', 'DiagnosisSymptom')
+
+    rows = (
+        DiagnosisSymptom.objects
+        .order_by('diagnosis_id')
+        .values_list('diagnosis_id', 'symptom__name', 'is_present')
+        .iterator(chunk_size=BATCH_SIZE * len(symptoms))
+    )
+
+    # Rows arrive grouped by diagnosis, so masks are flushed as each group ends
+    batch = []
+    current_id, mask = None, 0
+    for diagnosis_id, name, is_present in rows:
+        if diagnosis_id != current_id:
+            if current_id is not None:
+                batch.append(Diagnosis(id=current_id, symptom_mask=mask))
+            current_id, mask = diagnosis_id, 0
+            if len(batch) >= BATCH_SIZE:
+                Diagnosis.objects.bulk_update(batch, ['symptom_mask'])
+                batch = []
+        if is_present:
+            mask |= bits.get(name, 0)
+
+    if current_id is not None:
+        batch.append(Diagnosis(id=current_id, symptom_mask=mask))
+    Diagnosis.objects.bulk_update(batch, ['symptom_mask'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_model', '0002_diagnosisartifact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diagnosis',
+            name='symptom_mask',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_symptom_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,184 @@
+# Generated by Django 4.2.8 on 2026-10-17 12:53
+
+import hashlib
+import json
+import logging
+import os
+import struct
+
+import numpy as np
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+# Frozen copy of the ai_model.packing format as of this migration, so later
+# changes to that module don't change what this migration reads and writes
+PACKED_DTYPES = {2: '<f2', 4: '<f4'}
+DTYPE_SIZES = {'float16': 2, 'float32': 4}
+HEADER = struct.Struct('<BHI')
+PACKED_KEYS = (
+    'diagnosis', 'confidence', 'uncertainty', 'test_recommendation', 'medicine_recommendation',
+    'probabilities', 'uncertainties', 'n_samples'
+)
+VERSION_FIELDS = ('diseases', 'symptoms', 'test_recommendations', 'medicine_recommendations')
+
+
+def read_model_metadata():
+    default_root = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'ml', 'saved_models')
+    root = getattr(settings, 'AI_MODEL_PATH', default_root)
+    try:
+        with open(os.path.join(root, 'CURRENT')) as f:
+            version = f.read().strip() or None
+    except FileNotFoundError:
+        version = None
+    model_dir = os.path.join(root, 'versions', version) if version else root
+    with open(os.path.join(model_dir, 'metadata.json')) as f:
+        return json.load(f)
+
+
+def model_version_digest(metadata):
+    payload = json.dumps([metadata[field] for field in VERSION_FIELDS], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def pack_prediction(result, version, dtype):
+    diseases = version.diseases
+    probabilities = result.get('probabilities')
+    uncertainties = result.get('uncertainties')
+    if (not isinstance(probabilities, dict) or not isinstance(uncertainties, dict)
+            or list(probabilities) != diseases or list(uncertainties) != diseases
+            or result.get('diagnosis') not in diseases):
+        return None, result
+
+    itemsize = DTYPE_SIZES[dtype]
+    top = diseases.index(result['diagnosis'])
+    values = np.array(
+        [probabilities[disease] for disease in diseases] + [uncertainties[disease] for disease in diseases],
+        dtype=PACKED_DTYPES[itemsize]
+    )
+    packed = HEADER.pack(itemsize, top, int(result.get('n_samples', 0))) + values.tobytes()
+
+    expanded = unpack_prediction(packed, version)
+    extra = {
+        key: value for key, value in result.items()
+        if key not in PACKED_KEYS or (
+            key in ('diagnosis', 'test_recommendation', 'medicine_recommendation') and expanded[key] != value
+        )
+    }
+    return packed, extra
+
+
+def unpack_prediction(packed, version, extra=None):
+    packed = bytes(packed)
+    itemsize, top, n_samples = HEADER.unpack_from(packed)
+    values = [float(str(value)) for value in np.frombuffer(packed, dtype=PACKED_DTYPES[itemsize], offset=HEADER.size)]
+
+    diseases = version.diseases
+    n = len(diseases)
+    probabilities, uncertainties = values[:n], values[n:2 * n]
+    diagnosis = diseases[top]
+
+    result = {
+        "diagnosis": diagnosis,
+        "confidence": probabilities[top],
+        "uncertainty": uncertainties[top],
+        "test_recommendation": version.test_recommendations[diagnosis],
+        "medicine_recommendation": version.medicine_recommendations[diagnosis],
+        "probabilities": dict(zip(diseases, probabilities)),
+        "uncertainties": dict(zip(diseases, uncertainties)),
+    }
+    if n_samples:
+        result["n_samples"] = n_samples
+    if extra:
+        result.update(extra)
+    return result
+
+
+def pack_predictions(apps, schema_editor):
+    try:
+        metadata = read_model_metadata()
+    except FileNotFoundError:
+        logger.warning("No trained model, prediction_data was left unpacked")
+        return
+
+    # Existing rows don't record their model, so those matching the current
+    # model's diseases are packed against it and the rest stay as JSON
+    ModelVersion = apps.get_model('ai_model', 'ModelVersion')
+    Diagnosis = apps.get_model('ai_model', 'Diagnosis')
+    version, _ = ModelVersion.objects.get_or_create(
+        digest=model_version_digest(metadata),
+        defaults=dict({field: metadata[field] for field in VERSION_FIELDS}, name=metadata.get('version') or '')
+    )
+    dtype = getattr(settings, 'AI_MODEL_PREDICTION_DTYPE', 'float16')
+
+    batch = []
+    rows = Diagnosis.objects.filter(packed_prediction__isnull=True).only('id', 'prediction_data')
+    for diagnosis in rows.iterator(chunk_size=BATCH_SIZE):
+        packed, extra = pack_prediction(diagnosis.prediction_data, version, dtype)
+        if packed is None:
+            continue
+        diagnosis.model_version_id = version.id
+        diagnosis.packed_prediction = packed
+        diagnosis.prediction_data = extra
+        batch.append(diagnosis)
+        if len(batch) >= BATCH_SIZE:
+            Diagnosis.objects.bulk_update(batch, ['model_version', 'packed_prediction', 'prediction_data'])
+            batch = []
+    Diagnosis.objects.bulk_update(batch, ['model_version', 'packed_prediction', 'prediction_data'])
+
+
+def unpack_predictions(apps, schema_editor):
+    ModelVersion = apps.get_model('ai_model', 'ModelVersion')
+    Diagnosis = apps.get_model('ai_model', 'Diagnosis')
+    versions = {version.id: version for version in ModelVersion.objects.all()}
+
+    batch = []
+    rows = Diagnosis.objects.filter(packed_prediction__isnull=False)
+    for diagnosis in rows.only('id', 'model_version', 'packed_prediction', 'prediction_data').iterator(chunk_size=BATCH_SIZE):
+        diagnosis.prediction_data = unpack_prediction(
+            diagnosis.packed_prediction, versions[diagnosis.model_version_id], diagnosis.prediction_data
+        )
+        batch.append(diagnosis)
+        if len(batch) >= BATCH_SIZE:
+            Diagnosis.objects.bulk_update(batch, ['prediction_data'])
+            batch = []
+    Diagnosis.objects.bulk_update(batch, ['prediction_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_model', '0003_diagnosis_symptom_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(blank=True, max_length=64)),
+                ('diseases', models.JSONField(default=list)),
+                ('symptoms', models.JSONField(default=list)),
+                ('test_recommendations', models.JSONField(default=dict)),
+                ('medicine_recommendations', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='diagnosis',
+            name='packed_prediction',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='diagnosis',
+            name='model_version',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='diagnoses', to='ai_model.modelversion'),
+        ),
+        migrations.RunPython(pack_predictions, unpack_predictions),
+    ]
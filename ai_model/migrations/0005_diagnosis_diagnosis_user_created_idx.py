@@ -0,0 +1,17 @@
+# Generated by Django 4.2.8 on 2026-10-17 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_model', '0004_packed_prediction'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='diagnosis',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='diagnosis_user_created_idx'),
+        ),
+    ]
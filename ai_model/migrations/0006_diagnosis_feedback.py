@@ -0,0 +1,130 @@
+# Generated by Django 4.2.8 on 2026-10-17 12:58
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+BATCH_SIZE = 1000
+
+
+def move_feedback(apps, schema_editor):
+    from django.db.models import Count, Sum
+    from django.utils import timezone
+    from django.utils.dateparse import parse_datetime
+
+    Diagnosis = apps.get_model('ai_model', 'Diagnosis')
+    DiagnosisFeedback = apps.get_model('ai_model', 'DiagnosisFeedback')
+    DiagnosisFeedbackStats = apps.get_model('ai_model', 'DiagnosisFeedbackStats')
+
+    # Feedback was stored under prediction_data['feedback'] on the diagnosis row
+    feedback, diagnoses = [], []
+    rows = Diagnosis.objects.filter(prediction_data__has_key='feedback').only('id', 'user', 'prediction_data')
+    for diagnosis in rows.iterator(chunk_size=BATCH_SIZE):
+        data = diagnosis.prediction_data.pop('feedback') or {}
+        try:
+            rating = int(data.get('accuracy_rating'))
+        except (TypeError, ValueError):
+            rating = None
+        if rating in range(1, 6):
+            submitted_at = parse_datetime(data.get('submitted_at') or '')
+            feedback.append(DiagnosisFeedback(
+                diagnosis_id=diagnosis.id,
+                user_id=diagnosis.user_id,
+                accuracy_rating=rating,
+                comments=data.get('comments') or '',
+                created_at=submitted_at or timezone.now()
+            ))
+        diagnoses.append(diagnosis)
+    DiagnosisFeedback.objects.bulk_create(feedback, batch_size=BATCH_SIZE)
+    Diagnosis.objects.bulk_update(diagnoses, ['prediction_data'], batch_size=BATCH_SIZE)
+
+    totals = (
+        DiagnosisFeedback.objects
+        .filter(diagnosis__primary_disease__isnull=False)
+        .values('diagnosis__primary_disease', 'diagnosis__model_version')
+        .annotate(count=Count('id'), total=Sum('accuracy_rating'))
+    )
+    DiagnosisFeedbackStats.objects.bulk_create([
+        DiagnosisFeedbackStats(
+            disease_id=row['diagnosis__primary_disease'],
+            model_version_id=row['diagnosis__model_version'],
+            feedback_count=row['count'],
+            rating_total=row['total']
+        )
+        for row in totals
+    ])
+
+
+def restore_feedback(apps, schema_editor):
+    Diagnosis = apps.get_model('ai_model', 'Diagnosis')
+    DiagnosisFeedback = apps.get_model('ai_model', 'DiagnosisFeedback')
+
+    # The JSON only had room for one submission per diagnosis: keep the latest
+    latest = {}
+    for feedback in DiagnosisFeedback.objects.order_by('diagnosis_id', 'created_at', 'id').iterator():
+        latest[feedback.diagnosis_id] = feedback
+
+    diagnoses = []
+    for diagnosis in Diagnosis.objects.filter(id__in=list(latest)).only('id', 'prediction_data'):
+        feedback = latest[diagnosis.id]
+        diagnosis.prediction_data['feedback'] = {
+            'accuracy_rating': str(feedback.accuracy_rating),
+            'comments': feedback.comments,
+            'submitted_at': feedback.created_at.isoformat()
+        }
+        diagnoses.append(diagnosis)
+    Diagnosis.objects.bulk_update(diagnoses, ['prediction_data'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ai_model', '0005_diagnosis_diagnosis_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiagnosisFeedbackStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('feedback_count', models.PositiveIntegerField(default=0)),
+                ('rating_total', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('disease', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feedback_stats', to='ai_model.disease')),
+                ('model_version', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='feedback_stats', to='ai_model.modelversion')),
+            ],
+            options={
+                'verbose_name_plural': 'Diagnosis feedback stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='DiagnosisFeedback',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('accuracy_rating', models.PositiveSmallIntegerField(db_index=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)])),
+                ('comments', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('diagnosis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feedback', to='ai_model.diagnosis')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='diagnosisfeedbackstats',
+            constraint=models.UniqueConstraint(fields=('disease', 'model_version'), name='feedback_stats_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='diagnosisfeedbackstats',
+            constraint=models.UniqueConstraint(condition=models.Q(('model_version__isnull', True)), fields=('disease',), name='feedback_stats_unique_unversioned'),
+        ),
+        migrations.AddIndex(
+            model_name='diagnosisfeedback',
+            index=models.Index(fields=['diagnosis', '-created_at'], name='feedback_diagnosis_idx'),
+        ),
+        migrations.RunPython(move_feedback, restore_feedback),
+    ]
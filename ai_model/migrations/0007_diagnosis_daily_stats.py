@@ -0,0 +1,38 @@
+# Generated by Django 4.2.8 on 2026-10-17 12:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_model', '0006_diagnosis_feedback'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiagnosisDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('diagnosis_count', models.PositiveIntegerField(default=0)),
+                ('confidence_total', models.FloatField(default=0)),
+                ('uncertainty_total', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('disease', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='ai_model.disease')),
+                ('model_version', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='ai_model.modelversion')),
+            ],
+            options={
+                'verbose_name_plural': 'Diagnosis daily stats',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='diagnosisdailystats',
+            constraint=models.UniqueConstraint(fields=('date', 'disease', 'model_version'), name='daily_stats_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='diagnosisdailystats',
+            constraint=models.UniqueConstraint(condition=models.Q(('model_version__isnull', True)), fields=('date', 'disease'), name='daily_stats_unique_unversioned'),
+        ),
+    ]
@@ -0,0 +1,148 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceBatcher:
+    """
+    Collects concurrent prediction requests and runs them as one batch.
+
+    Callers block in ``predict`` while a background thread takes the first
+    waiting request, keeps collecting for up to ``max_wait_ms`` or until
+    ``max_batch_size`` requests are queued, and then passes them all to
+    ``predict_batch`` in a single call. If that call fails, the requests are
+    retried one at a time so only the failing input gets the error.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=32, max_wait_ms=5):
+        """
+        Args:
+            predict_batch: Function taking a list of inputs and returning a list
+                of results in the same order
+            max_batch_size: Max requests per batch
+            max_wait_ms: Max time to wait for more requests after the first one
+        """
+        self._predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stats = {
+            'requests': 0,
+            'batches': 0,
+            'errors': 0,
+            'max_queue_depth': 0,
+            'batch_sizes': Counter(),
+        }
+
+    def _ensure_worker(self):
+        # Threads don't survive fork, so each worker process starts its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+            self._thread.start()
+
+    def submit(self, item):
+        """
+        Queue one input for prediction
+
+        Args:
+            item: Input accepted by predict_batch
+
+        Returns:
+            future: Future resolving to the result for this input
+        """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+
+        depth = self._queue.qsize()
+        with self._lock:
+            self._stats['requests'] += 1
+            if depth > self._stats['max_queue_depth']:
+                self._stats['max_queue_depth'] = depth
+
+        return future
+
+    def predict(self, item, timeout=None):
+        """
+        Queue one input and wait for its result
+        """
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            self._run_batch(self._collect())
+
+    def _run_batch(self, batch):
+        items = [item for item, _ in batch]
+
+        try:
+            results = self._predict_batch(items)
+        except Exception as e:
+            with self._lock:
+                self._stats['errors'] += 1
+            if len(batch) > 1:
+                # Run the requests one by one so a bad input only fails its own request
+                logger.warning(f"Batched inference failed for {len(batch)} requests, retrying singly: {str(e)}")
+                for request in batch:
+                    self._run_batch([request])
+                return
+            logger.error(f"Inference failed: {str(e)}")
+            batch[0][1].set_exception(e)
+            return
+
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['batch_sizes'][len(batch)] += 1
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self):
+        """
+        Snapshot of the scheduler metrics
+
+        Returns:
+            stats: Dictionary with request/batch counts, queue depth and the
+                batch size histogram
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['batch_sizes'] = dict(self._stats['batch_sizes'])
+
+        stats['queue_depth'] = self._queue.qsize() if self._queue is not None else 0
+        stats['mean_batch_size'] = (
+            sum(size * count for size, count in stats['batch_sizes'].items()) / stats['batches']
+            if stats['batches'] else 0.0
+        )
+        return stats
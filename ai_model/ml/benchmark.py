@@ -0,0 +1,207 @@
+import platform
+import subprocess
+import time
+
+import numpy as np
+from django.conf import settings
+from django.test import override_settings
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .lookup import all_symptom_vectors
+from .model_builder import get_model_dir, get_model_entry, get_model_root, read_model_artifacts
+from .prediction import get_diagnosis, predict_with_uncertainty
+from .quantization import compare_outputs
+
+
+def peak_rss_kb():
+    """
+    Peak resident set size of this process in KiB, or None where unsupported
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB on Linux
+    return peak // 1024 if platform.system() == 'Darwin' else peak
+
+
+def time_calls(func, repeat, warmup=3):
+    """
+    Call func repeatedly and summarize the latencies
+
+    Args:
+        func: Function without arguments
+        repeat: Number of timed calls
+        warmup: Number of untimed calls made first
+
+    Returns:
+        stats: Dictionary with p50/p95/p99/mean latency in milliseconds
+    """
+    for _ in range(warmup):
+        func()
+
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - started) * 1000.0)
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'mean_ms': float(np.mean(latencies)),
+    }
+
+
+def benchmark_engine(engine, n_iters, batch_sizes, repeat=30, warmup=3, seed=0, model_root=None):
+    """
+    Benchmark MC Dropout inference of one engine
+
+    Args:
+        engine: 'keras', 'numpy' or 'quantized'
+        n_iters: MC Dropout sample counts to sweep
+        batch_sizes: Batch sizes to sweep
+        repeat: Timed calls per configuration
+        warmup: Untimed calls per configuration
+        seed: Seed of the random symptom vectors
+        model_root: Model directory to load from (AI_MODEL_PATH by default)
+
+    Returns:
+        result: Dictionary with the load time, parity against the Keras
+            reference model, per-configuration latency/throughput, get_diagnosis
+            latency and peak RSS
+    """
+    rng = np.random.default_rng(seed)
+
+    with override_settings(AI_MODEL_PATH=model_root or get_model_root(), AI_MODEL_ENGINE=engine,
+                           AI_MODEL_LOOKUP_TABLE=False, AI_MODEL_BATCHING=False, AI_MODEL_MC_ADAPTIVE=False):
+        started = time.perf_counter()
+        entry = get_model_entry(engine)
+        load_time = time.perf_counter() - started
+        model, metadata = entry.model, entry.metadata
+        n_symptoms = len(metadata["symptoms"])
+
+        runs = []
+        for n_iter in n_iters:
+            for batch_size in batch_sizes:
+                x = rng.integers(0, 2, size=(batch_size, n_symptoms)).astype(np.float32)
+                stats = time_calls(lambda: predict_with_uncertainty(model, x, n_iter=n_iter), repeat, warmup)
+                stats.update({
+                    'n_iter': n_iter,
+                    'batch_size': batch_size,
+                    'throughput': batch_size * 1000.0 / stats['mean_ms'],
+                })
+                runs.append(stats)
+
+        symptom_values = rng.integers(0, 2, size=n_symptoms).tolist()
+        diagnosis = time_calls(lambda: get_diagnosis(symptom_values), repeat, warmup)
+
+        # Taken before the parity check, which loads the Keras reference model
+        # (and TensorFlow) into the NumPy engines' process too
+        rss = peak_rss_kb()
+
+        # Every binary symptom vector, scored by the float32 Keras model without dropout
+        reference_model, _ = read_model_artifacts(get_model_dir())
+        vectors = all_symptom_vectors(n_symptoms)
+        reference = np.asarray(reference_model(vectors, training=False))
+        parity = {'deterministic': compare_outputs(reference, np.asarray(model(vectors, training=False)))}
+        for n_iter in n_iters:
+            mean, _ = predict_with_uncertainty(model, vectors, n_iter=n_iter)
+            parity[f'mc_{n_iter}'] = compare_outputs(reference, mean)
+
+    return {
+        'engine': engine,
+        'model_version': entry.version,
+        'load_time': load_time,
+        'parity': parity,
+        'predict_with_uncertainty': runs,
+        'get_diagnosis': diagnosis,
+        'peak_rss_kb': rss,
+    }
+
+
+def benchmark_charts(repeat=10, warmup=1):
+    """
+    Benchmark the chart renderers on a fixed diagnosis
+
+    Returns:
+        result: Dictionary with the latency of each renderer and peak RSS
+    """
+    from .visualizer import create_diagnosis_chart, create_symptoms_radar_chart
+
+    diseases = ['Flu', 'Cold', 'COVID-19', 'Allergy', 'Fever', 'Bronchitis', 'Pneumonia']
+    probabilities = [0.4, 0.2, 0.15, 0.1, 0.08, 0.05, 0.02]
+    uncertainties = [0.05] * len(diseases)
+    symptoms = [f'symptom_{i}' for i in range(9)]
+    symptom_values = [1, 0, 1, 0, 1, 0, 1, 0, 1]
+
+    return {
+        'engine': 'charts',
+        'create_diagnosis_chart': time_calls(
+            lambda: create_diagnosis_chart(diseases, probabilities, uncertainties), repeat, warmup
+        ),
+        'create_symptoms_radar_chart': time_calls(
+            lambda: create_symptoms_radar_chart(symptoms, symptom_values), repeat, warmup
+        ),
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def environment_info():
+    """
+    Versions and settings needed to compare two benchmark result files
+    """
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=str(settings.BASE_DIR), capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'mc_chunk_size': getattr(settings, 'AI_MODEL_MC_CHUNK_SIZE', None),
+        'compile_forward': getattr(settings, 'AI_MODEL_COMPILE_FORWARD', True),
+        'quantization': getattr(settings, 'AI_MODEL_QUANTIZATION', 'int8'),
+    }
+
+
+def find_regressions(baseline, current, threshold=0.2, metric='p95_ms'):
+    """
+    Configurations whose latency grew by more than threshold since the baseline
+
+    Args:
+        baseline: Benchmark results loaded from an earlier run
+        current: Benchmark results of this run
+        threshold: Allowed relative slowdown (0.2 means 20%)
+        metric: Latency statistic to compare
+
+    Returns:
+        regressions: List of (key, baseline value, current value) tuples
+    """
+    def latencies(results):
+        values = {}
+        for result in results['results']:
+            engine = result['engine']
+            for run in result.get('predict_with_uncertainty', []):
+                values[(engine, f"n_iter={run['n_iter']}", f"batch={run['batch_size']}")] = run[metric]
+            for name in ('get_diagnosis', 'create_diagnosis_chart', 'create_symptoms_radar_chart'):
+                if name in result:
+                    values[(engine, name)] = result[name][metric]
+        return values
+
+    before, after = latencies(baseline), latencies(current)
+    return [
+        (' '.join(key), before[key], after[key])
+        for key in sorted(before.keys() & after.keys())
+        if after[key] > before[key] * (1 + threshold)
+    ]
@@ -0,0 +1,379 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent import futures
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .render_pool import RenderPool
+from .visualizer import render_chart
+
+logger = logging.getLogger(__name__)
+
+# Bump when the renderers change, so old images are not served for new keys
+CHART_STYLE_VERSION = 1
+
+CHARTS_DIRNAME = 'charts'
+
+# Probabilities are plotted with two decimals; rounding further inputs
+# together lets near-identical results share one image
+CHART_PRECISION = 4
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class ChartRenderError(Exception):
+    """Raised by ChartStore.wait when the chart's render failed"""
+
+
+def chart_key(kind, data):
+    """
+    Content hash of a chart
+
+    Args:
+        kind: Chart type ('diagnosis' or 'symptoms')
+        data: JSON-serializable plotted data
+
+    Returns:
+        key: Hex SHA-256 digest
+    """
+    payload = json.dumps([kind, CHART_STYLE_VERSION, data], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ChartStore:
+    """
+    Content-addressed PNG store with an in-process LRU in front of a shared directory.
+
+    Charts are stored under the hash of their plotted data, so a chart is
+    rendered once per distinct input across all worker processes and every
+    image URL can be cached by browsers indefinitely.
+
+    With a render pool, ``schedule`` only writes a small spec file next to
+    the image and queues the render, so the key (and its URL) is available
+    before the image is. ``wait`` resolves a key in any process: it waits
+    for a render queued here or renders the spec written by another worker.
+    """
+
+    def __init__(self, root, max_entries=256, pool=None, timeout=10.0):
+        """
+        Args:
+            root: Directory holding the images
+            max_entries: Max images kept in memory in this process
+            pool: RenderPool for background renders (None renders in the calling thread)
+            timeout: Max seconds wait() blocks for a render
+        """
+        self.root = root
+        self.max_entries = max_entries
+        self.pool = pool
+        self.timeout = timeout
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'renders': 0, 'scheduled': 0}
+
+    def relative_path(self, key):
+        """
+        Path of the image relative to MEDIA_ROOT
+        """
+        return os.path.join(CHARTS_DIRNAME, key[:2], f'{key}.png')
+
+    def _path(self, key, extension='png'):
+        return os.path.join(self.root, key[:2], f'{key}.{extension}')
+
+    def _write(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name so other workers never read a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def _remember(self, key, png):
+        with self._lock:
+            self._cache[key] = png
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def get(self, key):
+        """
+        Read a stored image
+
+        Args:
+            key: Content hash returned by schedule
+
+        Returns:
+            png: PNG bytes, or None if no chart has this key
+        """
+        with self._lock:
+            png = self._cache.get(key)
+            if png is not None:
+                self._cache.move_to_end(key)
+                self._stats['hits'] += 1
+                return png
+
+        try:
+            with open(self._path(key), 'rb') as f:
+                png = f.read()
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            self._stats['disk_hits'] += 1
+        self._remember(key, png)
+        return png
+
+    def put(self, key, png):
+        """
+        Store an image under its key (a no-op on disk if it is already there)
+        """
+        path = self._path(key)
+        if not os.path.exists(path):
+            self._write(path, png)
+        self._remember(key, png)
+
+    def size(self, key):
+        """
+        Size in bytes of a stored image, or None if it hasn't been rendered yet
+        """
+        with self._lock:
+            png = self._cache.get(key)
+        if png is not None:
+            return len(png)
+        try:
+            return os.path.getsize(self._path(key))
+        except FileNotFoundError:
+            return None
+
+    def spec(self, key):
+        """
+        Kind and plotted data of a scheduled chart, or None if none was scheduled
+        """
+        try:
+            with open(self._path(key, 'json')) as f:
+                spec = json.load(f)
+        except FileNotFoundError:
+            return None
+        return spec['kind'], spec['data']
+
+    def _submit(self, key, kind, data):
+        # Returns the pending render of key, or None if the pool is full
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+
+            future = self.pool.submit(kind, data)
+            if future is None:
+                logger.warning("Chart render pool is full, %s will be rendered on first request", key)
+                return None
+            self._pending[key] = future
+            self._stats['scheduled'] += 1
+
+        # The callback runs on the pool's management thread, or right here if the render is already done
+        caller = threading.get_ident()
+        future.add_done_callback(lambda f: self._finish(key, f, background=threading.get_ident() != caller))
+        return future
+
+    def _finish(self, key, future, background=False):
+        try:
+            png = future.result()
+        except Exception as e:
+            logger.error(f"Rendering chart {key} failed: {str(e)}")
+            update_artifact_status(key, 'failed', background=background)
+        else:
+            self.put(key, png)
+            with self._lock:
+                self._stats['renders'] += 1
+            update_artifact_status(key, 'ready', len(png), background=background)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def schedule(self, kind, data):
+        """
+        Get the key of a chart, queueing its render if it isn't stored yet
+
+        Args:
+            kind: Chart type accepted by render_chart
+            data: JSON-serializable positional arguments of the renderer
+
+        Returns:
+            key: Content hash of the chart
+        """
+        key = chart_key(kind, data)
+        if self.get(key) is not None:
+            return key
+
+        if self.pool is None:
+            self.put(key, render_chart(kind, data))
+            with self._lock:
+                self._stats['renders'] += 1
+            return key
+
+        spec_path = self._path(key, 'json')
+        if not os.path.exists(spec_path):
+            self._write(spec_path, json.dumps({'kind': kind, 'data': data}).encode('utf-8'))
+        self._submit(key, kind, data)
+        return key
+
+    def wait(self, key, timeout=None):
+        """
+        Get a chart image, waiting for (or running) its render if needed
+
+        Args:
+            key: Content hash returned by schedule
+            timeout: Max seconds to wait (the store's timeout by default)
+
+        Returns:
+            png: PNG bytes, or None if no chart was scheduled under this key
+
+        Raises:
+            ChartRenderError: The render failed
+            concurrent.futures.TimeoutError: The render didn't finish in time
+        """
+        png = self.get(key)
+        if png is not None:
+            return png
+
+        spec = self.spec(key)
+        if spec is None:
+            return None
+        kind, data = spec
+
+        future = self._submit(key, kind, data) if self.pool is not None else None
+        try:
+            if future is None:
+                png = render_chart(kind, data)
+            else:
+                png = future.result(self.timeout if timeout is None else timeout)
+        except futures.TimeoutError:
+            raise
+        except Exception as e:
+            if future is None:
+                # Pool renders are logged by _finish
+                logger.error(f"Rendering chart {key} failed: {str(e)}")
+                update_artifact_status(key, 'failed')
+            raise ChartRenderError(f"Rendering chart {key} failed") from e
+
+        self.put(key, png)
+        if future is None:
+            update_artifact_status(key, 'ready', len(png))
+        return png
+
+    def diagnosis_chart(self, diseases, probabilities, uncertainties, wait=False):
+        """
+        Key of the probability bar chart for one diagnosis result
+
+        Args:
+            wait: Block until the image is stored instead of rendering in the background
+        """
+        probabilities = [round(float(p), CHART_PRECISION) for p in probabilities]
+        uncertainties = [round(float(u), CHART_PRECISION) for u in uncertainties]
+        key = self.schedule('diagnosis', [list(diseases), probabilities, uncertainties])
+        if wait:
+            self.wait(key)
+        return key
+
+    def symptoms_chart(self, symptoms, symptom_values, wait=False):
+        """
+        Key of the symptom radar chart for one symptom vector
+
+        Args:
+            wait: Block until the image is stored instead of rendering in the background
+        """
+        key = self.schedule('symptoms', [list(symptoms), [int(v) for v in symptom_values]])
+        if wait:
+            self.wait(key)
+        return key
+
+    def stats(self):
+        """
+        Memory hits, disk hits, renders and pending renders of this process
+        """
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._cache), pending=len(self._pending))
+        if self.pool is not None:
+            stats['pool'] = self.pool.stats()
+        return stats
+
+
+def update_artifact_status(content_hash, status, size=None, background=False):
+    """
+    Mark the pending artifacts of a file once its render has finished
+
+    Args:
+        content_hash: Key of the rendered file
+        status: 'ready', or 'failed' so the artifacts are no longer polled
+        size: Size of the stored file in bytes
+        background: Called from a render thread rather than a request. Django
+            only closes connections at the end of requests, so the thread's
+            connection is closed here once it is past CONN_MAX_AGE (right away
+            by default) instead of staying open between renders.
+    """
+    # Imported here: the store is also used outside of requests, before models load
+    from ..models import DiagnosisArtifact
+
+    if background:
+        close_old_connections()
+    try:
+        DiagnosisArtifact.objects.filter(content_hash=content_hash, status='pending').update(
+            status=status, size=size, updated_at=timezone.now()
+        )
+    except Exception as e:
+        logger.error(f"Marking artifacts of {content_hash} as {status} failed: {str(e)}")
+    finally:
+        if background:
+            close_old_connections()
+
+
+def get_chart_store():
+    """
+    Get the process-wide chart store, creating it on first use
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                workers = getattr(settings, 'AI_MODEL_CHART_RENDER_WORKERS', 2)
+                pool = RenderPool(
+                    max_workers=workers,
+                    max_pending=getattr(settings, 'AI_MODEL_CHART_RENDER_QUEUE', 64)
+                ) if workers else None
+                _store = ChartStore(
+                    os.path.join(settings.MEDIA_ROOT, CHARTS_DIRNAME),
+                    max_entries=getattr(settings, 'AI_MODEL_CHART_CACHE_SIZE', 256),
+                    pool=pool,
+                    timeout=getattr(settings, 'AI_MODEL_CHART_RENDER_TIMEOUT', 10.0)
+                )
+    return _store
+
+
+def diagnosis_chart_keys(result, symptoms, symptom_values):
+    """
+    Keys of both charts of a diagnosis result, queueing renders of any that are missing
+
+    Args:
+        result: Diagnosis result dictionary
+        symptoms: Symptom names
+        symptom_values: List of 0 or 1 values
+
+    Returns:
+        diagnosis_key: Key of the probability bar chart
+        symptoms_key: Key of the symptom radar chart
+    """
+    store = get_chart_store()
+    diagnosis_key = store.diagnosis_chart(
+        list(result["probabilities"].keys()),
+        list(result["probabilities"].values()),
+        list(result["uncertainties"].values())
+    )
+    symptoms_key = store.symptoms_chart(symptoms, symptom_values)
+    return diagnosis_key, symptoms_key
@@ -0,0 +1,161 @@
+import logging
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .model_builder import get_model_entry
+from .numpy_engine import NumpyMLP
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_FILENAME = 'lookup_{version}.npz'
+
+# Tables loaded in this process, keyed by model version
+_tables = {}
+_lock = threading.Lock()
+
+
+def symptom_index(symptom_values):
+    """
+    Encode a binary symptom vector as an integer (symptom i is bit i)
+
+    Args:
+        symptom_values: List of 0/1 values in the model's symptom order
+
+    Returns:
+        index: Integer in range(2 ** len(symptom_values))
+    """
+    index = 0
+    for i, value in enumerate(symptom_values):
+        if value:
+            index |= 1 << i
+    return index
+
+
+def all_symptom_vectors(n_symptoms):
+    """
+    Every binary symptom vector, with row k being the vector whose index is k
+
+    Args:
+        n_symptoms: Number of symptoms
+
+    Returns:
+        vectors: Float32 array of shape (2 ** n_symptoms, n_symptoms)
+    """
+    indices = np.arange(2 ** n_symptoms)[:, None]
+    return ((indices >> np.arange(n_symptoms)) & 1).astype(np.float32)
+
+
+def build_lookup_table(model, n_symptoms, n_iter=None, seed=0):
+    """
+    Run MC Dropout over every binary symptom vector
+
+    Args:
+        model: NumpyMLP (dropout masks are drawn from a seeded generator)
+        n_symptoms: Number of symptoms
+        n_iter: Number of iterations for MC Dropout (AI_MODEL_MC_ITERATIONS by default)
+        seed: Seed for the dropout masks
+
+    Returns:
+        mean: Array of shape (2 ** n_symptoms, n_diseases) with mean probabilities
+        std: Array of the same shape with standard deviations
+    """
+    from .prediction import predict_with_uncertainty
+
+    if n_iter is None:
+        n_iter = getattr(settings, 'AI_MODEL_MC_ITERATIONS', 100)
+
+    mean, std = predict_with_uncertainty(
+        model,
+        all_symptom_vectors(n_symptoms),
+        n_iter=n_iter,
+        rng=np.random.default_rng(seed)
+    )
+    return mean.astype(np.float32), std.astype(np.float32)
+
+
+def _table_path(entry):
+    return os.path.join(entry.model_dir, LOOKUP_FILENAME.format(version=entry.version))
+
+
+def _read_table(path, n_iter, seed):
+    if not os.path.exists(path):
+        return None
+
+    with np.load(path, allow_pickle=False) as data:
+        if int(data['n_iter']) != n_iter or int(data['seed']) != seed:
+            return None
+        return data['mean'], data['std']
+
+
+def _write_table(path, mean, std, n_iter, seed):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, mean=mean, std=std, n_iter=n_iter, seed=seed)
+    os.replace(tmp_path, path)
+
+
+def get_lookup_table(entry=None):
+    """
+    Get the lookup table for the current model version, building it if needed
+
+    Tables are stored as lookup_<version>.npz next to the model, so a new
+    model version gets a new table automatically.
+
+    Args:
+        entry: ModelEntry to build the table for (current model by default)
+
+    Returns:
+        mean: Array of shape (2 ** n_symptoms, n_diseases) with mean probabilities
+        std: Array of the same shape with standard deviations
+    """
+    entry = entry or get_model_entry()
+    table = _tables.get(entry.version)
+    if table is not None:
+        return table
+
+    n_iter = getattr(settings, 'AI_MODEL_MC_ITERATIONS', 100)
+    seed = getattr(settings, 'AI_MODEL_LOOKUP_SEED', 0)
+
+    with _lock:
+        table = _tables.get(entry.version)
+        if table is not None:
+            return table
+
+        path = _table_path(entry)
+        table = _read_table(path, n_iter, seed)
+        if table is None:
+            logger.info("Building diagnosis lookup table for model version %s", entry.version)
+            # Same weights as the Keras model, but with seeded dropout masks
+            table = build_lookup_table(_numpy_model(entry), len(entry.metadata["symptoms"]), n_iter, seed)
+            _write_table(path, table[0], table[1], n_iter, seed)
+
+        # Only the current version is kept in memory
+        _tables.clear()
+        _tables[entry.version] = table
+        return table
+
+
+def _numpy_model(entry):
+    if isinstance(entry.model, NumpyMLP):
+        return entry.model
+    return get_model_entry('numpy').model
+
+
+def lookup_prediction(symptom_values, entry=None):
+    """
+    Look up the MC Dropout prediction for one binary symptom vector
+
+    Args:
+        symptom_values: List of 0/1 values in the model's symptom order
+        entry: ModelEntry to use (current model by default)
+
+    Returns:
+        mean: Array of shape (1, n_diseases) with mean probabilities
+        std: Array of shape (1, n_diseases) with standard deviations
+    """
+    mean, std = get_lookup_table(entry)
+    index = symptom_index(symptom_values)
+    return mean[index:index + 1], std[index:index + 1]
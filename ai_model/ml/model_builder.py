@@ -1,8 +1,31 @@
 import numpy as np
-import tensorflow as tf
 import os
 import json
-from tensorflow.keras.models import load_model
+import logging
+import weakref
+from functools import partial
+from datetime import datetime, timezone
+from django.conf import settings
+
+from .registry import ModelRegistry, MODEL_FILENAME, METADATA_FILENAME, artifact_paths
+from .numpy_engine import (
+    NUMPY_WEIGHTS_FILENAME,
+    QUANTIZED_WEIGHTS_FILENAME,
+    NumpyMLP,
+    export_numpy_weights,
+    load_numpy_model,
+)
+
+# TensorFlow is imported inside the functions that need it, so workers running
+# the NumPy engine never load it
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIRNAME = 'versions'
+CURRENT_POINTER = 'CURRENT'
+
+
+class ModelNotAvailable(Exception):
+    """Raised when no trained model has been published"""
 
 
 def build_model(input_size=6, output_size=4):
@@ -16,6 +39,8 @@ def build_model(input_size=6, output_size=4):
     Returns:
         A compiled TensorFlow model
     """
+    import tensorflow as tf
+
     inputs = tf.keras.Input(shape=(input_size,))
     x = tf.keras.layers.Dense(32, activation='relu')(inputs)
     x = tf.keras.layers.Dropout(0.4)(x)
@@ -31,10 +56,19 @@ def build_model(input_size=6, output_size=4):
     return model
 
 
-def train_and_save_model():
+def train_model(epochs=200):
     """
-    Train the model with predefined data and save it
+    Train the model with predefined data
+
+    Args:
+        epochs: Number of training epochs
+
+    Returns:
+        model: The trained TensorFlow model
+        metadata: Dictionary with model metadata
     """
+    import tensorflow as tf
+
     # Extended training data with more symptoms
     # [Fever, Cough, Sneezing, Fatigue, Loss of Taste, Itchy Eyes, Sore Throat, Body Aches, Chills]
     X_train = np.array([
@@ -78,15 +112,8 @@ def train_and_save_model():
 
     # Build and train the model
     model = build_model(input_size=X_train.shape[1], output_size=len(diseases))
-    model.fit(X_train, y_train, epochs=200, verbose=0)
+    model.fit(X_train, y_train, epochs=epochs, verbose=0)
 
-    # Save the model
-    model_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'ml', 'saved_models')
-    os.makedirs(model_dir, exist_ok=True)
-    model_path = os.path.join(model_dir, 'health_model.h5')
-    model.save(model_path)
-
-    # Save metadata
     metadata = {
         "diseases": diseases,
         "symptoms": symptoms,
@@ -94,33 +121,358 @@ def train_and_save_model():
         "medicine_recommendations": medicine_recommendations
     }
 
-    metadata_path = os.path.join(model_dir, 'metadata.json')
-    with open(metadata_path, 'w') as f:
-        json.dump(metadata, f)
-
     return model, metadata
 
 
-def load_trained_model():
+def publish_model(model, metadata, version=None, activate=True):
     """
-    Load the trained model and metadata
+    Write a model version to its own directory and make it the current one
+
+    Files are written to a temporary directory that is renamed into
+    versions/<version>/ once complete, and the CURRENT pointer is replaced
+    with os.replace, so workers only ever see a finished version.
+
+    Args:
+        model: The trained TensorFlow model
+        metadata: Dictionary with model metadata
+        version: Version name (a UTC timestamp by default)
+        activate: Whether to point CURRENT at the new version
+
+    Returns:
+        version: Name of the published version
+    """
+    versions_dir = os.path.join(get_model_root(), VERSIONS_DIRNAME)
+    os.makedirs(versions_dir, exist_ok=True)
+
+    version = version or datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+    model_dir = os.path.join(versions_dir, version)
+    if os.path.exists(model_dir):
+        raise FileExistsError(f"Model version {version} already exists")
+
+    tmp_dir = os.path.join(versions_dir, f".{version}.{os.getpid()}.tmp")
+    os.makedirs(tmp_dir)
+
+    # Save the model
+    model.save(os.path.join(tmp_dir, MODEL_FILENAME))
+    export_numpy_weights(model, os.path.join(tmp_dir, NUMPY_WEIGHTS_FILENAME))
+    export_numpy_weights(model, os.path.join(tmp_dir, QUANTIZED_WEIGHTS_FILENAME), get_quantization())
+
+    # Save metadata
+    with open(os.path.join(tmp_dir, METADATA_FILENAME), 'w') as f:
+        json.dump(dict(metadata, version=version), f)
+
+    os.rename(tmp_dir, model_dir)
+
+    if activate:
+        activate_model_version(version)
+
+    return version
+
+
+def activate_model_version(version):
+    """
+    Atomically point CURRENT at an existing model version
+
+    Args:
+        version: Name of a directory under versions/
+    """
+    root = get_model_root()
+    model_dir = os.path.join(root, VERSIONS_DIRNAME, version)
+    if not model_available(model_dir):
+        raise ModelNotAvailable(f"Model version {version} is missing or incomplete")
+
+    pointer_path = os.path.join(root, CURRENT_POINTER)
+    tmp_path = f"{pointer_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, pointer_path)
+    logger.info("Activated model version %s", version)
+
+
+def train_and_save_model(epochs=200):
+    """
+    Train the model with predefined data and publish it as the current version
+    """
+    model, metadata = train_model(epochs=epochs)
+    version = publish_model(model, metadata)
+    return model, dict(metadata, version=version)
+
+
+def get_model_root():
+    """
+    Directory holding the model versions and the CURRENT pointer
+    """
+    default_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'ml', 'saved_models')
+    return getattr(settings, 'AI_MODEL_PATH', default_dir)
+
+
+def get_current_version():
+    """
+    Name of the active model version, or None for the flat legacy layout
+    """
+    pointer_path = os.path.join(get_model_root(), CURRENT_POINTER)
+    try:
+        with open(pointer_path, 'r') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def get_model_dir():
+    """
+    Directory holding the saved model and its metadata
+
+    This is versions/<CURRENT>/ once a version has been published, and the
+    model root itself for models saved before versioning.
+    """
+    root = get_model_root()
+    version = get_current_version()
+    if version:
+        return os.path.join(root, VERSIONS_DIRNAME, version)
+    return root
+
+
+def model_available(model_dir=None, engine=None):
+    """
+    Whether the files an inference engine serves from exist in a model directory
+
+    The NumPy engines need only their exported weights and the metadata, not the Keras model.
+
+    Args:
+        model_dir: Directory containing the model artifacts (defaults to get_model_dir())
+        engine: 'keras', 'numpy' or 'quantized' (AI_MODEL_ENGINE by default)
+    """
+    model_dir = model_dir or get_model_dir()
+    artifacts = model_registries[engine or get_engine()].artifacts
+    return all(os.path.exists(path) for path in artifact_paths(model_dir, artifacts))
+
+
+def get_engine():
+    """
+    Inference engine used to serve predictions ('keras', 'numpy' or 'quantized')
+    """
+    return getattr(settings, 'AI_MODEL_ENGINE', 'keras')
+
+
+def get_quantization():
+    """
+    Weight format of the 'quantized' engine ('int8' or 'float16')
+    """
+    return getattr(settings, 'AI_MODEL_QUANTIZATION', 'int8')
+
+
+def read_model_metadata(model_dir=None):
+    """
+    Read only the metadata of the published model (no model weights or TensorFlow)
+
+    Args:
+        model_dir: Directory containing the model artifacts (defaults to get_model_dir())
+
+    Returns:
+        metadata: Dictionary with model metadata
+    """
+    with open(os.path.join(model_dir or get_model_dir(), METADATA_FILENAME), 'r') as f:
+        return json.load(f)
+
+
+def read_model_artifacts(model_dir):
+    """
+    Read the Keras model and metadata from disk, bypassing the registry
+
+    Args:
+        model_dir: Directory containing the model artifacts
 
     Returns:
         model: The trained TensorFlow model
         metadata: Dictionary with model metadata
     """
-    model_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'ml', 'saved_models')
-    model_path = os.path.join(model_dir, 'health_model.h5')
-    metadata_path = os.path.join(model_dir, 'metadata.json')
+    from tensorflow.keras.models import load_model
+
+    model = load_model(os.path.join(model_dir, MODEL_FILENAME))
 
-    # Check if model exists, otherwise train it
-    if not os.path.exists(model_path) or not os.path.exists(metadata_path):
-        return train_and_save_model()
+    with open(os.path.join(model_dir, METADATA_FILENAME), 'r') as f:
+        metadata = json.load(f)
+
+    return model, metadata
 
-    # Load model and metadata
-    model = load_model(model_path)
 
-    with open(metadata_path, 'r') as f:
+def read_numpy_artifacts(model_dir, filename=NUMPY_WEIGHTS_FILENAME):
+    """
+    Read the exported NumPy weights and metadata from disk, bypassing the registry
+
+    Args:
+        model_dir: Directory containing the model artifacts
+        filename: Weights file (the float32 or the quantized export)
+
+    Returns:
+        model: NumpyMLP with the exported weights
+        metadata: Dictionary with model metadata
+    """
+    model = load_numpy_model(os.path.join(model_dir, filename))
+
+    with open(os.path.join(model_dir, METADATA_FILENAME), 'r') as f:
         metadata = json.load(f)
 
-    return model, metadata
\ No newline at end of file
+    return model, metadata
+
+
+def export_numpy_model(model_dir=None, quantization=None):
+    """
+    Export the weights of the saved Keras model for the NumPy engines
+
+    The file is written under a temporary name and renamed into place, so
+    workers never read a partial export.
+
+    Args:
+        model_dir: Directory containing the model artifacts (defaults to get_model_dir())
+        quantization: None for the float32 'numpy' engine, or 'int8' / 'float16'
+            for the 'quantized' engine
+
+    Returns:
+        path: Path of the written .npz file
+    """
+    model_dir = model_dir or get_model_dir()
+    model, _ = read_model_artifacts(model_dir)
+
+    filename = QUANTIZED_WEIGHTS_FILENAME if quantization else NUMPY_WEIGHTS_FILENAME
+    path = os.path.join(model_dir, filename)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    export_numpy_weights(model, tmp_path, quantization)
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def get_registry_check_interval():
+    """
+    Seconds between checks of the model files for a new version
+    """
+    return getattr(settings, 'AI_MODEL_REGISTRY_CHECK_INTERVAL', 1.0)
+
+
+# Loaded models are shared by every request in this process
+model_registries = {
+    'keras': ModelRegistry(
+        read_model_artifacts,
+        artifacts=(MODEL_FILENAME, METADATA_FILENAME),
+        check_interval=get_registry_check_interval
+    ),
+    'numpy': ModelRegistry(
+        read_numpy_artifacts,
+        artifacts=(NUMPY_WEIGHTS_FILENAME, METADATA_FILENAME),
+        check_interval=get_registry_check_interval
+    ),
+    'quantized': ModelRegistry(
+        partial(read_numpy_artifacts, filename=QUANTIZED_WEIGHTS_FILENAME),
+        artifacts=(QUANTIZED_WEIGHTS_FILENAME, METADATA_FILENAME),
+        check_interval=get_registry_check_interval
+    ),
+}
+
+
+def get_model_entry(engine=None):
+    """
+    Get the registry entry (model, metadata and version) for the current model
+
+    Args:
+        engine: 'keras', 'numpy' or 'quantized' (AI_MODEL_ENGINE by default)
+
+    Returns:
+        entry: ModelEntry from the engine's registry
+    """
+    engine = engine or get_engine()
+    if engine not in model_registries:
+        raise ValueError(f"Unknown inference engine: {engine}")
+
+    model_dir = get_model_dir()
+
+    # Training and exports are offline steps (manage.py train_model / export_numpy_model),
+    # never part of a request, so serving with a NumPy engine doesn't load TensorFlow
+    if not model_available(model_dir, engine):
+        if engine == 'keras' or not os.path.exists(os.path.join(model_dir, METADATA_FILENAME)):
+            logger.error("No trained model in %s, run 'python manage.py train_model'", model_dir)
+            raise ModelNotAvailable(f"No trained model found in {model_dir}")
+        command = _export_command(engine)
+        logger.error("No %s weights in %s, run '%s'", engine, model_dir, command)
+        raise ModelNotAvailable(f"No {engine} weights found in {model_dir}, run '{command}'")
+
+    entry = model_registries[engine].get(model_dir)
+
+    # The export records its mode, so a changed AI_MODEL_QUANTIZATION is noticed
+    if engine == 'quantized' and entry.model.quantization != get_quantization():
+        command = _export_command(engine)
+        logger.error("Quantized weights in %s are %s, not %s, run '%s'",
+                     model_dir, entry.model.quantization, get_quantization(), command)
+        raise ModelNotAvailable(
+            f"Quantized weights in {model_dir} are {entry.model.quantization}, run '{command}'"
+        )
+
+    return entry
+
+
+def _export_command(engine):
+    command = 'python manage.py export_numpy_model'
+    if engine == 'quantized':
+        command += f' --quantize {get_quantization()}'
+    return command
+
+
+def load_trained_model(engine=None):
+    """
+    Load the trained model and metadata
+
+    The model is read from disk once per process and then served from the
+    model registry, which reloads it when the artifacts change.
+
+    Args:
+        engine: 'keras', 'numpy' or 'quantized' (AI_MODEL_ENGINE by default)
+
+    Returns:
+        model: The trained model (TensorFlow model or NumpyMLP)
+        metadata: Dictionary with model metadata
+    """
+    entry = get_model_entry(engine)
+    return entry.model, entry.metadata
+
+
+# Traced dropout-enabled forward passes, dropped together with their model
+_mc_forwards = weakref.WeakKeyDictionary()
+
+
+def get_mc_forward(model):
+    """
+    Get a callable that runs the model with dropout enabled
+
+    For Keras models this is a tf.function traced once per model with a
+    variable batch dimension (unless AI_MODEL_COMPILE_FORWARD is off), which
+    avoids eager per-op dispatch on every call.
+
+    Args:
+        model: TensorFlow model or NumpyMLP
+
+    Returns:
+        forward: Function taking an input batch and returning probabilities
+    """
+    if isinstance(model, NumpyMLP) or not getattr(settings, 'AI_MODEL_COMPILE_FORWARD', True):
+        return lambda x, **kwargs: model(x, training=True, **kwargs)
+
+    forward = _mc_forwards.get(model)
+    if forward is None:
+        import tensorflow as tf
+
+        # Only a weak reference, so the cache entry doesn't keep the model alive
+        model_ref = weakref.ref(model)
+        forward = tf.function(
+            lambda x: model_ref()(x, training=True),
+            input_signature=[tf.TensorSpec(shape=[None, model.input_shape[-1]], dtype=tf.float32)]
+        )
+        _mc_forwards[model] = forward
+
+    return forward
+
+
+def get_registry_stats():
+    """
+    Cache hit and load-time counters of the model registries
+    """
+    return {engine: registry.stats() for engine, registry in model_registries.items()}
@@ -0,0 +1,178 @@
+import json
+
+import numpy as np
+
+
+NUMPY_WEIGHTS_FILENAME = 'health_model.npz'
+QUANTIZED_WEIGHTS_FILENAME = 'health_model.quant.npz'
+QUANTIZATION_MODES = ('float16', 'int8')
+
+
+def _softmax(x):
+    x = x - x.max(axis=-1, keepdims=True)
+    e = np.exp(x)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'softmax': _softmax,
+}
+
+
+class NumpyMLP:
+    """
+    Inference-only copy of the diagnosis network that runs on NumPy
+
+    Called like a Keras model: ``model(x, training=True)`` applies fresh
+    dropout masks to every row, which is what MC Dropout relies on.
+    """
+
+    def __init__(self, layers):
+        """
+        Args:
+            layers: List of dicts, either {'type': 'dense', 'kernel', 'bias',
+                'activation'} or {'type': 'dropout', 'rate'}
+        """
+        self.layers = layers
+        self.quantization = None
+
+    def __call__(self, x, training=False, rng=None):
+        x = np.asarray(x, dtype=np.float32)
+        if training and rng is None:
+            rng = np.random.default_rng()
+
+        for layer in self.layers:
+            if layer['type'] == 'dense':
+                kernel = layer['kernel']
+                # Quantized kernels stay resident as int8/float16 and are widened one layer at a time
+                if kernel.dtype != np.float32:
+                    kernel = kernel.astype(np.float32)
+                y = x @ kernel
+                if 'kernel_scale' in layer:
+                    # One scale per output unit, so it can be applied after the matmul
+                    y *= layer['kernel_scale']
+                x = ACTIVATIONS[layer['activation']](y + layer['bias'])
+            elif training and layer['rate'] > 0:
+                keep = 1.0 - layer['rate']
+                mask = rng.random(x.shape, dtype=np.float32) < keep
+                x = x * mask / np.float32(keep)
+
+        return x
+
+    @property
+    def input_size(self):
+        return self.layers[0]['kernel'].shape[0]
+
+    @property
+    def weight_bytes(self):
+        """Bytes of the resident weight arrays"""
+        return sum(
+            array.nbytes for layer in self.layers for array in layer.values() if isinstance(array, np.ndarray)
+        )
+
+
+def _model_layers(model):
+    layers = []
+    for layer in model.layers:
+        class_name = layer.__class__.__name__
+        if class_name == 'Dense':
+            kernel, bias = layer.get_weights()
+            layers.append({
+                'type': 'dense',
+                'activation': layer.get_config()['activation'],
+                'kernel': kernel.astype(np.float32),
+                'bias': bias.astype(np.float32),
+            })
+        elif class_name == 'Dropout':
+            layers.append({'type': 'dropout', 'rate': float(layer.rate)})
+        elif class_name != 'InputLayer':
+            raise ValueError(f"Layer type {class_name} is not supported by the NumPy engine")
+    return layers
+
+
+def _quantize_kernel(kernel, mode):
+    if mode == 'float16':
+        return {'kernel': kernel.astype(np.float16)}
+
+    # Symmetric int8 with one scale per output unit
+    scale = np.abs(kernel).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    return {
+        'kernel': np.round(kernel / scale).clip(-127, 127).astype(np.int8),
+        'kernel_scale': scale.astype(np.float32),
+    }
+
+
+def export_numpy_weights(model, path, quantization=None):
+    """
+    Write the weights of a Keras Dense/Dropout model to an .npz file
+
+    Arrays are stored uncompressed so they can be read without inflating.
+
+    Args:
+        model: Trained TensorFlow model built by build_model
+        path: Output .npz path
+        quantization: None for float32 weights, or 'float16' / 'int8' to
+            quantize the kernels (biases stay float32)
+
+    Returns:
+        path: Path of the written file
+    """
+    if quantization is not None and quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode: {quantization}")
+
+    arrays = {}
+    config = []
+
+    for index, layer in enumerate(_model_layers(model)):
+        if layer['type'] == 'dense':
+            kernel_arrays = (_quantize_kernel(layer['kernel'], quantization)
+                             if quantization else {'kernel': layer['kernel']})
+            for name, array in kernel_arrays.items():
+                arrays[f'{name}_{index}'] = array
+            arrays[f'bias_{index}'] = layer['bias']
+            config.append({'type': 'dense', 'activation': layer['activation']})
+        else:
+            config.append({'type': 'dropout', 'rate': layer['rate']})
+
+    arrays['config'] = np.array(json.dumps({'layers': config, 'quantization': quantization}))
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+
+    return path
+
+
+def load_numpy_model(path):
+    """
+    Load a NumpyMLP from an .npz file written by export_numpy_weights
+
+    Quantized kernels are kept in their stored dtype (with their int8
+    scales) and only widened to float32 inside the forward pass.
+
+    Args:
+        path: Path to the .npz file
+
+    Returns:
+        model: NumpyMLP instance
+    """
+    with np.load(path, allow_pickle=False) as data:
+        config = json.loads(str(data['config']))
+        # Files exported before quantization support hold just the layer list
+        if isinstance(config, list):
+            config = {'layers': config, 'quantization': None}
+
+        layers = []
+        for index, layer in enumerate(config['layers']):
+            layer = dict(layer)
+            if layer['type'] == 'dense':
+                layer['kernel'] = data[f'kernel_{index}']
+                if f'kernel_scale_{index}' in data.files:
+                    layer['kernel_scale'] = data[f'kernel_scale_{index}']
+                layer['bias'] = data[f'bias_{index}']
+            layers.append(layer)
+
+    model = NumpyMLP(layers)
+    model.quantization = config['quantization']
+    return model
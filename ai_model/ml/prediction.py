@@ -1,113 +1,354 @@
 import numpy as np
-import tensorflow as tf
-from .model_builder import load_trained_model
-import os
+from .model_builder import get_model_entry, get_mc_forward
+from .lookup import get_lookup_table, lookup_prediction, symptom_index
+from .batching import InferenceBatcher
+from .tts import get_audio_cache
 import json
-from gtts import gTTS
+import threading
+from django.conf import settings
 
+_batcher = None
+_batcher_lock = threading.Lock()
 
-def predict_with_uncertainty(model, x, n_iter=100):
+
+def sample_predictions(model, x, n_iter, chunk_size=None, rng=None):
+    """
+    Draw n_iter dropout-enabled predictions for every input row
+
+    The input is tiled into an (n_iter * batch) tensor so all dropout samples
+    come out of one forward pass (or a few, when chunk_size is set).
+
+    Args:
+        model: TensorFlow model or NumpyMLP with dropout layers
+        x: Input features
+        n_iter: Number of samples per input
+        chunk_size: Max rows per forward pass (None or 0 means a single pass)
+        rng: NumPy Generator for reproducible dropout masks (NumPy engine only)
+
+    Returns:
+        preds: Array of shape (n_iter, batch, n_classes)
+    """
+    x = np.asarray(x, dtype=np.float32)
+    batch_size = x.shape[0]
+    call_kwargs = {}
+    if rng is not None:
+        call_kwargs['rng'] = rng
+
+    # Enable dropout at inference time
+    forward = get_mc_forward(model)
+
+    # Row k * batch_size + i is sample k of input i; each row gets its own dropout mask
+    tiled = np.tile(x, (n_iter, 1))
+    if not chunk_size or chunk_size >= len(tiled):
+        preds = np.asarray(forward(tiled, **call_kwargs))
+    else:
+        preds = np.concatenate([
+            np.asarray(forward(tiled[start:start + chunk_size], **call_kwargs))
+            for start in range(0, len(tiled), chunk_size)
+        ])
+
+    return preds.reshape(n_iter, batch_size, -1)
+
+
+def predict_with_uncertainty(model, x, n_iter=None, chunk_size=None, rng=None):
     """
     Make predictions with uncertainty estimation using Monte Carlo Dropout
 
     Args:
-        model: TensorFlow model with dropout layers
+        model: TensorFlow model or NumpyMLP with dropout layers
         x: Input features
-        n_iter: Number of iterations for MC Dropout
+        n_iter: Number of iterations for MC Dropout (AI_MODEL_MC_ITERATIONS by default)
+        chunk_size: Max rows per forward pass (AI_MODEL_MC_CHUNK_SIZE by default,
+            None or 0 means a single pass)
+        rng: NumPy Generator for reproducible dropout masks (NumPy engine only)
 
     Returns:
         mean: Mean prediction probabilities
         std: Standard deviation of predictions (uncertainty)
     """
-    # Enable dropout at inference time
-    preds = np.array([model(x, training=True).numpy() for _ in range(n_iter)])
+    if n_iter is None:
+        n_iter = getattr(settings, 'AI_MODEL_MC_ITERATIONS', 100)
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'AI_MODEL_MC_CHUNK_SIZE', None)
+
+    preds = sample_predictions(model, x, n_iter, chunk_size, rng)
     mean = preds.mean(axis=0)
     std = preds.std(axis=0)
     return mean, std
 
 
-def get_diagnosis(symptom_values):
+def adaptive_predict_with_uncertainty(model, x, tolerance=None, min_samples=None, max_samples=None,
+                                      block_size=None, rng=None):
     """
-    Get diagnosis based on symptoms
+    MC Dropout that stops sampling each input once its prediction has converged
+
+    Samples are drawn in blocks. After at least min_samples, an input stops
+    once the standard error of its top-class probability (std / sqrt(n)) is
+    below tolerance, or when it reaches max_samples.
 
     Args:
-        symptom_values: List or array of symptom values (0 or 1)
+        model: TensorFlow model or NumpyMLP with dropout layers
+        x: Input features
+        tolerance: Target standard error (AI_MODEL_MC_TOLERANCE by default)
+        min_samples: Samples drawn before checking convergence (AI_MODEL_MC_MIN_SAMPLES by default)
+        max_samples: Upper bound on samples per input (AI_MODEL_MC_ITERATIONS by default)
+        block_size: Samples drawn per round (AI_MODEL_MC_BLOCK_SIZE by default)
+        rng: NumPy Generator for reproducible dropout masks (NumPy engine only)
 
     Returns:
-        result: Dictionary with diagnosis results
+        mean: Mean prediction probabilities
+        std: Standard deviation of predictions (uncertainty)
+        n_samples: Number of samples used for each input
     """
-    # Load model and metadata
-    model, metadata = load_trained_model()
+    if tolerance is None:
+        tolerance = getattr(settings, 'AI_MODEL_MC_TOLERANCE', 0.01)
+    if min_samples is None:
+        min_samples = getattr(settings, 'AI_MODEL_MC_MIN_SAMPLES', 20)
+    if max_samples is None:
+        max_samples = getattr(settings, 'AI_MODEL_MC_ITERATIONS', 100)
+    if block_size is None:
+        block_size = getattr(settings, 'AI_MODEL_MC_BLOCK_SIZE', 10)
+    chunk_size = getattr(settings, 'AI_MODEL_MC_CHUNK_SIZE', None)
+
+    x = np.asarray(x, dtype=np.float32)
+    batch_size = x.shape[0]
+
+    # Running sums per input, so only still-active rows are sampled again
+    total = None
+    total_sq = None
+    n_samples = np.zeros(batch_size, dtype=np.int64)
+    active = np.arange(batch_size)
+    drawn = 0
+
+    while len(active):
+        # The first round draws min_samples, later rounds one block each
+        n_draw = min_samples if drawn == 0 else block_size
+        n_draw = max(1, min(n_draw, max_samples - drawn))
+
+        preds = sample_predictions(model, x[active], n_draw, chunk_size, rng).astype(np.float64)
+        if total is None:
+            total = np.zeros((batch_size, preds.shape[-1]))
+            total_sq = np.zeros_like(total)
+        total[active] += preds.sum(axis=0)
+        total_sq[active] += (preds ** 2).sum(axis=0)
+        drawn += n_draw
+        n_samples[active] = drawn
+
+        mean = total[active] / drawn
+        std = np.sqrt(np.maximum(total_sq[active] / drawn - mean ** 2, 0))
+        top = np.argmax(mean, axis=1)
+        std_error = std[np.arange(len(active)), top] / np.sqrt(drawn)
+
+        if drawn >= max_samples:
+            break
+        active = active[std_error >= tolerance]
+
+    mean = total / n_samples[:, None]
+    std = np.sqrt(np.maximum(total_sq / n_samples[:, None] - mean ** 2, 0))
+    return mean.astype(np.float32), std.astype(np.float32), n_samples
+
+
+def use_lookup_table(symptom_values, metadata):
+    """
+    Whether a symptom vector can be answered from the precomputed lookup table
+    """
+    if not getattr(settings, 'AI_MODEL_LOOKUP_TABLE', False):
+        return False
+    return (len(symptom_values) == len(metadata["symptoms"])
+            and all(value in (0, 1) for value in symptom_values))
+
 
-    # Convert symptom values to numpy array
-    symptoms_array = np.array([symptom_values], dtype=np.float32)
+def build_result(metadata, mean_probs, std_probs, n_samples):
+    """
+    Build the diagnosis result dictionary for one input
 
-    # Make prediction with uncertainty
-    mean_probs, std_probs = predict_with_uncertainty(model, symptoms_array)
+    Args:
+        metadata: Dictionary with model metadata
+        mean_probs: Mean prediction probabilities for one input
+        std_probs: Standard deviation of predictions for one input
+        n_samples: Number of MC Dropout samples behind the prediction
 
+    Returns:
+        result: Dictionary with diagnosis results
+    """
     # Get the most likely disease
-    most_likely_idx = np.argmax(mean_probs[0])
+    most_likely_idx = np.argmax(mean_probs)
     diagnosis = metadata["diseases"][most_likely_idx]
 
     # Create result dictionary
     result = {
         "diagnosis": diagnosis,
-        "confidence": float(mean_probs[0][most_likely_idx]),
-        "uncertainty": float(std_probs[0][most_likely_idx]),
+        "confidence": float(mean_probs[most_likely_idx]),
+        "uncertainty": float(std_probs[most_likely_idx]),
         "test_recommendation": metadata["test_recommendations"][diagnosis],
         "medicine_recommendation": metadata["medicine_recommendations"][diagnosis],
         "probabilities": {
-            disease: float(mean_probs[0][i]) for i, disease in enumerate(metadata["diseases"])
+            disease: float(mean_probs[i]) for i, disease in enumerate(metadata["diseases"])
         },
         "uncertainties": {
-            disease: float(std_probs[0][i]) for i, disease in enumerate(metadata["diseases"])
-        }
+            disease: float(std_probs[i]) for i, disease in enumerate(metadata["diseases"])
+        },
+        "n_samples": int(n_samples)
     }
 
     return result
 
 
-def text_to_speech(text, filename="diagnosis.mp3"):
+def check_symptom_values(symptom_values, metadata):
+    """
+    Raise ValueError if a symptom vector does not match the model input size
+    """
+    expected = len(metadata["symptoms"])
+    if len(symptom_values) != expected:
+        raise ValueError(f"Expected {expected} symptom values, got {len(symptom_values)}")
+
+
+def diagnose_batch(symptom_matrix):
     """
-    Convert text to speech and save as mp3
+    Get diagnoses for several symptom vectors with one batched MC Dropout pass
+
+    Args:
+        symptom_matrix: List of symptom value lists (0 or 1)
+
+    Returns:
+        results: List of diagnosis result dictionaries, in input order
+    """
+    # Load model and metadata
+    entry = get_model_entry()
+    model, metadata = entry.model, entry.metadata
+
+    for symptom_values in symptom_matrix:
+        check_symptom_values(symptom_values, metadata)
+
+    n_iter = getattr(settings, 'AI_MODEL_MC_ITERATIONS', 100)
+
+    if symptom_matrix and all(use_lookup_table(values, metadata) for values in symptom_matrix):
+        # Precomputed MC Dropout results, one table row per symptom vector
+        mean_table, std_table = get_lookup_table(entry)
+        indices = [symptom_index(values) for values in symptom_matrix]
+        mean_probs, std_probs = mean_table[indices], std_table[indices]
+        n_samples = [n_iter] * len(symptom_matrix)
+    else:
+        # Convert symptom values to numpy array
+        symptoms_array = np.array(symptom_matrix, dtype=np.float32)
+
+        # Make prediction with uncertainty
+        if getattr(settings, 'AI_MODEL_MC_ADAPTIVE', False):
+            mean_probs, std_probs, n_samples = adaptive_predict_with_uncertainty(model, symptoms_array)
+        else:
+            mean_probs, std_probs = predict_with_uncertainty(model, symptoms_array, n_iter=n_iter)
+            n_samples = [n_iter] * len(symptom_matrix)
+
+    return [
+        build_result(metadata, mean_probs[i], std_probs[i], n_samples[i])
+        for i in range(len(symptom_matrix))
+    ]
+
+
+def get_batcher():
+    """
+    Get the process-wide micro-batching scheduler, creating it on first use
+    """
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = InferenceBatcher(
+                    diagnose_batch,
+                    max_batch_size=getattr(settings, 'AI_MODEL_BATCH_MAX_SIZE', 32),
+                    max_wait_ms=getattr(settings, 'AI_MODEL_BATCH_MAX_WAIT_MS', 5)
+                )
+    return _batcher
+
+
+def get_batcher_stats():
+    """
+    Scheduler metrics of this process's micro-batcher (None until batching is first used)
+    """
+    return _batcher.stats() if _batcher is not None else None
+
+
+def get_diagnosis(symptom_values):
+    """
+    Get diagnosis based on symptoms
+
+    Args:
+        symptom_values: List or array of symptom values (0 or 1)
+
+    Returns:
+        result: Dictionary with diagnosis results
+    """
+    # Load model and metadata
+    entry = get_model_entry()
+    metadata = entry.metadata
+    check_symptom_values(symptom_values, metadata)
+
+    if use_lookup_table(symptom_values, metadata):
+        # Precomputed MC Dropout result for this exact symptom vector
+        mean_probs, std_probs = lookup_prediction(symptom_values, entry)
+        return build_result(metadata, mean_probs[0], std_probs[0],
+                            getattr(settings, 'AI_MODEL_MC_ITERATIONS', 100))
+
+    if getattr(settings, 'AI_MODEL_BATCHING', False):
+        # Run together with other requests waiting in this process
+        return get_batcher().predict(list(symptom_values))
+
+    return diagnose_batch([symptom_values])[0]
+
+
+def text_to_speech(text, filename=None):
+    """
+    Convert text to speech with the configured TTS backend
+
+    Identical text is synthesized once and served from the audio cache.
 
     Args:
         text: Text to convert to speech
-        filename: Output filename
+        filename: Unused, kept for backwards compatibility (files are named
+            by a hash of the text)
 
     Returns:
-        file_path: Path to the generated audio file
+        file_path: Path to the generated audio file, relative to MEDIA_ROOT
     """
-    # Determine the save directory
-    media_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'media')
-    audio_dir = os.path.join(media_dir, 'audio')
-    os.makedirs(audio_dir, exist_ok=True)
+    return get_audio_cache().render(text)
 
-    file_path = os.path.join(audio_dir, filename)
 
-    # Generate speech using gTTS
-    tts = gTTS(text=text, lang='en', slow=False)
-    tts.save(file_path)
+def diagnosis_speech_text(diagnosis, confidence_percent, test, medicine):
+    """
+    Sentence spoken for a diagnosis
+
+    Args:
+        diagnosis: Disease name
+        confidence_percent: Confidence as an integer percentage
+        test: Recommended test
+        medicine: Recommended medicine
 
-    return os.path.join('audio', filename)
+    Returns:
+        text: Text to convert to speech
+    """
+    text = f"Based on your symptoms, you may have {diagnosis} with a confidence of {confidence_percent} percent. "
+    text += f"I recommend you take a {test} and consider {medicine}."
+    return text
 
 
-def generate_audio_diagnosis(diagnosis_result):
+def generate_audio_diagnosis(diagnosis_result, wait=False):
     """
     Generate audio for diagnosis result
 
     Args:
         diagnosis_result: Dictionary with diagnosis results
+        wait: Synthesize in this thread instead of in the background
 
     Returns:
-        audio_path: Path to audio file
+        audio_path: Path to audio file, relative to MEDIA_ROOT (with wait=False
+            the file appears once the background synthesis is done)
     """
-    diagnosis = diagnosis_result["diagnosis"]
-    confidence = int(diagnosis_result["confidence"] * 100)
-    test = diagnosis_result["test_recommendation"]
-    medicine = diagnosis_result["medicine_recommendation"]
-
-    text = f"Based on your symptoms, you may have {diagnosis} with a confidence of {confidence} percent. "
-    text += f"I recommend you take a {test} and consider {medicine}."
+    text = diagnosis_speech_text(
+        diagnosis_result["diagnosis"],
+        int(diagnosis_result["confidence"] * 100),
+        diagnosis_result["test_recommendation"],
+        diagnosis_result["medicine_recommendation"]
+    )
 
-    return text_to_speech(text, f"diagnosis_{diagnosis.lower().replace('-', '_')}.mp3")
\ No newline at end of file
+    cache = get_audio_cache()
+    return cache.render(text) if wait else cache.schedule(text)
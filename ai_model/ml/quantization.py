@@ -0,0 +1,81 @@
+import os
+import tempfile
+
+import numpy as np
+
+from .lookup import all_symptom_vectors
+from .model_builder import (
+    get_model_dir,
+    get_quantization,
+    read_model_artifacts,
+    read_numpy_artifacts,
+)
+from .numpy_engine import (
+    NUMPY_WEIGHTS_FILENAME,
+    QUANTIZED_WEIGHTS_FILENAME,
+    export_numpy_weights,
+    load_numpy_model,
+)
+from .registry import MODEL_FILENAME
+from .prediction import predict_with_uncertainty
+
+
+def compare_outputs(reference, candidate):
+    """
+    Absolute error and top-1 agreement of two (batch, n_classes) probability arrays
+    """
+    diff = np.abs(reference - candidate)
+    return {
+        'max_abs_diff': float(diff.max()),
+        'mean_abs_diff': float(diff.mean()),
+        'top1_agreement': float(np.mean(reference.argmax(axis=-1) == candidate.argmax(axis=-1))),
+    }
+
+
+def quantization_report(model_dir=None, mode=None, n_iter=100, seed=0):
+    """
+    Compare the quantized weights against the float32 model on every binary symptom vector
+
+    Args:
+        model_dir: Directory containing the model artifacts (defaults to get_model_dir())
+        mode: 'int8' or 'float16' (AI_MODEL_QUANTIZATION by default)
+        n_iter: MC Dropout samples per input for the mean/std comparison
+        seed: Seed of the dropout masks, shared by both runs
+
+    Returns:
+        report: Dictionary with artifact sizes, resident weight sizes, deterministic output error and
+            MC Dropout mean/std error against the float32 NumPy engine
+    """
+    model_dir = model_dir or get_model_dir()
+    mode = mode or get_quantization()
+
+    keras_model, _ = read_model_artifacts(model_dir)
+    float_model, _ = read_numpy_artifacts(model_dir)
+    # Exported to a scratch directory, so the served quantized weights are left alone
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        quantized_path = export_numpy_weights(keras_model, os.path.join(tmp_dir, QUANTIZED_WEIGHTS_FILENAME), mode)
+        quantized_size = os.path.getsize(quantized_path)
+        quantized_model = load_numpy_model(quantized_path)
+
+    x = all_symptom_vectors(float_model.input_size)
+    reference = np.asarray(keras_model(x, training=False))
+
+    float_mean, float_std = predict_with_uncertainty(float_model, x, n_iter, rng=np.random.default_rng(seed))
+    quant_mean, quant_std = predict_with_uncertainty(quantized_model, x, n_iter, rng=np.random.default_rng(seed))
+
+    return {
+        'mode': mode,
+        'inputs': len(x),
+        'sizes': {
+            'keras': os.path.getsize(os.path.join(model_dir, MODEL_FILENAME)),
+            'numpy': os.path.getsize(os.path.join(model_dir, NUMPY_WEIGHTS_FILENAME)),
+            'quantized': quantized_size,
+        },
+        'weight_bytes': {
+            'numpy': float_model.weight_bytes,
+            'quantized': quantized_model.weight_bytes,
+        },
+        'deterministic': compare_outputs(reference, quantized_model(x)),
+        'mc_mean': compare_outputs(float_mean, quant_mean),
+        'mc_std_max_abs_diff': float(np.abs(float_std - quant_std).max()),
+    }
@@ -0,0 +1,180 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILENAME = 'health_model.h5'
+METADATA_FILENAME = 'metadata.json'
+
+
+class ModelEntry:
+    """
+    A loaded model together with the fingerprint of the artifacts it came from
+    """
+
+    def __init__(self, model, metadata, model_dir, stamp, checksum, load_time):
+        self.model = model
+        self.metadata = metadata
+        self.model_dir = model_dir
+        self.stamp = stamp
+        self.checksum = checksum
+        # Published versions carry their name; older models are named by content
+        self.version = metadata.get('version') or checksum[:12]
+        self.load_time = load_time
+        self.loaded_at = time.time()
+        self.checked_at = self.loaded_at
+
+
+def artifact_paths(model_dir, filenames=(MODEL_FILENAME, METADATA_FILENAME)):
+    """
+    Paths of the files that make up one model version
+    """
+    return [os.path.join(model_dir, filename) for filename in filenames]
+
+
+def artifact_stamp(model_dir, filenames=(MODEL_FILENAME, METADATA_FILENAME)):
+    """
+    Cheap change detector for the model artifacts (mtime and size of each file)
+    """
+    stamp = []
+    for path in artifact_paths(model_dir, filenames):
+        stat = os.stat(path)
+        stamp.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(stamp)
+
+
+def artifact_checksum(model_dir, filenames=(MODEL_FILENAME, METADATA_FILENAME)):
+    """
+    SHA-256 over the contents of the model artifacts
+    """
+    digest = hashlib.sha256()
+    for path in artifact_paths(model_dir, filenames):
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models.
+
+    Each model directory is loaded once and then served from memory. On access
+    the artifact mtime/size is compared with the loaded copy (at most once per
+    ``check_interval`` seconds, a number or a function returning one); if it
+    changed and the checksum differs too, the new version is loaded and swapped
+    in while readers keep using the old one. Only the ``keep_versions`` most
+    recently loaded directories stay in memory.
+    """
+
+    def __init__(self, loader, artifacts=(MODEL_FILENAME, METADATA_FILENAME), check_interval=1.0,
+                 keep_versions=2):
+        self._loader = loader
+        self.artifacts = tuple(artifacts)
+        self.check_interval = check_interval
+        self.keep_versions = keep_versions
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'loads': 0,
+            'reloads': 0,
+            'load_time_total': 0.0,
+            'last_load_time': None,
+        }
+
+    def get(self, model_dir):
+        """
+        Get the current entry for a model directory, loading it if needed
+
+        Args:
+            model_dir: Directory containing the model artifacts
+
+        Returns:
+            entry: ModelEntry for the current artifacts
+        """
+        entry = self._entries.get(model_dir)
+        now = time.time()
+
+        check_interval = self.check_interval() if callable(self.check_interval) else self.check_interval
+        if entry is not None and now - entry.checked_at < check_interval:
+            self._count('hits')
+            return entry
+
+        stamp = artifact_stamp(model_dir, self.artifacts)
+        if entry is not None and entry.stamp == stamp:
+            entry.checked_at = now
+            self._count('hits')
+            return entry
+
+        with self._lock:
+            # Another thread may have loaded it while we were waiting
+            entry = self._entries.get(model_dir)
+            if entry is not None and entry.stamp == stamp:
+                entry.checked_at = now
+                self._count('hits')
+                return entry
+
+            checksum = artifact_checksum(model_dir, self.artifacts)
+            if entry is not None and entry.checksum == checksum:
+                # Files were touched but the content is the same
+                entry.stamp = stamp
+                entry.checked_at = now
+                self._count('hits')
+                return entry
+
+            new_entry = self._load(model_dir, stamp, checksum)
+            if entry is not None:
+                self._count('reloads')
+                logger.info("Model in %s changed (%s -> %s), swapped in new version",
+                            model_dir, entry.version, new_entry.version)
+
+            # Rebuild and assign in one go, so readers see either the old or the new mapping
+            entries = {key: value for key, value in self._entries.items() if key != model_dir}
+            entries[model_dir] = new_entry
+            while len(entries) > self.keep_versions:
+                del entries[next(iter(entries))]
+            self._entries = entries
+            return new_entry
+
+    def _load(self, model_dir, stamp, checksum):
+        started = time.perf_counter()
+        model, metadata = self._loader(model_dir)
+        load_time = time.perf_counter() - started
+
+        with self._stats_lock:
+            self._stats['loads'] += 1
+            self._stats['load_time_total'] += load_time
+            self._stats['last_load_time'] = load_time
+
+        logger.info("Loaded model from %s in %.3fs", model_dir, load_time)
+        return ModelEntry(model, metadata, model_dir, stamp, checksum, load_time)
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def clear(self):
+        """
+        Drop all loaded models so the next access reloads them
+        """
+        with self._lock:
+            self._entries = {}
+
+    def stats(self):
+        """
+        Snapshot of the registry counters
+
+        Returns:
+            stats: Dictionary with cache hits, loads, reloads and load times
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['versions'] = {
+            model_dir: entry.version for model_dir, entry in self._entries.items()
+        }
+        return stats
@@ -0,0 +1,81 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from .visualizer import render_chart
+
+logger = logging.getLogger(__name__)
+
+
+class RenderPool:
+    """
+    Bounded pool of processes rendering charts off the request thread.
+
+    At most ``max_pending`` renders are queued or running at once; ``submit``
+    returns None instead of blocking when the pool is full.
+    """
+
+    def __init__(self, max_workers=2, max_pending=64):
+        """
+        Args:
+            max_workers: Number of render processes
+            max_pending: Max renders queued or running at once
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._stats = {'submitted': 0, 'rejected': 0, 'errors': 0}
+
+    def _get_executor(self):
+        # Executors don't survive fork, so each worker process starts its own.
+        # The render processes are spawned rather than forked from a worker
+        # that may hold TensorFlow and other threads.
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            self._pid = os.getpid()
+            self._pending = 0
+        return self._executor
+
+    def submit(self, kind, data):
+        """
+        Queue one chart render
+
+        Args:
+            kind: Chart type accepted by render_chart
+            data: Positional arguments of the renderer
+
+        Returns:
+            future: Future resolving to the PNG bytes, or None if the pool is full
+        """
+        with self._lock:
+            executor = self._get_executor()
+            if self._pending >= self.max_pending:
+                self._stats['rejected'] += 1
+                return None
+            self._pending += 1
+            self._stats['submitted'] += 1
+
+        future = executor.submit(render_chart, kind, data)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+            if future.exception() is not None:
+                self._stats['errors'] += 1
+
+    def stats(self):
+        """
+        Submitted, rejected and failed renders, and the current number pending
+        """
+        with self._lock:
+            return dict(self._stats, pending=self._pending)
@@ -0,0 +1,224 @@
+import hashlib
+import logging
+import os
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .chart_store import update_artifact_status
+
+logger = logging.getLogger(__name__)
+
+AUDIO_DIRNAME = 'audio'
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class GTTSBackend:
+    """Google Translate TTS (needs network access), writes MP3"""
+    name = 'gtts'
+    extension = 'mp3'
+
+    def __init__(self, lang='en'):
+        self.lang = lang
+
+    def save(self, text, path):
+        # Imported here to keep gTTS off the startup path
+        from gtts import gTTS
+
+        gTTS(text=text, lang=self.lang, slow=False).save(path)
+
+
+class Pyttsx3Backend:
+    """Offline system speech engine (espeak, SAPI5 or NSSpeechSynthesizer), writes WAV"""
+    name = 'pyttsx3'
+    extension = 'wav'
+
+    def __init__(self, lang='en'):
+        self.lang = lang
+        self._engine = None
+        # The engine's run loop is not reentrant
+        self._lock = threading.Lock()
+
+    def save(self, text, path):
+        with self._lock:
+            if self._engine is None:
+                import pyttsx3
+                self._engine = pyttsx3.init()
+            self._engine.save_to_file(text, path)
+            self._engine.runAndWait()
+
+
+class SilentBackend:
+    """Local stand-in writing a short silent WAV, for development and tests"""
+    name = 'silent'
+    extension = 'wav'
+
+    def __init__(self, lang='en'):
+        self.lang = lang
+
+    def save(self, text, path):
+        with wave.open(path, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(8000)
+            f.writeframes(b'\x00\x00' * 800)
+
+
+TTS_BACKENDS = {backend.name: backend for backend in (GTTSBackend, Pyttsx3Backend, SilentBackend)}
+
+
+class AudioCache:
+    """
+    Spoken-text audio files keyed by a hash of the backend, language and text.
+
+    The same sentence is synthesized once and shared by every request that
+    speaks it. ``schedule`` returns the file path right away and synthesizes
+    on a background thread, so callers never wait for the TTS backend.
+    """
+
+    def __init__(self, root, backend, async_render=True):
+        """
+        Args:
+            root: Directory holding the audio files
+            backend: TTS backend instance
+            async_render: Synthesize on a background thread instead of the caller's
+        """
+        self.root = root
+        self.backend = backend
+        self.async_render = async_render
+        self._executor = None
+        self._pid = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'renders': 0, 'errors': 0}
+
+    def key(self, text):
+        """
+        Cache key of a sentence
+        """
+        payload = f"{self.backend.name}\0{self.backend.lang}\0{text}"
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def relative_path(self, key):
+        """
+        Path of the audio file relative to MEDIA_ROOT
+        """
+        return os.path.join(AUDIO_DIRNAME, key[:2], f'{key}.{self.backend.extension}')
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], f'{key}.{self.backend.extension}')
+
+    def _get_executor(self):
+        # One synthesis thread per process: backends like pyttsx3 are not thread-safe,
+        # and threads don't survive fork
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tts')
+            self._pid = os.getpid()
+            self._pending = {}
+        return self._executor
+
+    def _render(self, key, text, background=False):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name so a half-written file is never served
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            self.backend.save(text, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Text-to-speech with {self.backend.name} failed: {str(e)}")
+            with self._lock:
+                self._stats['errors'] += 1
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            update_artifact_status(key, 'failed', background=background)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+        with self._lock:
+            self._stats['renders'] += 1
+        update_artifact_status(key, 'ready', os.path.getsize(path), background=background)
+        return self.relative_path(key)
+
+    def exists(self, text):
+        """
+        Whether the audio for a sentence has been synthesized
+        """
+        return os.path.exists(self._path(self.key(text)))
+
+    def schedule(self, text):
+        """
+        Get the audio path of a sentence, synthesizing it in the background if needed
+
+        Args:
+            text: Sentence to speak
+
+        Returns:
+            path: Path of the audio file relative to MEDIA_ROOT (it may not exist yet)
+        """
+        key = self.key(text)
+        if os.path.exists(self._path(key)):
+            with self._lock:
+                self._stats['hits'] += 1
+            return self.relative_path(key)
+
+        if not self.async_render:
+            return self._render(key, text)
+
+        with self._lock:
+            executor = self._get_executor()
+            if key not in self._pending:
+                self._pending[key] = executor.submit(self._render, key, text, True)
+        return self.relative_path(key)
+
+    def render(self, text):
+        """
+        Get the audio path of a sentence, synthesizing it in this thread if needed
+        """
+        key = self.key(text)
+        if os.path.exists(self._path(key)):
+            with self._lock:
+                self._stats['hits'] += 1
+            return self.relative_path(key)
+        return self._render(key, text)
+
+    def stats(self):
+        """
+        Cache hits, renders, failures and pending renders of this process
+        """
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending))
+
+
+def get_tts_backend(name=None):
+    """
+    Instantiate a TTS backend by name (AI_MODEL_TTS_BACKEND by default)
+    """
+    name = name or getattr(settings, 'AI_MODEL_TTS_BACKEND', 'gtts')
+    try:
+        backend_class = TTS_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown text-to-speech backend: {name}")
+    return backend_class(lang=getattr(settings, 'AI_MODEL_TTS_LANGUAGE', 'en'))
+
+
+def get_audio_cache():
+    """
+    Get the process-wide audio cache, creating it on first use
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AudioCache(
+                    os.path.join(settings.MEDIA_ROOT, AUDIO_DIRNAME),
+                    get_tts_backend(),
+                    async_render=getattr(settings, 'AI_MODEL_TTS_ASYNC', True)
+                )
+    return _cache
@@ -1,15 +1,15 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import io
 import base64
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-import os
 
+# matplotlib is imported inside the render functions, so only workers that
+# actually draw charts pay for it. Only the object-oriented Figure API is used:
+# pyplot's global figure state is not thread-safe and leaks figures on errors.
 
-def create_diagnosis_chart(diseases, probabilities, uncertainties):
+
+def render_diagnosis_chart(diseases, probabilities, uncertainties):
     """
-    Create a bar chart showing diagnosis probabilities with error bars
+    Render a bar chart showing diagnosis probabilities with error bars
 
     Args:
         diseases: List of disease names
@@ -17,14 +17,18 @@ def create_diagnosis_chart(diseases, probabilities, uncertainties):
         uncertainties: List of uncertainty values
 
     Returns:
-        b64_image: Base64 encoded image
+        png: PNG image bytes
     """
+    from matplotlib import colormaps
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+
     # Create figure and axis
     fig = Figure(figsize=(10, 6))
     ax = fig.add_subplot(111)
 
     # Generate colors based on probability
-    colors = plt.cm.Blues(np.array(probabilities))
+    colors = colormaps['Blues'](np.array(probabilities))
 
     # Create bar chart
     bars = ax.bar(diseases, probabilities, yerr=uncertainties,
@@ -43,30 +47,31 @@ def create_diagnosis_chart(diseases, probabilities, uncertainties):
     ax.grid(axis='y', linestyle='--', alpha=0.7)
 
     # Rotate x-axis labels for better readability
-    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+    for label in ax.get_xticklabels():
+        label.set(rotation=45, ha='right')
 
     # Adjust layout
     fig.tight_layout()
 
-    # Convert plot to base64 encoded image
     buf = io.BytesIO()
     FigureCanvas(fig).print_png(buf)
-    b64_image = base64.b64encode(buf.getvalue()).decode('utf-8')
-
-    return b64_image
+    return buf.getvalue()
 
 
-def create_symptoms_radar_chart(symptoms, symptom_values):
+def render_symptoms_radar_chart(symptoms, symptom_values):
     """
-    Create a radar chart showing symptom patterns
+    Render a radar chart showing symptom patterns
 
     Args:
         symptoms: List of symptom names
         symptom_values: List of 0 or 1 values indicating symptoms
 
     Returns:
-        b64_image: Base64 encoded image
+        png: PNG image bytes
     """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+
     # Create figure
     fig = Figure(figsize=(8, 8))
     ax = fig.add_subplot(111, polar=True)
@@ -79,7 +84,7 @@ def create_symptoms_radar_chart(symptoms, symptom_values):
     angles += angles[:1]  # Close the circle
 
     # Add symptom values and close the circle
-    values = symptom_values.copy()
+    values = list(symptom_values)
     values += values[:1]
 
     # Draw the radar chart
@@ -100,64 +105,83 @@ def create_symptoms_radar_chart(symptoms, symptom_values):
     # Adjust layout
     fig.tight_layout()
 
-    # Convert plot to base64 encoded image
     buf = io.BytesIO()
     FigureCanvas(fig).print_png(buf)
-    b64_image = base64.b64encode(buf.getvalue()).decode('utf-8')
+    return buf.getvalue()
+
+
+CHART_RENDERERS = {
+    'diagnosis': render_diagnosis_chart,
+    'symptoms': render_symptoms_radar_chart,
+}
 
-    return b64_image
+
+def render_chart(kind, data):
+    """
+    Render a chart from its kind and plotted data
+
+    This is the entry point of the chart render pool, so it only takes
+    picklable arguments.
+
+    Args:
+        kind: Key of CHART_RENDERERS
+        data: Positional arguments of the renderer
+
+    Returns:
+        png: PNG image bytes
+    """
+    return CHART_RENDERERS[kind](*data)
 
 
-def save_diagnosis_chart(diseases, probabilities, uncertainties, filename):
+def create_diagnosis_chart(diseases, probabilities, uncertainties):
     """
-    Save diagnosis chart to file
+    Create a bar chart showing diagnosis probabilities with error bars
 
     Args:
         diseases: List of disease names
         probabilities: List of probability values
         uncertainties: List of uncertainty values
-        filename: Output filename
 
     Returns:
-        file_path: Path to saved image
+        b64_image: Base64 encoded image
     """
-    # Create figure and axis
-    plt.figure(figsize=(10, 6))
+    png = render_diagnosis_chart(diseases, probabilities, uncertainties)
+    return base64.b64encode(png).decode('utf-8')
 
-    # Generate colors based on probability
-    colors = plt.cm.Blues(np.array(probabilities))
 
-    # Create bar chart
-    bars = plt.bar(diseases, probabilities, yerr=uncertainties,
-                   capsize=5, color=colors, edgecolor='gray', alpha=0.7)
+def create_symptoms_radar_chart(symptoms, symptom_values):
+    """
+    Create a radar chart showing symptom patterns
 
-    # Add value labels on top of bars
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width() / 2., height + 0.02,
-                 f'{height:.2f}', ha='center', va='bottom')
+    Args:
+        symptoms: List of symptom names
+        symptom_values: List of 0 or 1 values indicating symptoms
 
-    # Customize chart
-    plt.ylabel('Probability')
-    plt.ylim(0, 1.1)
-    plt.title('Diagnosis Probabilities with Uncertainty')
-    plt.grid(axis='y', linestyle='--', alpha=0.7)
+    Returns:
+        b64_image: Base64 encoded image
+    """
+    png = render_symptoms_radar_chart(symptoms, symptom_values)
+    return base64.b64encode(png).decode('utf-8')
 
-    # Rotate x-axis labels for better readability
-    plt.xticks(rotation=45, ha='right')
 
-    # Adjust layout
-    plt.tight_layout()
+def save_diagnosis_chart(diseases, probabilities, uncertainties, filename=None):
+    """
+    Save diagnosis chart to the content-addressed chart store
 
-    # Determine save path
-    media_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'media')
-    charts_dir = os.path.join(media_dir, 'charts')
-    os.makedirs(charts_dir, exist_ok=True)
+    Identical probabilities share one file, so the returned path depends only
+    on the plotted data.
 
-    file_path = os.path.join(charts_dir, filename)
+    Args:
+        diseases: List of disease names
+        probabilities: List of probability values
+        uncertainties: List of uncertainty values
+        filename: Unused, kept for backwards compatibility
 
-    # Save figure
-    plt.savefig(file_path, dpi=100)
-    plt.close()
+    Returns:
+        file_path: Path to saved image, relative to MEDIA_ROOT
+    """
+    from .chart_store import get_chart_store
 
-    return os.path.join('charts', filename)
\ No newline at end of file
+    store = get_chart_store()
+    key = store.diagnosis_chart(diseases, probabilities, uncertainties, wait=True)
+    return store.relative_path(key)
@@ -0,0 +1,56 @@
+import logging
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .model_builder import get_model_entry, model_available
+from .prediction import sample_predictions
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up_model():
+    """
+    Load the model and run dummy batches through the MC Dropout forward pass
+
+    This pays for model loading, tf.function tracing, kernel selection and
+    allocator growth before the first real request.
+
+    Returns:
+        elapsed: Seconds spent warming up, or None if no model is published
+    """
+    if not model_available():
+        logger.error("Skipping model warm-up, no trained model is published")
+        return None
+
+    started = time.perf_counter()
+    entry = get_model_entry()
+    n_iter = getattr(settings, 'AI_MODEL_MC_ITERATIONS', 100)
+    chunk_size = getattr(settings, 'AI_MODEL_MC_CHUNK_SIZE', None)
+
+    # A single request and a full micro-batch, so both shapes have run once
+    for batch_size in {1, getattr(settings, 'AI_MODEL_BATCH_MAX_SIZE', 32)}:
+        dummy = np.zeros((batch_size, len(entry.metadata["symptoms"])), dtype=np.float32)
+        sample_predictions(entry.model, dummy, n_iter, chunk_size)
+
+    if getattr(settings, 'AI_MODEL_LOOKUP_TABLE', False):
+        from .lookup import get_lookup_table
+        get_lookup_table(entry)
+
+    elapsed = time.perf_counter() - started
+    logger.info("Warmed up model version %s in %.3fs", entry.version, elapsed)
+    return elapsed
+
+
+def warm_up_if_enabled(phase):
+    """
+    Warm up the model if AI_MODEL_WARMUP is set to this phase
+
+    Args:
+        phase: 'master' (called from the gunicorn when_ready hook, before the
+            workers are forked from a preloaded app) or 'worker' (called from the
+            gunicorn post_worker_init hook in every worker)
+    """
+    if getattr(settings, 'AI_MODEL_WARMUP', None) == phase:
+        warm_up_model()
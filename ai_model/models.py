@@ -1,7 +1,14 @@
+from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+from .catalog import clear_catalog, get_model_version
+from .packing import pack_prediction, unpack_prediction
+
 
 class Symptom(models.Model):
     """Model representing a symptom"""
@@ -23,6 +30,49 @@ class Disease(models.Model):
         return self.name
 
 
+class ModelVersion(models.Model):
+    """Diseases, symptoms and recommendations of a published model, shared by its diagnoses"""
+    # Hash of the fields below, see ai_model.packing.model_version_digest
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=64, blank=True)
+    diseases = models.JSONField(default=list)
+    symptoms = models.JSONField(default=list)
+    test_recommendations = models.JSONField(default=dict)
+    medicine_recommendations = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.name or self.digest[:12]
+
+
+class DiagnosisQuerySet(models.QuerySet):
+    def with_symptom_mask(self, present, absent, n_symptoms):
+        """
+        Diagnoses having every symptom bit in present and none in absent
+
+        The matching masks are enumerated (at most 2 ** n_symptoms values), so
+        the lookup is an IN over the symptom_mask index rather than a scan.
+
+        Args:
+            present: Bitmask of symptoms that must be present
+            absent: Bitmask of symptoms that must be absent
+            n_symptoms: Number of symptoms of the model (len(metadata["symptoms"]))
+        """
+        if present & absent:
+            return self.none()
+
+        free = ((1 << n_symptoms) - 1) & ~(present | absent)
+        masks = []
+        # Every subset of the free bits, added to the required ones
+        subset = free
+        while True:
+            masks.append(present | subset)
+            if subset == 0:
+                break
+            subset = (subset - 1) & free
+        return self.filter(symptom_mask__in=masks)
+
+
 class Diagnosis(models.Model):
     """Model to store user diagnosis history"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
@@ -30,15 +80,62 @@ class Diagnosis(models.Model):
     symptoms = models.ManyToManyField(Symptom, through='DiagnosisSymptom')
     primary_disease = models.ForeignKey(Disease, on_delete=models.SET_NULL, null=True, related_name='primary_diagnoses')
 
-    # Store the complete prediction results
+    # Present symptoms, bit i set for symptom i in the model's symptom order
+    symptom_mask = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+
+    # Probabilities and uncertainties packed in the disease order of model_version
+    # (see ai_model.packing); prediction_data then only holds the keys not rebuilt from them.
+    # Rows that couldn't be packed keep the complete result in prediction_data.
+    model_version = models.ForeignKey(
+        ModelVersion, on_delete=models.PROTECT, null=True, blank=True, related_name='diagnoses'
+    )
+    packed_prediction = models.BinaryField(null=True, blank=True)
     prediction_data = models.JSONField(default=dict)
 
+    objects = DiagnosisQuerySet.as_manager()
+
     def __str__(self):
         return f"Diagnosis {self.id} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
+    @property
+    def result(self):
+        """Complete prediction result, in the format returned by get_diagnosis"""
+        if self.packed_prediction is None:
+            return self.prediction_data
+        return unpack_prediction(
+            self.packed_prediction, get_model_version(self.model_version_id), self.prediction_data
+        )
+
+    @result.setter
+    def result(self, value):
+        # Packed against model_version, so set that first
+        packed = None
+        if self.model_version_id is not None:
+            packed, value = pack_prediction(
+                value,
+                get_model_version(self.model_version_id),
+                getattr(settings, 'AI_MODEL_PREDICTION_DTYPE', 'float16')
+            )
+        self.packed_prediction = packed
+        self.prediction_data = value
+
     class Meta:
         verbose_name_plural = "Diagnoses"
         ordering = ['-created_at']
+        indexes = [
+            # History pages: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+            models.Index(fields=['user', '-created_at', '-id'], name='diagnosis_user_created_idx'),
+        ]
+
+
+@receiver([post_save, post_delete], sender=Symptom)
+@receiver([post_save, post_delete], sender=Disease)
+@receiver(post_delete, sender=ModelVersion)
+def invalidate_catalog(sender, created=False, **kwargs):
+    """Drop the cached symptom/disease/model version ids when catalog rows change or go away"""
+    # A new row doesn't change any cached id (the lowest id wins for duplicate names)
+    if not created:
+        clear_catalog()
 
 
 class DiagnosisSymptom(models.Model):
@@ -52,4 +149,174 @@ class DiagnosisSymptom(models.Model):
         return f"{self.symptom.name}: {status}"
 
     class Meta:
-        unique_together = ('diagnosis', 'symptom')
\ No newline at end of file
+        unique_together = ('diagnosis', 'symptom')
+
+class DiagnosisArtifact(models.Model):
+    """Rendered file (chart or audio) belonging to a diagnosis"""
+    KIND_CHOICES = [
+        ('chart', 'Diagnosis chart'),
+        ('symptoms_chart', 'Symptom chart'),
+        ('audio', 'Audio summary'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
+    diagnosis = models.ForeignKey(Diagnosis, on_delete=models.CASCADE, related_name='artifacts')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Relative to MEDIA_ROOT
+    path = models.CharField(max_length=255, blank=True)
+    # Content-addressed files (charts) are shared by every diagnosis with the same hash
+    content_hash = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for diagnosis {self.diagnosis_id} ({self.status})"
+
+    class Meta:
+        unique_together = ('diagnosis', 'kind')
+
+
+class DiagnosisFeedback(models.Model):
+    """User rating of a diagnosis; every submission is a new row"""
+    diagnosis = models.ForeignKey(Diagnosis, on_delete=models.CASCADE, related_name='feedback')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    accuracy_rating = models.PositiveSmallIntegerField(
+        validators=[MinValueValidator(1), MaxValueValidator(5)], db_index=True
+    )
+    comments = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Feedback {self.accuracy_rating}/5 on diagnosis {self.diagnosis_id}"
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Latest feedback of a diagnosis
+            models.Index(fields=['diagnosis', '-created_at'], name='feedback_diagnosis_idx'),
+        ]
+
+
+class DiagnosisFeedbackStats(models.Model):
+    """Running totals of feedback ratings per disease and model version, kept up to date on insert"""
+    disease = models.ForeignKey(Disease, on_delete=models.CASCADE, related_name='feedback_stats')
+    model_version = models.ForeignKey(
+        ModelVersion, on_delete=models.CASCADE, null=True, blank=True, related_name='feedback_stats'
+    )
+    feedback_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.disease} ({self.model_version or 'unknown model'}): {self.average_rating}"
+
+    @property
+    def average_rating(self):
+        if not self.feedback_count:
+            return None
+        return self.rating_total / self.feedback_count
+
+    class Meta:
+        verbose_name_plural = "Diagnosis feedback stats"
+        constraints = [
+            models.UniqueConstraint(fields=['disease', 'model_version'], name='feedback_stats_unique'),
+            # NULLs are distinct in the constraint above
+            models.UniqueConstraint(
+                fields=['disease'],
+                condition=models.Q(model_version__isnull=True),
+                name='feedback_stats_unique_unversioned'
+            ),
+        ]
+
+
+class DiagnosisDailyStats(models.Model):
+    """Diagnoses per day, disease and model version, kept up to date as diagnoses are saved"""
+    date = models.DateField()
+    disease = models.ForeignKey(Disease, on_delete=models.CASCADE, related_name='daily_stats')
+    model_version = models.ForeignKey(
+        ModelVersion, on_delete=models.CASCADE, null=True, blank=True, related_name='daily_stats'
+    )
+    diagnosis_count = models.PositiveIntegerField(default=0)
+    confidence_total = models.FloatField(default=0)
+    uncertainty_total = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.date} {self.disease}: {self.diagnosis_count}"
+
+    @property
+    def mean_confidence(self):
+        if not self.diagnosis_count:
+            return None
+        return self.confidence_total / self.diagnosis_count
+
+    @property
+    def mean_uncertainty(self):
+        if not self.diagnosis_count:
+            return None
+        return self.uncertainty_total / self.diagnosis_count
+
+    class Meta:
+        verbose_name_plural = "Diagnosis daily stats"
+        constraints = [
+            # Also the index behind date range reads
+            models.UniqueConstraint(fields=['date', 'disease', 'model_version'], name='daily_stats_unique'),
+            models.UniqueConstraint(
+                fields=['date', 'disease'],
+                condition=models.Q(model_version__isnull=True),
+                name='daily_stats_unique_unversioned'
+            ),
+        ]
+
+
+# Diagnosis fields the daily rollup is computed from
+DAILY_STATS_FIELDS = {
+    'created_at', 'primary_disease', 'primary_disease_id', 'model_version', 'model_version_id',
+    'packed_prediction', 'prediction_data'
+}
+
+
+@receiver(pre_save, sender=Diagnosis)
+def remember_daily_stats_values(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Read the stored values of an updated diagnosis, to move it in the rollup after the save"""
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not DAILY_STATS_FIELDS.intersection(update_fields):
+        return
+    instance._daily_stats_before = Diagnosis.objects.filter(pk=instance.pk).only(
+        'created_at', 'primary_disease', 'model_version', 'packed_prediction', 'prediction_data'
+    ).first()
+
+
+@receiver(post_save, sender=Diagnosis)
+def update_daily_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Count diagnoses saved one by one (save_diagnoses bulk inserts and counts its own),
+    and move updated ones whose day, disease or result changed
+    """
+    if raw:
+        return
+    from .services import add_to_daily_stats, daily_stats_totals, remove_from_daily_stats
+
+    if created:
+        add_to_daily_stats([instance])
+        return
+    before = instance.__dict__.pop('_daily_stats_before', None)
+    if before is not None and daily_stats_totals([before]) != daily_stats_totals([instance]):
+        remove_from_daily_stats([before])
+        add_to_daily_stats([instance])
+
+
+@receiver(post_delete, sender=Diagnosis)
+def remove_diagnosis_from_daily_stats(sender, instance, **kwargs):
+    """Take deleted diagnoses, including cascaded ones, out of the rollup"""
+    from .services import remove_from_daily_stats
+    remove_from_daily_stats([instance])
+
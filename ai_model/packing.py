@@ -0,0 +1,120 @@
+import hashlib
+import json
+import struct
+
+import numpy as np
+
+# Item size in the header -> little-endian dtype of the packed arrays
+PACKED_DTYPES = {2: '<f2', 4: '<f4'}
+DTYPE_SIZES = {'float16': 2, 'float32': 4}
+
+# Item size, index of the top disease, number of MC Dropout samples (0 if unknown)
+HEADER = struct.Struct('<BHI')
+
+# Result keys rebuilt from the packed arrays and the model version
+PACKED_KEYS = (
+    'diagnosis', 'confidence', 'uncertainty', 'test_recommendation', 'medicine_recommendation',
+    'probabilities', 'uncertainties', 'n_samples'
+)
+
+# Metadata fields stored on ModelVersion, in the order they are hashed
+VERSION_FIELDS = ('diseases', 'symptoms', 'test_recommendations', 'medicine_recommendations')
+
+
+def model_version_digest(metadata):
+    """
+    Hash of the metadata fields a packed prediction depends on
+
+    Two published models with the same diseases, symptoms and recommendations
+    share a ModelVersion row.
+    """
+    payload = json.dumps([metadata[field] for field in VERSION_FIELDS], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def pack_prediction(result, version, dtype='float16'):
+    """
+    Pack the per-disease arrays of a diagnosis result
+
+    The blob is a small header followed by the probabilities and then the
+    uncertainties, in the disease order of the model version. Everything else
+    the result holds is left in a dictionary of extra keys.
+
+    Args:
+        result: Diagnosis result dictionary (as built by build_result)
+        version: ModelVersion (or metadata dictionary) the result was predicted with
+        dtype: 'float16' or 'float32'
+
+    Returns:
+        packed: Bytes, or None if the result doesn't match the model version
+        extra: Keys to keep as JSON (the whole result when packed is None)
+    """
+    diseases = _field(version, 'diseases')
+    probabilities = result.get('probabilities')
+    uncertainties = result.get('uncertainties')
+    if (not isinstance(probabilities, dict) or not isinstance(uncertainties, dict)
+            or list(probabilities) != diseases or list(uncertainties) != diseases
+            or result.get('diagnosis') not in diseases):
+        return None, result
+
+    itemsize = DTYPE_SIZES[dtype]
+    top = diseases.index(result['diagnosis'])
+    values = np.array(
+        [probabilities[disease] for disease in diseases] + [uncertainties[disease] for disease in diseases],
+        dtype=PACKED_DTYPES[itemsize]
+    )
+    packed = HEADER.pack(itemsize, top, int(result.get('n_samples', 0))) + values.tobytes()
+
+    # Keep anything the expansion would not reproduce (extra keys, edited recommendations)
+    expanded = unpack_prediction(packed, version)
+    extra = {
+        key: value for key, value in result.items()
+        if key not in PACKED_KEYS or (
+            key in ('diagnosis', 'test_recommendation', 'medicine_recommendation') and expanded[key] != value
+        )
+    }
+    return packed, extra
+
+
+def unpack_prediction(packed, version, extra=None):
+    """
+    Expand a packed prediction back to the diagnosis result dictionary
+
+    Args:
+        packed: Bytes written by pack_prediction
+        version: ModelVersion (or metadata dictionary) the result was packed with
+        extra: Extra keys returned by pack_prediction
+
+    Returns:
+        result: Dictionary with the same keys as build_result, plus extra
+    """
+    packed = bytes(packed)
+    itemsize, top, n_samples = HEADER.unpack_from(packed)
+    # str() gives the shortest decimal that round-trips at the packed precision
+    values = [float(str(value)) for value in np.frombuffer(packed, dtype=PACKED_DTYPES[itemsize], offset=HEADER.size)]
+
+    diseases = _field(version, 'diseases')
+    n = len(diseases)
+    probabilities, uncertainties = values[:n], values[n:2 * n]
+    diagnosis = diseases[top]
+
+    result = {
+        "diagnosis": diagnosis,
+        "confidence": probabilities[top],
+        "uncertainty": uncertainties[top],
+        "test_recommendation": _field(version, 'test_recommendations')[diagnosis],
+        "medicine_recommendation": _field(version, 'medicine_recommendations')[diagnosis],
+        "probabilities": dict(zip(diseases, probabilities)),
+        "uncertainties": dict(zip(diseases, uncertainties)),
+    }
+    if n_samples:
+        result["n_samples"] = n_samples
+    if extra:
+        result.update(extra)
+    return result
+
+
+def _field(version, name):
+    if isinstance(version, dict):
+        return version[name]
+    return getattr(version, name)
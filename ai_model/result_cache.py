@@ -0,0 +1,46 @@
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+
+TOKEN_SALT = 'ai_model.result_cache'
+KEY_PREFIX = 'diagnosis-result:'
+
+
+def _get_cache():
+    return caches[getattr(settings, 'AI_MODEL_RESULT_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'AI_MODEL_RESULT_CACHE_TIMEOUT', 60 * 60)
+
+
+def store_result(data):
+    """
+    Keep the data of a diagnosis result page, for visitors without a saved diagnosis
+
+    Args:
+        data: Dictionary with the result, symptom values, audio path and chart keys
+
+    Returns:
+        token: Signed token to pass to load_result (safe to put in a URL)
+    """
+    key = uuid.uuid4().hex
+    _get_cache().set(KEY_PREFIX + key, data, _timeout())
+    return signing.dumps(key, salt=TOKEN_SALT)
+
+
+def load_result(token):
+    """
+    Data stored by store_result
+
+    Returns:
+        data: The stored dictionary, or None if the token is invalid or has expired
+    """
+    try:
+        # Forged or expired tokens are rejected without a cache lookup
+        key = signing.loads(token, salt=TOKEN_SALT, max_age=_timeout())
+    except signing.BadSignature:
+        return None
+    return _get_cache().get(KEY_PREFIX + key)
@@ -25,6 +25,8 @@ class DiagnosisSymptomSerializer(serializers.ModelSerializer):
 class DiagnosisSerializer(serializers.ModelSerializer):
     symptoms = DiagnosisSymptomSerializer(source='diagnosissymptom_set', many=True, read_only=True)
     disease_name = serializers.CharField(source='primary_disease.name', read_only=True)
+    # Expanded from the packed arrays, in the format returned by the diagnose endpoint
+    prediction_data = serializers.JSONField(source='result', required=False)
 
     class Meta:
         model = Diagnosis
@@ -0,0 +1,337 @@
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .catalog import get_disease_id, get_model_version_id, get_symptom_ids
+from .models import (
+    Diagnosis, DiagnosisSymptom, DiagnosisArtifact, DiagnosisDailyStats, DiagnosisFeedback, DiagnosisFeedbackStats
+)
+from .ml.chart_store import get_chart_store
+from .ml.lookup import symptom_index
+from .ml.model_builder import read_model_metadata
+
+CHART_ARTIFACT_KINDS = ('chart', 'symptoms_chart')
+
+
+def save_diagnoses(user, symptoms, items, metadata=None):
+    """
+    Persist several diagnoses with bulk inserts in one transaction
+
+    Symptom, disease and model version ids come from the per-process catalog,
+    so a warm catalog needs just two INSERTs however many diagnoses and
+    symptoms there are, plus one daily rollup UPDATE per disease. Results are
+    stored packed against the model version.
+
+    Args:
+        user: Owner of the diagnoses
+        symptoms: Symptom names in model order
+        items: List of (symptom_values, result) pairs
+        metadata: Metadata of the model that made the predictions (read from
+            the published model by default)
+
+    Returns:
+        diagnoses: List of created Diagnosis objects, in input order
+    """
+    metadata = metadata or read_model_metadata()
+    with transaction.atomic():
+        symptom_ids = get_symptom_ids(symptoms)
+        model_version_id = get_model_version_id(metadata)
+        disease_ids = {
+            result["diagnosis"]: get_disease_id(
+                result["diagnosis"],
+                defaults={
+                    'test_recommendation': result["test_recommendation"],
+                    'medicine_recommendation': result["medicine_recommendation"]
+                }
+            )
+            for _, result in items
+        }
+
+        diagnoses = Diagnosis.objects.bulk_create([
+            Diagnosis(
+                user=user,
+                primary_disease_id=disease_ids[result["diagnosis"]],
+                symptom_mask=symptom_index(symptom_values),
+                model_version_id=model_version_id,
+                result=result
+            )
+            for symptom_values, result in items
+        ])
+
+        DiagnosisSymptom.objects.bulk_create([
+            DiagnosisSymptom(diagnosis=diagnosis, symptom_id=symptom_id, is_present=bool(symptom_values[i]))
+            for diagnosis, (symptom_values, _) in zip(diagnoses, items)
+            for i, symptom_id in enumerate(symptom_ids)
+        ])
+
+        # bulk_create sends no post_save, so the rollup is updated here
+        add_to_daily_stats(diagnoses)
+
+    return diagnoses
+
+
+def save_diagnosis(user, symptoms, symptom_values, result, metadata=None):
+    """
+    Persist one diagnosis and its symptom rows in a single transaction
+
+    Args:
+        user: Owner of the diagnosis
+        symptoms: Symptom names in model order
+        symptom_values: List of 0 or 1 values
+        result: Diagnosis result dictionary
+        metadata: Metadata of the model that made the prediction
+
+    Returns:
+        diagnosis: The created Diagnosis
+    """
+    return save_diagnoses(user, symptoms, [(symptom_values, result)], metadata)[0]
+
+
+def symptom_mask(names, symptoms=None):
+    """
+    Bitmask of the named symptoms, as stored in Diagnosis.symptom_mask
+
+    Args:
+        names: Symptom names
+        symptoms: Symptom names in model order (read from the model metadata by default)
+
+    Returns:
+        mask: Integer with bit i set for symptom i of the model
+    """
+    symptoms = symptoms or read_model_metadata()["symptoms"]
+    positions = {name.lower(): i for i, name in enumerate(symptoms)}
+    unknown = [name for name in names if name.lower() not in positions]
+    if unknown:
+        raise ValueError(f"Unknown symptoms: {', '.join(unknown)}")
+    return sum({1 << positions[name.lower()] for name in names})
+
+
+def filter_by_symptoms(queryset, present=(), absent=()):
+    """
+    Restrict diagnoses to those with all symptoms in present and none in absent
+
+    Args:
+        queryset: Diagnosis queryset
+        present: Names of symptoms that must be present
+        absent: Names of symptoms that must be absent
+
+    Returns:
+        queryset: Filtered queryset (uses the symptom_mask index)
+    """
+    symptoms = read_model_metadata()["symptoms"]
+    return queryset.with_symptom_mask(
+        symptom_mask(present, symptoms),
+        symptom_mask(absent, symptoms),
+        n_symptoms=len(symptoms)
+    )
+
+
+def _chart_artifact(diagnosis, kind, key):
+    store = get_chart_store()
+    size = store.size(key)
+    return DiagnosisArtifact(
+        diagnosis=diagnosis,
+        kind=kind,
+        path=store.relative_path(key),
+        content_hash=key,
+        size=size,
+        status='pending' if size is None else 'ready'
+    )
+
+
+def chart_artifacts(diagnosis, chart_keys):
+    """
+    Describe both charts of a diagnosis as (unsaved) artifacts
+
+    Args:
+        diagnosis: Diagnosis the charts belong to
+        chart_keys: Chart store keys of the bar and radar charts, as returned
+            by diagnosis_chart_keys
+
+    Returns:
+        artifacts: DiagnosisArtifact objects for the bar and radar charts
+    """
+    diagnosis_key, symptoms_key = chart_keys
+    return [
+        _chart_artifact(diagnosis, 'chart', diagnosis_key),
+        _chart_artifact(diagnosis, 'symptoms_chart', symptoms_key),
+    ]
+
+
+def _media_size(path):
+    try:
+        return os.path.getsize(os.path.join(settings.MEDIA_ROOT, path))
+    except OSError:
+        return None
+
+
+def audio_artifact(diagnosis, audio_path):
+    """
+    Describe a diagnosis audio file as an (unsaved) artifact
+
+    Args:
+        diagnosis: Diagnosis the audio belongs to
+        audio_path: Path returned by generate_audio_diagnosis, relative to MEDIA_ROOT
+            (it may still be synthesizing)
+
+    Returns:
+        artifact: DiagnosisArtifact for the audio file
+    """
+    size = _media_size(audio_path)
+    return DiagnosisArtifact(
+        diagnosis=diagnosis,
+        kind='audio',
+        path=audio_path,
+        # Audio files are named by the hash of the spoken text
+        content_hash=os.path.splitext(os.path.basename(audio_path))[0],
+        size=size,
+        status='pending' if size is None else 'ready'
+    )
+
+
+def save_artifacts(artifacts):
+    """
+    Insert artifacts, replacing any existing artifact of the same kind for the diagnosis
+    """
+    return DiagnosisArtifact.objects.bulk_create(
+        artifacts,
+        update_conflicts=True,
+        unique_fields=['diagnosis', 'kind'],
+        update_fields=['path', 'content_hash', 'size', 'status', 'updated_at']
+    )
+
+
+def refresh_artifact(artifact):
+    """
+    Report a pending artifact as ready if its file has been stored in the meantime
+
+    Renders mark the rows themselves when they finish; this covers renders that
+    finished before the row was inserted. Nothing is written.
+
+    Args:
+        artifact: DiagnosisArtifact (updated in memory)
+
+    Returns:
+        artifact: The same artifact
+    """
+    # Ready files don't change and failed renders are not retried
+    if artifact.status != 'pending':
+        return artifact
+
+    if artifact.kind in CHART_ARTIFACT_KINDS:
+        size = get_chart_store().size(artifact.content_hash)
+    else:
+        size = _media_size(artifact.path)
+    if size is not None:
+        artifact.status, artifact.size = 'ready', size
+    return artifact
+
+
+def _increment(model, keys, **amounts):
+    """
+    Add amounts to the counters of the rollup row identified by keys, creating it if needed
+    """
+    rows = model.objects.filter(**keys)
+    changes = {field: F(field) + amount for field, amount in amounts.items()}
+    if rows.update(updated_at=timezone.now(), **changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **amounts)
+    except IntegrityError:
+        # Created by a concurrent writer in the meantime
+        rows.update(updated_at=timezone.now(), **changes)
+
+
+def record_feedback(diagnosis, accuracy_rating, comments='', user=None):
+    """
+    Store a feedback submission and add it to the per-disease rating totals
+
+    Feedback rows are only ever inserted, so earlier submissions are kept and
+    the diagnosis row itself is not rewritten.
+
+    Args:
+        diagnosis: Diagnosis the feedback is about
+        accuracy_rating: Rating from 1 to 5
+        comments: Free-text comments
+        user: User who gave the feedback
+
+    Returns:
+        feedback: The created DiagnosisFeedback
+    """
+    accuracy_rating = int(accuracy_rating)
+    with transaction.atomic():
+        feedback = DiagnosisFeedback.objects.create(
+            diagnosis=diagnosis,
+            user=user,
+            accuracy_rating=accuracy_rating,
+            comments=comments or ''
+        )
+        if diagnosis.primary_disease_id is not None:
+            _increment(
+                DiagnosisFeedbackStats,
+                dict(disease_id=diagnosis.primary_disease_id, model_version_id=diagnosis.model_version_id),
+                feedback_count=1,
+                rating_total=accuracy_rating
+            )
+    return feedback
+
+
+def daily_stats_totals(diagnoses, totals=None):
+    """
+    Sum diagnoses into per (date, disease, model version) counters
+
+    Diagnoses without a disease or a confidence are left out.
+
+    Args:
+        diagnoses: Diagnosis objects (created_at, primary_disease_id, model_version_id and the result are read)
+        totals: Dictionary to add to (a new one by default)
+
+    Returns:
+        totals: {(date, disease_id, model_version_id): [count, confidence total, uncertainty total]}
+    """
+    totals = defaultdict(lambda: [0, 0.0, 0.0]) if totals is None else totals
+    for diagnosis in diagnoses:
+        result = diagnosis.result
+        if diagnosis.primary_disease_id is None or result.get("confidence") is None:
+            continue
+        key = (timezone.localdate(diagnosis.created_at), diagnosis.primary_disease_id, diagnosis.model_version_id)
+        counters = totals[key]
+        counters[0] += 1
+        counters[1] += result["confidence"]
+        counters[2] += result.get("uncertainty") or 0.0
+    return totals
+
+
+def add_to_daily_stats(diagnoses):
+    """
+    Add newly saved diagnoses to the daily rollup (one UPDATE per date, disease and model version)
+    """
+    for (date, disease_id, model_version_id), (count, confidence, uncertainty) in daily_stats_totals(diagnoses).items():
+        _increment(
+            DiagnosisDailyStats,
+            dict(date=date, disease_id=disease_id, model_version_id=model_version_id),
+            diagnosis_count=count,
+            confidence_total=confidence,
+            uncertainty_total=uncertainty
+        )
+
+
+def remove_from_daily_stats(diagnoses):
+    """
+    Take deleted (or changed) diagnoses back out of the daily rollup
+    """
+    for (date, disease_id, model_version_id), (count, confidence, uncertainty) in daily_stats_totals(diagnoses).items():
+        # Days not in the rollup yet (before a backfill) have nothing to take out
+        DiagnosisDailyStats.objects.filter(
+            date=date, disease_id=disease_id, model_version_id=model_version_id, diagnosis_count__gte=count
+        ).update(
+            updated_at=timezone.now(),
+            diagnosis_count=F('diagnosis_count') - count,
+            confidence_total=F('confidence_total') - confidence,
+            uncertainty_total=F('uncertainty_total') - uncertainty
+        )
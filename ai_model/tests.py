@@ -1,3 +1,1111 @@
-from django.test import TestCase
+import io
+import json
+import os
+import runpy
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
+from unittest import mock
+
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.models.query import QuerySet
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .ml.lookup import all_symptom_vectors, build_lookup_table, get_lookup_table, symptom_index
+from .ml.model_builder import ModelNotAvailable, get_model_dir, get_model_entry
+from .ml.numpy_engine import NUMPY_WEIGHTS_FILENAME, NumpyMLP
+from .ml.registry import MODEL_FILENAME, METADATA_FILENAME, ModelRegistry
+from .ml.prediction import (
+    adaptive_predict_with_uncertainty, build_result, diagnose_batch, get_batcher_stats, get_diagnosis,
+    predict_with_uncertainty, sample_predictions
+)
+from .ml.chart_store import ChartStore, chart_key
+from .ml.tts import AudioCache, SilentBackend
+from .models import (
+    Diagnosis, DiagnosisArtifact, DiagnosisDailyStats, DiagnosisFeedback, DiagnosisFeedbackStats, DiagnosisSymptom,
+    Disease, Symptom
+)
+from .catalog import clear_catalog, get_symptom_ids
+from .packing import pack_prediction, unpack_prediction
+from .services import record_feedback, refresh_artifact, save_diagnoses
+from .views import chart_image
+
+
+class LookupTableTests(SimpleTestCase):
+    """
+    The precomputed table must agree with live MC Dropout inference
+    """
+
+    def setUp(self):
+        # Work on a copy so generated tables don't end up next to the real model
+        self.model_dir = tempfile.mkdtemp()
+        source_dir = get_model_dir()
+        for filename in (MODEL_FILENAME, METADATA_FILENAME, NUMPY_WEIGHTS_FILENAME):
+            shutil.copy(os.path.join(source_dir, filename), self.model_dir)
+        self.addCleanup(shutil.rmtree, self.model_dir)
+
+        self.settings_override = override_settings(AI_MODEL_PATH=self.model_dir, AI_MODEL_ENGINE='numpy')
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_symptom_index_matches_table_rows(self):
+        vectors = all_symptom_vectors(9)
+        self.assertEqual(vectors.shape, (512, 9))
+        for index in (0, 1, 5, 300, 511):
+            self.assertEqual(symptom_index(vectors[index].tolist()), index)
+
+    def test_table_is_reproducible(self):
+        entry = get_model_entry()
+        first = build_lookup_table(entry.model, 9, n_iter=50, seed=7)
+        second = build_lookup_table(entry.model, 9, n_iter=50, seed=7)
+        np.testing.assert_array_equal(first[0], second[0])
+        np.testing.assert_array_equal(first[1], second[1])
+
+    def test_parity_with_live_inference(self):
+        entry = get_model_entry()
+        mean_table, std_table = get_lookup_table(entry)
+
+        vectors = all_symptom_vectors(9)[::37]
+        mean_live, std_live = predict_with_uncertainty(entry.model, vectors, n_iter=4000)
+
+        indices = [symptom_index(vector) for vector in vectors.tolist()]
+        np.testing.assert_allclose(mean_table[indices], mean_live, atol=0.05)
+        np.testing.assert_allclose(std_table[indices], std_live, atol=0.05)
+
+    def test_get_diagnosis_uses_table(self):
+        symptom_values = [0, 1, 1, 0, 0, 0, 1, 0, 0]
+        with self.settings(AI_MODEL_LOOKUP_TABLE=True):
+            first = get_diagnosis(symptom_values)
+            second = get_diagnosis(symptom_values)
+        self.assertEqual(first, second)
+
+        mean_table, _ = get_lookup_table()
+        index = symptom_index(symptom_values)
+        self.assertAlmostEqual(first["confidence"], float(mean_table[index].max()), places=6)
+        self.assertTrue(any(name.startswith('lookup_') for name in os.listdir(self.model_dir)))
+
+
+class NumpyEngineArtifactTests(SimpleTestCase):
+    """
+    The NumPy engines serve from their exported weights alone
+    """
+
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        for filename in (METADATA_FILENAME, NUMPY_WEIGHTS_FILENAME):
+            shutil.copy(os.path.join(get_model_dir(), filename), self.model_dir)
+        self.addCleanup(shutil.rmtree, self.model_dir)
+
+    def test_numpy_engine_without_keras_model(self):
+        with self.settings(AI_MODEL_PATH=self.model_dir):
+            entry = get_model_entry('numpy')
+        self.assertEqual(entry.model.input_size, len(entry.metadata["symptoms"]))
+
+    def test_missing_export_is_not_built_on_request(self):
+        with self.settings(AI_MODEL_PATH=self.model_dir, AI_MODEL_QUANTIZATION='int8'):
+            with self.assertLogs('ai_model.ml.model_builder', 'ERROR'), \
+                    self.assertRaisesMessage(ModelNotAvailable, 'export_numpy_model --quantize int8'):
+                get_model_entry('quantized')
+        self.assertEqual(sorted(os.listdir(self.model_dir)), sorted([METADATA_FILENAME, NUMPY_WEIGHTS_FILENAME]))
+
+
+    def test_check_interval_read_at_call_time(self):
+        with self.settings(AI_MODEL_PATH=self.model_dir, AI_MODEL_REGISTRY_CHECK_INTERVAL=0):
+            entry = get_model_entry('numpy')
+            with open(os.path.join(self.model_dir, METADATA_FILENAME)) as f:
+                metadata = json.load(f)
+            with open(os.path.join(self.model_dir, METADATA_FILENAME), 'w') as f:
+                json.dump(dict(metadata, version='next'), f)
+            self.assertEqual(get_model_entry('numpy').version, 'next')
+        self.assertNotEqual(entry.version, 'next')
+
+
+@override_settings(AI_MODEL_WARMUP='master')
+class WarmupTests(SimpleTestCase):
+    """
+    The model is warmed up by the gunicorn hooks only, not on every app load
+    """
+
+    def test_not_on_app_load(self):
+        with mock.patch('ai_model.ml.warmup.warm_up_model') as warm_up_model:
+            apps.get_app_config('ai_model').ready()
+        warm_up_model.assert_not_called()
+
+    def test_gunicorn_master_hook(self):
+        hooks = runpy.run_path(os.path.join(str(settings.BASE_DIR), 'gunicorn.conf.py'))
+        for preload_app, calls in ((False, 0), (True, 1)):
+            server = mock.Mock(cfg=mock.Mock(preload_app=preload_app))
+            with mock.patch('ai_model.ml.warmup.warm_up_model') as warm_up_model:
+                hooks['when_ready'](server)
+            self.assertEqual(warm_up_model.call_count, calls)
+
+
+class PackedPredictionTests(SimpleTestCase):
+    """
+    Packed predictions must expand back to the stored result
+    """
+
+    def setUp(self):
+        with open(os.path.join(get_model_dir(), METADATA_FILENAME)) as f:
+            self.metadata = json.load(f)
+        n = len(self.metadata["diseases"])
+        probabilities = np.random.default_rng(0).dirichlet(np.ones(n)).astype(np.float32)
+        self.result = build_result(self.metadata, probabilities, probabilities / 4, 100)
+
+    def test_round_trip(self):
+        for dtype, places in (('float16', 3), ('float32', 6)):
+            packed, extra = pack_prediction(self.result, self.metadata, dtype)
+            self.assertEqual(extra, {})
+            expanded = unpack_prediction(packed, self.metadata, extra)
+            self.assertEqual(list(expanded), list(self.result))
+            self.assertEqual(expanded["diagnosis"], self.result["diagnosis"])
+            self.assertEqual(expanded["n_samples"], 100)
+            for disease, probability in self.result["probabilities"].items():
+                self.assertAlmostEqual(expanded["probabilities"][disease], probability, places=places)
+
+    def test_extra_keys_and_foreign_results(self):
+        result = dict(self.result, feedback={'accuracy_rating': 4})
+        packed, extra = pack_prediction(result, self.metadata)
+        self.assertEqual(extra, {'feedback': {'accuracy_rating': 4}})
+        self.assertEqual(unpack_prediction(packed, self.metadata, extra)["feedback"], {'accuracy_rating': 4})
+
+        other = dict(self.result, probabilities={'Flu': 1.0})
+        self.assertEqual(pack_prediction(other, self.metadata), (None, other))
+
+
+class FailingBackend:
+    name = 'failing'
+    extension = 'wav'
+    lang = 'en'
+
+    def save(self, text, path):
+        # Fails half way through the file
+        with open(path, 'wb') as f:
+            f.write(b'RIFF')
+        raise RuntimeError("no speech engine")
+
+
+class CountingBackend(SilentBackend):
+    def __init__(self, lang='en'):
+        super().__init__(lang)
+        self.saved = []
+        # Cleared to hold renders until the test sets it
+        self.release = threading.Event()
+        self.release.set()
+
+    def save(self, text, path):
+        self.release.wait(5)
+        self.saved.append(text)
+        super().save(text, path)
+
+
+@mock.patch('ai_model.ml.tts.update_artifact_status')
+class AudioCacheTests(SimpleTestCase):
+    """
+    Audio is synthesized once per sentence, backend and language
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def _files(self):
+        return sorted(name for _, _, names in os.walk(self.root) for name in names)
+
+    def test_key_stability(self, update_artifact_status):
+        key = AudioCache(self.root, SilentBackend()).key("Hello")
+        self.assertEqual(AudioCache(tempfile.gettempdir(), SilentBackend()).key("Hello"), key)
+        self.assertEqual(len(key), 64)
+        self.assertNotEqual(AudioCache(self.root, SilentBackend()).key("Hello."), key)
+        self.assertNotEqual(AudioCache(self.root, SilentBackend(lang='fr')).key("Hello"), key)
+        self.assertNotEqual(AudioCache(self.root, FailingBackend()).key("Hello"), key)
+
+    def test_failed_render_leaves_no_files(self, update_artifact_status):
+        cache = AudioCache(self.root, FailingBackend(), async_render=False)
+        with self.assertLogs('ai_model.ml.tts', 'ERROR'), self.assertRaises(RuntimeError):
+            cache.render("Hello")
+        self.assertEqual(self._files(), [])
+        self.assertFalse(cache.exists("Hello"))
+        self.assertEqual(cache.stats()['errors'], 1)
+        update_artifact_status.assert_called_once_with(cache.key("Hello"), 'failed', background=False)
+
+    def test_schedule_and_render_dedup(self, update_artifact_status):
+        backend = CountingBackend()
+        cache = AudioCache(self.root, backend)
+        # Held until both schedules are in, so the second finds the first pending
+        backend.release.clear()
+        paths = {cache.schedule("Hello") for _ in range(2)}
+        self.assertEqual(cache.stats()['pending'], 1)
+        backend.release.set()
+        cache._get_executor().submit(lambda: None).result()
+
+        self.assertEqual(len(paths), 1)
+        self.assertEqual(backend.saved, ["Hello"])
+        self.assertEqual(cache.render("Hello"), paths.pop())
+        self.assertEqual(backend.saved, ["Hello"])
+        self.assertEqual(self._files(), [f"{cache.key('Hello')}.wav"])
+        self.assertEqual(cache.stats(), {'hits': 1, 'renders': 1, 'errors': 0, 'pending': 0})
+
+
+class ArtifactStatusTests(TestCase):
+    """
+    Renders mark their artifacts ready or failed; reads only report
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.diagnosis = Diagnosis.objects.create()
+
+    def _artifact(self, kind, key):
+        return DiagnosisArtifact.objects.create(diagnosis=self.diagnosis, kind=kind, content_hash=key)
+
+    def test_chart_render_error(self):
+        artifact = self._artifact('chart', 'a' * 64)
+        future = Future()
+        future.set_exception(RuntimeError("render crashed"))
+        with self.assertLogs('ai_model.ml.chart_store', 'ERROR'):
+            ChartStore(self.root)._finish(artifact.content_hash, future)
+
+        artifact.refresh_from_db()
+        self.assertEqual(artifact.status, 'failed')
+        with self.assertNumQueries(0):
+            self.assertEqual(refresh_artifact(artifact).status, 'failed')
+
+    def test_chart_render_ready(self):
+        artifact = self._artifact('chart', 'b' * 64)
+        future = Future()
+        future.set_result(b'png')
+        ChartStore(self.root)._finish(artifact.content_hash, future)
+
+        artifact.refresh_from_db()
+        self.assertEqual((artifact.status, artifact.size), ('ready', 3))
+
+    def test_read_does_not_write(self):
+        # Rendered before the row was inserted
+        store = ChartStore(self.root)
+        store.put('c' * 64, b'png')
+        artifact = self._artifact('chart', 'c' * 64)
+
+        with mock.patch('ai_model.services.get_chart_store', return_value=store), self.assertNumQueries(0):
+            self.assertEqual(refresh_artifact(artifact).status, 'ready')
+        self.assertEqual(artifact.size, 3)
+        artifact.refresh_from_db()
+        self.assertEqual(artifact.status, 'pending')
+
+    def test_audio_render_error(self):
+        cache = AudioCache(self.root, FailingBackend(), async_render=False)
+        artifact = self._artifact('audio', cache.key("Hello"))
+        with self.assertLogs('ai_model.ml.tts', 'ERROR'), self.assertRaises(RuntimeError):
+            cache.render("Hello")
+
+        artifact.refresh_from_db()
+        self.assertEqual(artifact.status, 'failed')
+
+    def test_audio_render_ready(self):
+        cache = AudioCache(self.root, SilentBackend(), async_render=False)
+        artifact = self._artifact('audio', cache.key("Hello"))
+        cache.render("Hello")
+
+        artifact.refresh_from_db()
+        self.assertEqual(artifact.status, 'ready')
+        self.assertEqual(artifact.size, os.path.getsize(cache._path(artifact.content_hash)))
+
+    def test_chart_view_render_error(self):
+        store = ChartStore(self.root)
+        data = [['Flu'], [1.0], [0.0]]
+        key = chart_key('diagnosis', data)
+        artifact = self._artifact('chart', key)
+        store._write(store._path(key, 'json'), json.dumps({'kind': 'diagnosis', 'data': data}).encode('utf-8'))
+
+        with mock.patch('ai_model.views.get_chart_store', return_value=store), \
+                mock.patch('ai_model.ml.chart_store.render_chart', side_effect=RuntimeError("render crashed")), \
+                self.assertLogs('ai_model.ml.chart_store', 'ERROR'):
+            response = chart_image(RequestFactory().get('/'), key)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        artifact.refresh_from_db()
+        self.assertEqual(artifact.status, 'failed')
+
+
+class RenderThreadTests(TransactionTestCase):
+    """
+    Background renders update their artifacts without keeping a connection open
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_audio_render_thread(self):
+        cache = AudioCache(self.root, SilentBackend())
+        artifact = DiagnosisArtifact.objects.create(
+            diagnosis=Diagnosis.objects.create(), kind='audio', content_hash=cache.key("Hello")
+        )
+        with mock.patch('ai_model.ml.chart_store.close_old_connections') as close_old_connections:
+            cache.schedule("Hello")
+            cache._get_executor().submit(lambda: None).result()
+            self.assertEqual(close_old_connections.call_count, 2)
+
+            # Renders in the calling thread leave its connection alone
+            cache.render("Hello again")
+            self.assertEqual(close_old_connections.call_count, 2)
+
+        artifact.refresh_from_db()
+        self.assertEqual(artifact.status, 'ready')
+
+
+class CursorPaginationTests(TestCase):
+    """
+    Cursor pages follow (created_at, id), also across rows sharing a timestamp
+    """
+
+    def test_duplicate_timestamps_across_pages(self):
+        user = User.objects.create_user('patient')
+        now = timezone.now()
+        # 10 rows per page; the 15 rows sharing a timestamp span pages one to three
+        times = [now + timedelta(seconds=i) for i in range(5, 0, -1)] + [now] * 15 + \
+            [now - timedelta(seconds=i) for i in range(1, 6)]
+        Diagnosis.objects.bulk_create([Diagnosis(user=user, created_at=created_at) for created_at in times])
+        expected = list(Diagnosis.objects.filter(user=user).order_by('-created_at', '-id').values_list('id', flat=True))
+
+        client = APIClient()
+        client.force_authenticate(user)
+        pages, url = [], '/api/v1/diagnoses/?cursor='
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                data = client.get(url).json()
+            self.assertFalse(any('OFFSET' in query['sql'] for query in queries.captured_queries))
+            pages.append([item['id'] for item in data['results']])
+            url = data['next']
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), expected)
+
+        # And back again from the last page
+        self.assertEqual([item['id'] for item in client.get(data['previous']).json()['results']], pages[1])
+
+    def test_page_numbers_until_opted_in(self):
+        user = User.objects.create_user('patient')
+        Diagnosis.objects.bulk_create([Diagnosis(user=user) for _ in range(12)])
+        client = APIClient()
+        client.force_authenticate(user)
+
+        data = client.get('/api/v1/diagnoses/').json()
+        self.assertEqual(data['count'], 12)
+        self.assertIn('page=2', data['next'])
+
+        data = client.get('/api/v1/diagnoses/', headers={'X-Pagination': 'cursor'}).json()
+        self.assertNotIn('count', data)
+        self.assertIn('cursor=', data['next'])
+        self.assertEqual(len(client.get(data['next']).json()['results']), 2)
+
+        with self.settings(API_PAGE_NUMBER_COMPAT=False):
+            self.assertNotIn('count', client.get('/api/v1/diagnoses/').json())
+        with self.settings(API_CURSOR_PAGINATION=False):
+            self.assertIn('count', client.get('/api/v1/diagnoses/?cursor=').json())
+
+    def test_invalid_cursor(self):
+        user = User.objects.create_user('patient')
+        client = APIClient()
+        client.force_authenticate(user)
+        for cursor in ('bogus', 'cD1ub3Rqc29u', 'cD0lNUIlMjJ4JTIyJTJDJTIyMSUyMiU1RA=='):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(client.get('/api/v1/diagnoses/', {'cursor': cursor}).status_code, 404)
+
+
+class DailyStatsTests(TestCase):
+    """
+    The daily rollup follows diagnoses as they are created, changed and deleted
+    """
+
+    def setUp(self):
+        # Ids cached by the catalog don't survive the test's rollback
+        self.addCleanup(clear_catalog)
+        self.flu = Disease.objects.create(name='Flu')
+        self.cold = Disease.objects.create(name='Cold')
+
+    def _create(self, disease, confidence, uncertainty=0.1):
+        return Diagnosis.objects.create(
+            primary_disease=disease,
+            prediction_data={'diagnosis': disease.name, 'confidence': confidence, 'uncertainty': uncertainty}
+        )
+
+    def _stats(self):
+        return {
+            (row.disease.name, row.diagnosis_count): (round(row.confidence_total, 6), round(row.uncertainty_total, 6))
+            for row in DiagnosisDailyStats.objects.select_related('disease')
+        }
+
+    def test_create_update_and_delete(self):
+        first = self._create(self.flu, 0.5)
+        self._create(self.flu, 0.25, 0.2)
+        self.assertEqual(self._stats(), {('Flu', 2): (0.75, 0.3)})
+
+        first.primary_disease = self.cold
+        first.save()
+        self.assertEqual(self._stats(), {('Flu', 1): (0.25, 0.2), ('Cold', 1): (0.5, 0.1)})
+
+        # Saving fields the rollup doesn't depend on reads nothing back
+        with self.assertNumQueries(1):
+            first.save(update_fields=['symptom_mask'])
+
+        first.delete()
+        self.assertEqual(self._stats(), {('Flu', 1): (0.25, 0.2), ('Cold', 0): (0.0, 0.0)})
+
+    def test_bulk_save_delete_and_backfill(self):
+        with open(os.path.join(get_model_dir(), METADATA_FILENAME)) as f:
+            metadata = json.load(f)
+        n_diseases, n_symptoms = len(metadata["diseases"]), len(metadata["symptoms"])
+        rng = np.random.default_rng(0)
+        items = []
+        for _ in range(4):
+            probabilities = rng.dirichlet(np.ones(n_diseases)).astype(np.float32)
+            items.append(([1] + [0] * (n_symptoms - 1), build_result(metadata, probabilities, probabilities / 4, 10)))
+
+        diagnoses = save_diagnoses(None, metadata["symptoms"], items, metadata)
+        self.assertEqual(sum(DiagnosisDailyStats.objects.values_list('diagnosis_count', flat=True)), 4)
+
+        Diagnosis.objects.filter(pk__in=[diagnoses[0].pk, diagnoses[1].pk]).delete()
+        self._create(self.flu, 0.5)
+        incremental = self._stats()
+        self.assertEqual(sum(count for _, count in incremental), 3)
+
+        call_command('backfill_diagnosis_stats', stdout=io.StringIO())
+        rebuilt = self._stats()
+        # The backfill drops rows left at zero; everything else must agree
+        self.assertEqual(rebuilt, {key: value for key, value in incremental.items() if key[1]})
+
+
+@override_settings(
+    AI_MODEL_ENGINE='numpy', AI_MODEL_BATCHING=True, AI_MODEL_BATCH_MAX_WAIT_MS=200, AI_MODEL_MC_ITERATIONS=2000
+)
+class BatchingTests(TestCase):
+    """
+    Concurrent get_diagnosis calls are answered from shared batches
+    """
+
+    def setUp(self):
+        # A batcher of its own, built with the settings above
+        patcher = mock.patch('ai_model.ml.prediction._batcher', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        get_model_entry()
+
+    def _concurrent(self, vectors):
+        with ThreadPoolExecutor(len(vectors)) as executor:
+            futures = [executor.submit(get_diagnosis, vector) for vector in vectors]
+        return futures
+
+    def test_results_match_unbatched(self):
+        vectors = [[int(bit) for bit in f'{i * 57 % 512:09b}'] for i in range(8)]
+        futures = self._concurrent(vectors)
+
+        stats = get_batcher_stats()
+        self.assertEqual(stats['requests'], len(vectors))
+        self.assertGreater(stats['mean_batch_size'], 1)
+        for vector, future in zip(vectors, futures):
+            batched = future.result()
+            unbatched = diagnose_batch([vector])[0]
+            self.assertEqual(batched["n_samples"], 2000)
+            for disease, probability in unbatched["probabilities"].items():
+                self.assertAlmostEqual(batched["probabilities"][disease], probability, delta=0.05)
+
+    def test_bad_input_fails_alone(self):
+        vectors = [[0, 1, 1, 0, 0, 0, 1, 0, 0]] * 3 + [['x'] * 9]
+        with self.assertLogs('ai_model.ml.batching', 'ERROR'):
+            futures = self._concurrent(vectors)
+
+        for future in futures[:3]:
+            self.assertIn("diagnosis", future.result())
+        with self.assertRaises(ValueError):
+            futures[3].result()
+        stats = get_batcher_stats()
+        self.assertGreaterEqual(stats['errors'], 1)
+        self.assertEqual(sum(size * count for size, count in stats['batch_sizes'].items()), 3)
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self._concurrent([[0] * 9, [1] * 9])
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('patient'))
+        self.assertEqual(client.get('/api/v1/model-metrics/').status_code, 403)
+
+        client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        data = client.get('/api/v1/model-metrics/').json()
+        self.assertEqual(data['batcher']['requests'], 2)
+        self.assertGreaterEqual(data['registries']['numpy']['hits'], 2)
+        self.assertIn(get_model_dir(), data['registries']['numpy']['versions'])
+
+
+class ModelRegistryTests(SimpleTestCase):
+    """
+    The registry serves the loaded model until its files change, then swaps in the new one
+    """
+
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir)
+        self._write(MODEL_FILENAME, b'weights v1')
+        self._write(METADATA_FILENAME, b'{}')
+        self.loads = []
+        self.interval = 3600
+        self.registry = ModelRegistry(self._load, check_interval=lambda: self.interval)
+
+    def _write(self, filename, content):
+        with open(os.path.join(self.model_dir, filename), 'wb') as f:
+            f.write(content)
+
+    def _load(self, model_dir):
+        with open(os.path.join(model_dir, MODEL_FILENAME), 'rb') as f:
+            self.loads.append(f.read())
+        return self.loads[-1], {}
+
+    def test_hot_swap(self):
+        first = self.registry.get(self.model_dir)
+        self.assertEqual(first.model, b'weights v1')
+
+        # Within the check interval the files are not even looked at
+        self._write(MODEL_FILENAME, b'weights v2')
+        self.assertIs(self.registry.get(self.model_dir), first)
+
+        self.interval = 0
+        second = self.registry.get(self.model_dir)
+        self.assertEqual(second.model, b'weights v2')
+        self.assertNotEqual(second.version, first.version)
+
+        # Touched files with the same content are not reloaded
+        os.utime(os.path.join(self.model_dir, MODEL_FILENAME), ns=(0, 0))
+        self.assertIs(self.registry.get(self.model_dir), second)
+        self.assertIs(self.registry.get(self.model_dir), second)
+
+        self.assertEqual(self.loads, [b'weights v1', b'weights v2'])
+        stats = self.registry.stats()
+        self.assertEqual((stats['loads'], stats['reloads'], stats['hits']), (2, 1, 3))
+        self.assertEqual(stats['versions'], {self.model_dir: second.version})
+
+
+class DiagnosisApiTests(TestCase):
+    """
+    Diagnosis results are not editable through the API
+    """
+
+    def test_prediction_data_is_read_only(self):
+        user = User.objects.create_user('patient')
+        result = {'diagnosis': 'Flu', 'confidence': 0.5, 'uncertainty': 0.1}
+        diagnosis = Diagnosis.objects.create(user=user, prediction_data=result)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response = client.patch(
+            f'/api/v1/diagnoses/{diagnosis.pk}/',
+            {'prediction_data': {'diagnosis': 'Bogus', 'probabilities': {'Bogus': 2}}},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['prediction_data'], result)
+        diagnosis.refresh_from_db()
+        self.assertEqual(diagnosis.result, result)
+
+
+def read_metadata():
+    with open(os.path.join(get_model_dir(), METADATA_FILENAME)) as f:
+        return json.load(f)
+
+
+class SymptomFilterTests(TestCase):
+    """
+    Diagnoses are filtered by symptom combination through symptom_mask
+    """
+
+    def setUp(self):
+        self.addCleanup(clear_catalog)
+        self.metadata = read_metadata()
+        self.symptoms = self.metadata["symptoms"]
+        self.user = User.objects.create_user('patient')
+        n = len(self.metadata["diseases"])
+        result = build_result(self.metadata, np.full(n, 1.0 / n, dtype=np.float32), np.zeros(n, dtype=np.float32), 10)
+        self.vectors = [[1, 1] + [0] * (len(self.symptoms) - 2), [1, 0] + [0] * (len(self.symptoms) - 2),
+                        [0, 1] + [0] * (len(self.symptoms) - 2)]
+        self.diagnoses = save_diagnoses(self.user, self.symptoms, [(v, result) for v in self.vectors], self.metadata)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _ids(self, query):
+        response = self.client.get('/api/v1/diagnoses/' + query)
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted(item['id'] for item in response.json()['results'])
+
+    def test_has_and_lacks(self):
+        first, second, third = (diagnosis.pk for diagnosis in self.diagnoses)
+        self.assertEqual(self._ids(f'?has_symptoms={self.symptoms[0]}'), [first, second])
+        self.assertEqual(self._ids(f'?has_symptoms={self.symptoms[0]},{self.symptoms[1]}'), [first])
+        self.assertEqual(self._ids(f'?lacks_symptoms={self.symptoms[0]}'), [third])
+        # Names match case-insensitively
+        self.assertEqual(
+            self._ids(f'?has_symptoms={self.symptoms[1].upper()}&lacks_symptoms={self.symptoms[0]}'), [third]
+        )
+        self.assertEqual(self._ids(f'?has_symptoms={self.symptoms[0]}&lacks_symptoms={self.symptoms[0]}'), [])
+
+    def test_unknown_symptom(self):
+        response = self.client.get('/api/v1/diagnoses/?has_symptoms=Hiccups')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Hiccups', str(response.json()['symptoms']))
+
+
+class SymptomMaskMigrationTests(TransactionTestCase):
+    """
+    Migration 0003 fills symptom_mask from the existing symptom rows
+    """
+
+    def _migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate(target)
+        return executor.loader.project_state(target).apps
+
+    def test_backfill(self):
+        leaves = MigrationExecutor(connection).loader.graph.leaf_nodes()
+        self.addCleanup(self._migrate, leaves)
+
+        old_apps = self._migrate([('ai_model', '0002_diagnosisartifact')])
+        Symptom = old_apps.get_model('ai_model', 'Symptom')
+        Diagnosis = old_apps.get_model('ai_model', 'Diagnosis')
+        DiagnosisSymptom = old_apps.get_model('ai_model', 'DiagnosisSymptom')
+
+        symptoms = read_metadata()["symptoms"]
+        rows = [Symptom.objects.create(name=name) for name in symptoms]
+        present = [{0, 2}, set(), {len(symptoms) - 1}]
+        diagnoses = [Diagnosis.objects.create(prediction_data={}) for _ in present]
+        # One with no symptom rows at all
+        untouched = Diagnosis.objects.create(prediction_data={})
+        DiagnosisSymptom.objects.bulk_create([
+            DiagnosisSymptom(diagnosis=diagnosis, symptom=symptom, is_present=i in indices)
+            for diagnosis, indices in zip(diagnoses, present)
+            for i, symptom in enumerate(rows)
+        ])
+
+        new_apps = self._migrate([('ai_model', '0003_diagnosis_symptom_mask')])
+        masks = dict(new_apps.get_model('ai_model', 'Diagnosis').objects.values_list('id', 'symptom_mask'))
+        self.assertEqual([masks[diagnosis.pk] for diagnosis in diagnoses], [0b101, 0, 1 << (len(symptoms) - 1)])
+        self.assertIsNone(masks[untouched.pk])
+
+
+@override_settings(AI_MODEL_ENGINE='numpy')
+class BatchDiagnoseTests(TestCase):
+    """
+    The batch endpoint scores valid items in chunks and reports invalid ones in place
+    """
+
+    url = '/api/v1/diagnoses/batch/'
+
+    def setUp(self):
+        self.addCleanup(clear_catalog)
+        self.n_symptoms = len(read_metadata()["symptoms"])
+        self.client = APIClient()
+
+    def _vector(self, i):
+        return [int(bit) for bit in f'{i:0{self.n_symptoms}b}'[-self.n_symptoms:]]
+
+    def test_mixed_items_keep_input_order(self):
+        items = [self._vector(1), [0, 2] + [0] * (self.n_symptoms - 2), [1, 1, 1], self._vector(2), 'fever']
+        response = self.client.post(self.url, {'items': items}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        data = response.json()
+        self.assertEqual((data['count'], data['error_count']), (5, 3))
+        self.assertEqual([item['index'] for item in data['results']], [0, 1, 2, 3, 4])
+        self.assertEqual([sorted(item) for item in data['results']], [
+            ['index', 'result'], ['errors', 'index'], ['errors', 'index'], ['index', 'result'], ['errors', 'index']
+        ])
+        self.assertIn('Expected', data['results'][2]['errors']['symptom_values'][0])
+
+    def test_item_limit(self):
+        items = [self._vector(0)] * 1001
+        response = self.client.post(self.url, {'items': items}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.json())
+        self.assertEqual(self.client.post(self.url, {'items': []}, format='json').status_code, 400)
+
+    @override_settings(AI_MODEL_BATCH_API_CHUNK_SIZE=2)
+    def test_chunks(self):
+        items = [self._vector(i) for i in range(5)]
+        with mock.patch('ai_model.api.views.diagnose_batch', wraps=diagnose_batch) as batch:
+            response = self.client.post(self.url, {'items': items}, format='json')
+        self.assertEqual([len(call.args[0]) for call in batch.call_args_list], [2, 2, 1])
+        self.assertEqual([item['index'] for item in response.json()['results']], list(range(5)))
+
+    def test_anonymous_and_authenticated(self):
+        items = [self._vector(3), self._vector(4)]
+        data = self.client.post(self.url, {'items': items}, format='json').json()
+        self.assertFalse(any('diagnosis_id' in item for item in data['results']))
+        self.assertFalse(Diagnosis.objects.exists())
+
+        user = User.objects.create_user('patient')
+        self.client.force_authenticate(user)
+        data = self.client.post(self.url, {'items': items + ['fever']}, format='json').json()
+        ids = [item.get('diagnosis_id') for item in data['results']]
+        self.assertEqual(ids[2], None)
+        self.assertEqual(sorted(Diagnosis.objects.filter(user=user).values_list('id', flat=True)), sorted(ids[:2]))
+
+    def test_unexpected_errors_are_not_client_errors(self):
+        with mock.patch('ai_model.api.views.diagnose_batch', side_effect=RuntimeError("boom")):
+            self.client.raise_request_exception = False
+            response = self.client.post(self.url, {'items': [self._vector(0)]}, format='json')
+        self.assertEqual(response.status_code, 500)
+
+
+class SaveDiagnosesTests(TestCase):
+    """
+    Diagnoses are saved with a fixed number of queries, all or nothing
+    """
+
+    def setUp(self):
+        self.addCleanup(clear_catalog)
+        self.metadata = read_metadata()
+        self.symptoms = self.metadata["symptoms"]
+        n = len(self.metadata["diseases"])
+        result = build_result(self.metadata, np.full(n, 1.0 / n, dtype=np.float32), np.zeros(n, dtype=np.float32), 10)
+        self.items = [([i % 2] * len(self.symptoms), result) for i in range(20)]
+
+    def test_queries_with_warm_catalog(self):
+        save_diagnoses(None, self.symptoms, self.items[:1], self.metadata)
+        # Savepoint and release, two INSERTs and one rollup UPDATE (every result has the same disease)
+        with self.assertNumQueries(5):
+            save_diagnoses(None, self.symptoms, self.items, self.metadata)
+        self.assertEqual(DiagnosisSymptom.objects.count(), 21 * len(self.symptoms))
+
+    def test_failed_symptom_insert_rolls_back(self):
+        save_diagnoses(None, self.symptoms, self.items[:1], self.metadata)
+        stats = list(DiagnosisDailyStats.objects.values_list('diagnosis_count', flat=True))
+
+        with mock.patch.object(DiagnosisSymptom.objects, 'bulk_create', side_effect=IntegrityError("symptom insert")):
+            with self.assertRaises(IntegrityError):
+                save_diagnoses(None, self.symptoms, self.items, self.metadata)
+        self.assertEqual(Diagnosis.objects.count(), 1)
+        self.assertEqual(list(DiagnosisDailyStats.objects.values_list('diagnosis_count', flat=True)), stats)
+
+    def test_cleared_catalog_picks_up_new_ids(self):
+        old_id, = get_symptom_ids(['Hiccups'])
+
+        # Deleting sends a signal that clears this process's catalog
+        Symptom.objects.filter(pk=old_id).delete()
+        new_id, = get_symptom_ids(['Hiccups'])
+        self.assertNotEqual(new_id, old_id)
+
+        # Changes made without signals (other workers, queryset updates) are seen after the TTL
+        Symptom.objects.filter(pk=new_id).update(name='Hiccough')
+        newer = Symptom.objects.create(name='Hiccups')
+        self.assertEqual(get_symptom_ids(['Hiccups']), [new_id])
+        with self.settings(AI_MODEL_CATALOG_TTL=0):
+            self.assertEqual(get_symptom_ids(['Hiccups']), [newer.pk])
+
+
+# The web views are not part of the project urls
+urlpatterns = [
+    path('', include('ai_model.urls')),
+    path('', include('healthcare.urls')),
+]
+
+
+def render_context(request, template_name, context):
+    return HttpResponse(json.dumps(context['present_symptoms']))
+
+
+@override_settings(
+    ROOT_URLCONF=__name__,
+    AI_MODEL_ENGINE='numpy',
+    AI_MODEL_CHART_RENDER_WORKERS=0,
+    AI_MODEL_TTS_BACKEND='silent',
+    AI_MODEL_TTS_ASYNC=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ResultPageTests(TestCase):
+    """
+    The diagnosis result page reads a reference to the result and never writes
+    """
+
+    def setUp(self):
+        self.addCleanup(clear_catalog)
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(MEDIA_ROOT=root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for patcher in (
+            mock.patch('ai_model.ml.chart_store._store', None),
+            mock.patch('ai_model.ml.tts._cache', None),
+            mock.patch('ai_model.views.render', render_context),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.symptoms = read_metadata()["symptoms"]
+
+    def _diagnose(self):
+        return self.client.post('/diagnose/', {'symptom_0': 'on', 'symptom_2': 'on'})
+
+    def _get_without_writes(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        statements = [query['sql'].split()[0].upper() for query in queries.captured_queries]
+        self.assertFalse(set(statements) - {'SELECT'}, statements)
+        return response, statements
+
+    def test_anonymous(self):
+        response = self._diagnose()
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('token=', response.url)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+        response, statements = self._get_without_writes(response.url)
+        self.assertEqual(json.loads(response.content), [self.symptoms[0], self.symptoms[2]])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertEqual(statements, [])
+
+    def test_logged_in(self):
+        self.client.force_login(User.objects.create_user('patient'))
+        response = self._diagnose()
+        self.assertEqual(response.url, '/result/')
+        self.assertEqual(self.client.session['diagnosis_id'], Diagnosis.objects.get().pk)
+
+        # The user, the diagnosis and its artifacts; the session comes from the cache
+        response, statements = self._get_without_writes('/result/')
+        self.assertEqual(json.loads(response.content), [self.symptoms[0], self.symptoms[2]])
+        self.assertEqual(len(statements), 3)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_bad_tokens(self):
+        url = self._diagnose().url
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        # Tampered, made up and expired tokens all go back to the start
+        for bad_url in (url[:-2] + 'xx', '/result/?token=nonsense', '/result/'):
+            with self.subTest(url=bad_url):
+                self.assertRedirects(self.client.get(bad_url), '/', fetch_redirect_response=False)
+        with self.settings(AI_MODEL_RESULT_CACHE_TIMEOUT=-1):
+            self.assertRedirects(self.client.get(url), '/', fetch_redirect_response=False)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class FeedbackTests(TestCase):
+    """
+    Every feedback submission is its own row and is added to the rating totals
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('patient')
+        self.flu = Disease.objects.create(name='Flu')
+        self.diagnosis = Diagnosis.objects.create(user=self.user, prediction_data={}, primary_disease=self.flu)
+
+    def _stats(self):
+        return list(DiagnosisFeedbackStats.objects.values_list('disease__name', 'feedback_count', 'rating_total'))
+
+    def test_submissions(self):
+        self.client.force_login(self.user)
+        session = self.client.session
+        session['diagnosis_id'] = self.diagnosis.pk
+        session.save()
+
+        for rating, comments in ((2, 'meh'), (5, 'spot on')):
+            response = self.client.post('/feedback/', {'accuracy_rating': rating, 'comments': comments})
+            self.assertEqual(response.json()['status'], 'success')
+
+        self.assertEqual(
+            list(self.diagnosis.feedback.values_list('accuracy_rating', 'comments', 'user')),
+            [(5, 'spot on', self.user.pk), (2, 'meh', self.user.pk)]
+        )
+        self.assertEqual(self._stats(), [('Flu', 2, 7)])
+        self.assertEqual(DiagnosisFeedbackStats.objects.get().average_rating, 3.5)
+
+    def test_concurrent_create_falls_back_to_update(self):
+        record_feedback(self.diagnosis, 4)
+
+        # The first UPDATE misses as if the row had not been created yet, the INSERT then conflicts
+        update = QuerySet.update
+        misses = []
+
+        def racing_update(queryset, **kwargs):
+            if queryset.model is DiagnosisFeedbackStats and not misses:
+                misses.append(kwargs)
+                return 0
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            record_feedback(self.diagnosis, 2)
+        self.assertEqual(len(misses), 1)
+        self.assertEqual(self._stats(), [('Flu', 2, 6)])
+        self.assertEqual(DiagnosisFeedback.objects.count(), 2)
+
+    def test_stats_endpoint_is_staff_only(self):
+        record_feedback(self.diagnosis, 4)
+        client = APIClient()
+        self.assertIn(client.get('/api/v1/feedback-stats/').status_code, (401, 403))
+
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/v1/feedback-stats/').status_code, 403)
+
+        client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        response = client.get('/api/v1/feedback-stats/')
+        self.assertEqual(response.status_code, 200)
+        row, = response.json()['results']
+        self.assertEqual((row['feedback_count'], row['average_rating']), (1, 4.0))
+
+
+class FeedbackMigrationTests(TransactionTestCase):
+    """
+    Migration 0006 moves feedback out of prediction_data and back
+    """
+
+    def _migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate(target)
+        return executor.loader.project_state(target).apps
+
+    def test_move_and_restore(self):
+        leaves = MigrationExecutor(connection).loader.graph.leaf_nodes()
+        self.addCleanup(self._migrate, leaves)
+
+        before = [('ai_model', '0005_diagnosis_diagnosis_user_created_idx')]
+        old_apps = self._migrate(before)
+        Disease = old_apps.get_model('ai_model', 'Disease')
+        Diagnosis = old_apps.get_model('ai_model', 'Diagnosis')
+        flu = Disease.objects.create(name='Flu')
+        feedback = {'accuracy_rating': '4', 'comments': 'ok', 'submitted_at': '2026-01-02T03:04:05+00:00'}
+        rated = Diagnosis.objects.create(primary_disease=flu, prediction_data={'diagnosis': 'Flu', 'feedback': feedback})
+        Diagnosis.objects.create(primary_disease=flu, prediction_data={'feedback': dict(feedback, accuracy_rating='2')})
+        # Ratings that were never valid are dropped
+        bogus = Diagnosis.objects.create(prediction_data={'feedback': {'accuracy_rating': 'x'}})
+
+        new_apps = self._migrate([('ai_model', '0006_diagnosis_feedback')])
+        DiagnosisFeedback = new_apps.get_model('ai_model', 'DiagnosisFeedback')
+        moved = DiagnosisFeedback.objects.get(diagnosis_id=rated.pk)
+        self.assertEqual((moved.accuracy_rating, moved.comments), (4, 'ok'))
+        self.assertEqual(moved.created_at.isoformat(), feedback['submitted_at'])
+        self.assertEqual(DiagnosisFeedback.objects.count(), 2)
+        stats = new_apps.get_model('ai_model', 'DiagnosisFeedbackStats').objects.get()
+        self.assertEqual((stats.disease_id, stats.feedback_count, stats.rating_total), (flu.pk, 2, 6))
+        new_diagnosis = new_apps.get_model('ai_model', 'Diagnosis')
+        self.assertEqual(new_diagnosis.objects.get(pk=rated.pk).prediction_data, {'diagnosis': 'Flu'})
+        self.assertEqual(new_diagnosis.objects.get(pk=bogus.pk).prediction_data, {})
+
+        old_apps = self._migrate(before)
+        restored = old_apps.get_model('ai_model', 'Diagnosis').objects.get(pk=rated.pk)
+        self.assertEqual(restored.prediction_data, {'diagnosis': 'Flu', 'feedback': feedback})
+
+
+
+def toy_model():
+    """
+    Two inputs, each driving its own 16 hidden units behind dropout
+
+    The units of the first input all vote for class 0, so dropout barely moves
+    its prediction. Those of the second are split between the two classes, so
+    its prediction swings with every dropout mask.
+    """
+    kernel = np.zeros((2, 32), dtype=np.float32)
+    kernel[0, :16] = 1
+    kernel[1, 16:] = 1
+    head = np.zeros((32, 2), dtype=np.float32)
+    head[:16, 0] = 10
+    head[16:24, 0] = 1
+    head[24:, 1] = 1
+    return NumpyMLP([
+        {'type': 'dense', 'activation': 'relu', 'kernel': kernel, 'bias': np.zeros(32, dtype=np.float32)},
+        {'type': 'dropout', 'rate': 0.5},
+        {'type': 'dense', 'activation': 'softmax', 'kernel': head, 'bias': np.zeros(2, dtype=np.float32)},
+    ])
+
+
+class AdaptiveSamplingTests(SimpleTestCase):
+    """
+    Converged inputs stop early, and the estimates are those of the samples drawn
+    """
+
+    x = np.array([[1, 0], [0, 1]], dtype=np.float32)
+
+    def _adaptive(self, seed=0):
+        # Keep every block drawn for each input
+        draws = {0: [], 1: []}
+
+        def recording_sample(model, x, n_iter, chunk_size=None, rng=None):
+            preds = sample_predictions(model, x, n_iter, chunk_size, rng)
+            for row, features in enumerate(x):
+                draws[int(features[1])].append(preds[:, row])
+            return preds
+
+        with mock.patch('ai_model.ml.prediction.sample_predictions', recording_sample):
+            mean, std, n_samples = adaptive_predict_with_uncertainty(
+                toy_model(), self.x, tolerance=0.01, min_samples=20, max_samples=100, block_size=10,
+                rng=np.random.default_rng(seed)
+            )
+        return mean, std, n_samples, {i: np.concatenate(blocks) for i, blocks in draws.items()}
+
+    def test_confident_input_stops_at_min_samples(self):
+        mean, std, n_samples, draws = self._adaptive()
+        self.assertEqual(n_samples.tolist(), [20, 100])
+        self.assertEqual([len(draws[0]), len(draws[1])], [20, 100])
+        self.assertGreater(mean[0, 0], 0.99)
+        self.assertGreater(std[1, 0], 0.1)
+
+    def test_estimates_match_a_fixed_count_run(self):
+        mean, std, n_samples, draws = self._adaptive(seed=7)
+        for i, preds in draws.items():
+            np.testing.assert_allclose(mean[i], preds.mean(axis=0), rtol=1e-5, atol=1e-6)
+            np.testing.assert_allclose(std[i], preds.std(axis=0), rtol=1e-4, atol=1e-5)
+
+        # A single input samples the same stream as predict_with_uncertainty with as many iterations
+        ambiguous = self.x[1:]
+        mean, std, n_samples = adaptive_predict_with_uncertainty(
+            toy_model(), ambiguous, tolerance=0.01, min_samples=20, max_samples=100, block_size=10,
+            rng=np.random.default_rng(3)
+        )
+        fixed_mean, fixed_std = predict_with_uncertainty(
+            toy_model(), ambiguous, n_iter=int(n_samples[0]), chunk_size=0, rng=np.random.default_rng(3)
+        )
+        np.testing.assert_allclose(mean, fixed_mean, rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(std, fixed_std, rtol=1e-4, atol=1e-5)
+
+
+class SamplingParityTests(SimpleTestCase):
+    """
+    Tiled MC Dropout draws the same samples as one forward pass per iteration
+    """
+
+    def _loop(self, model, x, n_iter, rng):
+        return np.stack([model(x, training=True, rng=rng) for _ in range(n_iter)])
+
+    def test_tiled_and_chunked_match_loop(self):
+        x = np.array([[1, 0], [0, 1], [1, 1]], dtype=np.float32)
+        expected = self._loop(toy_model(), x, 50, np.random.default_rng(11))
+        # Chunks that split iterations as well as ones that line up with them
+        for chunk_size in (None, 3, 7, 150):
+            with self.subTest(chunk_size=chunk_size):
+                preds = sample_predictions(toy_model(), x, 50, chunk_size, np.random.default_rng(11))
+                np.testing.assert_array_equal(preds, expected)
+
+    def test_keras_matches_numpy(self):
+        keras_model = get_model_entry('keras').model
+        numpy_model = get_model_entry('numpy').model
+        vectors = all_symptom_vectors(numpy_model.input_size)[::61]
+
+        keras_mean, keras_std = predict_with_uncertainty(keras_model, vectors, n_iter=2000, chunk_size=0)
+        numpy_mean, numpy_std = predict_with_uncertainty(
+            numpy_model, vectors, n_iter=2000, chunk_size=0, rng=np.random.default_rng(0)
+        )
+        # Different dropout masks, so only within the sampling error of 2000 draws
+        np.testing.assert_allclose(keras_mean, numpy_mean, atol=0.03)
+        np.testing.assert_allclose(keras_std, numpy_std, atol=0.03)
 
-# Create your tests here.
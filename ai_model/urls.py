@@ -1,4 +1,4 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from . import views
 from rest_framework.routers import DefaultRouter
 from .apis import SymptomViewSet, DiagnosisViewSet
@@ -16,5 +16,6 @@ urlpatterns = [
     path('history/', views.diagnosis_history, name='history'),
     path('history/<int:diagnosis_id>/', views.diagnosis_detail, name='diagnosis_detail'),
     path('feedback/', views.submit_feedback, name='submit_feedback'),
+    re_path(r'^charts/(?P<key>[0-9a-f]{64})\.png$', views.chart_image, name='chart'),
     path('api/', include(router.urls)),
 ]
\ No newline at end of file
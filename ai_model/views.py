@@ -1,21 +1,68 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.utils import timezone
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import etag, require_safe
 
 from .forms import SymptomForm, FeedbackForm
-from .models import Symptom, Disease, Diagnosis, DiagnosisSymptom
+from .models import Diagnosis, DiagnosisSymptom
 from .ml.model_builder import load_trained_model
 from .ml.prediction import get_diagnosis, generate_audio_diagnosis
-from .ml.visualizer import (
-    create_diagnosis_chart,
-    create_symptoms_radar_chart,
-    save_diagnosis_chart
+from .ml.chart_store import ChartRenderError, diagnosis_chart_keys, get_chart_store
+from .result_cache import load_result, store_result
+from .services import (
+    CHART_ARTIFACT_KINDS, audio_artifact, chart_artifacts, record_feedback, save_artifacts, save_diagnosis
 )
 
 import json
-import uuid
+from concurrent import futures
+
+
+def chart_url(key):
+    """
+    URL of a chart in the chart store
+    """
+    return reverse('ai_model:chart', args=[key])
+
+
+@require_safe
+@etag(lambda request, key: key)
+def chart_image(request, key):
+    """
+    Serve a chart from the chart store
+
+    The key is a hash of the plotted data, so the image behind a URL never
+    changes and can be cached by browsers and proxies indefinitely. Charts
+    still being rendered in the background are waited for.
+    """
+    try:
+        png = get_chart_store().wait(key)
+    except futures.TimeoutError:
+        # Still rendering; the client can retry
+        response = HttpResponse(status=503)
+        response['Retry-After'] = '1'
+        return response
+    except ChartRenderError:
+        # Logged by the store; the spec is kept, so a later request renders it again
+        response = HttpResponse(status=503)
+        response['Retry-After'] = '30'
+        return response
+
+    if png is None:
+        raise Http404("Chart not found")
+
+    response = HttpResponse(png, content_type='image/png')
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=getattr(settings, 'AI_MODEL_CHART_MAX_AGE', 31536000),
+        immutable=True
+    )
+    return response
 
 
 def home(request):
@@ -59,105 +106,97 @@ def diagnose(request):
         # Get diagnosis result
         result = get_diagnosis(symptom_values)
 
-        # Generate visualization
-        diseases = list(result["probabilities"].keys())
-        probabilities = list(result["probabilities"].values())
-        uncertainties = list(result["uncertainties"].values())
-
-        # Create charts
-        diagnosis_chart = create_diagnosis_chart(diseases, probabilities, uncertainties)
-        symptoms_chart = create_symptoms_radar_chart(symptoms, symptom_values)
+        # Queue the chart renders now (a no-op for data seen before)
+        chart_keys = diagnosis_chart_keys(result, symptoms, symptom_values)
 
         # Create diagnosis object in database if user is logged in
         if request.user.is_authenticated:
-            # Get or create disease
-            primary_disease, _ = Disease.objects.get_or_create(
-                name=result["diagnosis"],
-                defaults={
-                    'test_recommendation': result["test_recommendation"],
-                    'medicine_recommendation': result["medicine_recommendation"]
-                }
-            )
-
-            # Create diagnosis
-            diagnosis = Diagnosis.objects.create(
-                user=request.user,
-                primary_disease=primary_disease,
-                prediction_data=result
-            )
-
-            # Create symptom relationships
-            for i, symptom_name in enumerate(symptoms):
-                symptom, _ = Symptom.objects.get_or_create(name=symptom_name)
-                DiagnosisSymptom.objects.create(
-                    diagnosis=diagnosis,
-                    symptom=symptom,
-                    is_present=bool(symptom_values[i])
-                )
-
-            # Save chart for historical record
-            chart_filename = f"diagnosis_{diagnosis.id}_{timezone.now().strftime('%Y%m%d%H%M%S')}.png"
-            chart_path = save_diagnosis_chart(diseases, probabilities, uncertainties, chart_filename)
-
-            # Generate audio
-            audio_path = generate_audio_diagnosis(result)
-
-            # Store paths in session for retrieval
-            request.session['diagnosis_id'] = diagnosis.id
-        else:
-            # For anonymous users, store diagnosis in session
-            session_id = request.session.get('session_id', str(uuid.uuid4()))
-            request.session['session_id'] = session_id
+            # Diagnosis and symptom rows in one transaction
+            diagnosis = save_diagnosis(request.user, symptoms, symptom_values, result, metadata)
 
             # Generate audio
             audio_path = generate_audio_diagnosis(result)
 
-            # Store paths in session
-            request.session['diagnosis_data'] = {
-                'result': result,
-                'symptom_values': symptom_values,
-                'created_at': timezone.now().isoformat()
-            }
-
-        # Store common data in session
-        request.session['diagnosis_result'] = result
-        request.session['symptom_values'] = symptom_values
-        request.session['audio_path'] = audio_path
-        request.session.modified = True
-
+            # Keep the charts and audio with the diagnosis for the history pages
+            save_artifacts(
+                chart_artifacts(diagnosis, chart_keys)
+                + [audio_artifact(diagnosis, audio_path)]
+            )
 
-        return redirect('ai_model:diagnosis_result')
+            # The session only references the saved diagnosis
+            request.session['diagnosis_id'] = diagnosis.id
+            return redirect('ai_model:diagnosis_result')
+
+        # For anonymous users, keep the result in the result cache and pass a
+        # signed token to the result page, leaving the session untouched
+        token = store_result({
+            'result': result,
+            'symptom_values': symptom_values,
+            'audio_path': generate_audio_diagnosis(result),
+            'chart_keys': list(chart_keys)
+        })
+        return redirect(f"{reverse('ai_model:diagnosis_result')}?{urlencode({'token': token})}")
 
     # If form is invalid, return to home page with error message
     messages.error(request, 'There was an error processing your request. Please try again.')
     return redirect('ai_model:home')
 
 
-def diagnosis_result(request):
+def _saved_result(request, symptoms):
     """
-    Display diagnosis result
+    Result page data of the diagnosis referenced by the session, read from its row and artifacts
     """
-    # Get diagnosis data from session
-    result = request.session.get('diagnosis_result')
-    symptom_values = request.session.get('symptom_values')
-    audio_path = request.session.get('audio_path')
+    diagnosis_id = request.session.get('diagnosis_id')
+    if not diagnosis_id or not request.user.is_authenticated:
+        return None
+    diagnosis = Diagnosis.objects.filter(id=diagnosis_id, user=request.user).prefetch_related('artifacts').first()
+    if diagnosis is None:
+        return None
+
+    if diagnosis.symptom_mask is not None:
+        symptom_values = [(diagnosis.symptom_mask >> i) & 1 for i in range(len(symptoms))]
+    else:
+        present = set(diagnosis.diagnosissymptom_set.filter(is_present=True).values_list('symptom__name', flat=True))
+        symptom_values = [1 if name in present else 0 for name in symptoms]
+
+    artifacts = {artifact.kind: artifact for artifact in diagnosis.artifacts.all()}
+    return {
+        'result': diagnosis.result,
+        'symptom_values': symptom_values,
+        'audio_path': artifacts['audio'].path if 'audio' in artifacts else None,
+        'chart_keys': [artifacts[kind].content_hash for kind in CHART_ARTIFACT_KINDS if kind in artifacts]
+    }
 
 
-    if not result or not symptom_values:
-        messages.error(request, 'No diagnosis data found. Please try again.')
-        return redirect('ai_model:home')
+def diagnosis_result(request):
+    """
+    Display diagnosis result
 
+    Anonymous results come from the result cache through the signed ?token=,
+    saved diagnoses from the id in the session. Viewing the page never writes
+    to the session.
+    """
     # Load model metadata
     _, metadata = load_trained_model()
     symptoms = metadata.get("symptoms", [])
 
-    # Create charts
-    diseases = list(result["probabilities"].keys())
-    probabilities = list(result["probabilities"].values())
-    uncertainties = list(result["uncertainties"].values())
+    token = request.GET.get('token')
+    data = load_result(token) if token else _saved_result(request, symptoms)
+
+    if not data or not data['symptom_values']:
+        messages.error(request, 'No diagnosis data found. Please try again.')
+        return redirect('ai_model:home')
+
+    result = data['result']
+    symptom_values = data['symptom_values']
+    audio_path = data['audio_path']
 
-    diagnosis_chart = create_diagnosis_chart(diseases, probabilities, uncertainties)
-    symptoms_chart = create_symptoms_radar_chart(symptoms, symptom_values)
+    # Chart images are served from the chart store
+    chart_keys = data['chart_keys']
+    if len(chart_keys) == 2:
+        diagnosis_chart, symptoms_chart = chart_keys
+    else:
+        diagnosis_chart, symptoms_chart = diagnosis_chart_keys(result, symptoms, symptom_values)
 
     # Create a list of symptoms that are present
     present_symptoms = [
@@ -174,8 +213,8 @@ def diagnosis_result(request):
         'test_recommendation': result["test_recommendation"],
         'medicine_recommendation': result["medicine_recommendation"],
         'present_symptoms': present_symptoms,
-        'diagnosis_chart': diagnosis_chart,
-        'symptoms_chart': symptoms_chart,
+        'diagnosis_chart_url': chart_url(diagnosis_chart),
+        'symptoms_chart_url': chart_url(symptoms_chart),
         'audio_path': audio_path,
         'feedback_form': feedback_form,
         'page_title': f'Diagnosis Result: {result["diagnosis"]}'
@@ -205,20 +244,21 @@ def diagnosis_detail(request, diagnosis_id):
     View details of a specific diagnosis
     """
     diagnosis = get_object_or_404(Diagnosis, id=diagnosis_id, user=request.user)
-    result = diagnosis.prediction_data
+    result = diagnosis.result
 
     # Get symptoms and values
     symptoms_data = DiagnosisSymptom.objects.filter(diagnosis=diagnosis)
     symptoms = [s.symptom.name for s in symptoms_data]
     symptom_values = [1 if s.is_present else 0 for s in symptoms_data]
 
-    # Create charts
-    diseases = list(result["probabilities"].keys())
-    probabilities = list(result["probabilities"].values())
-    uncertainties = list(result["uncertainties"].values())
-
-    diagnosis_chart = create_diagnosis_chart(diseases, probabilities, uncertainties)
-    symptoms_chart = create_symptoms_radar_chart(symptoms, symptom_values)
+    # Stored chart artifacts; diagnoses saved before artifacts existed get them now
+    artifacts = {artifact.kind: artifact for artifact in diagnosis.artifacts.all()}
+    if 'chart' not in artifacts or 'symptoms_chart' not in artifacts:
+        chart_keys = diagnosis_chart_keys(result, symptoms, symptom_values)
+        for artifact in save_artifacts(chart_artifacts(diagnosis, chart_keys)):
+            artifacts[artifact.kind] = artifact
+    diagnosis_chart = artifacts['chart'].content_hash
+    symptoms_chart = artifacts['symptoms_chart'].content_hash
 
     # Create a list of symptoms that are present
     present_symptoms = [
@@ -230,8 +270,9 @@ def diagnosis_detail(request, diagnosis_id):
         'confidence': result["confidence"] * 100,  # Convert to percentage
         'uncertainty': result["uncertainty"] * 100,  # Convert to percentage
         'present_symptoms': present_symptoms,
-        'diagnosis_chart': diagnosis_chart,
-        'symptoms_chart': symptoms_chart,
+        'diagnosis_chart_url': chart_url(diagnosis_chart),
+        'symptoms_chart_url': chart_url(symptoms_chart),
+        'feedback': diagnosis.feedback.first(),
         'page_title': f'Diagnosis: {diagnosis.primary_disease.name}'
     }
 
@@ -253,20 +294,18 @@ def submit_feedback(request):
 
         if diagnosis_id and request.user.is_authenticated:
             try:
-                diagnosis = Diagnosis.objects.get(id=diagnosis_id, user=request.user)
-
-                # Update diagnosis with feedback
-                feedback_data = {
-                    'accuracy_rating': form.cleaned_data['accuracy_rating'],
-                    'comments': form.cleaned_data['comments'],
-                    'submitted_at': timezone.now().isoformat()
-                }
-
-                # Update prediction data to include feedback
-                prediction_data = diagnosis.prediction_data
-                prediction_data['feedback'] = feedback_data
-                diagnosis.prediction_data = prediction_data
-                diagnosis.save()
+                # Only the columns the feedback rollup needs
+                diagnosis = Diagnosis.objects.only('id', 'primary_disease', 'model_version').get(
+                    id=diagnosis_id, user=request.user
+                )
+
+                # One new row per submission, added to the rating totals
+                record_feedback(
+                    diagnosis,
+                    form.cleaned_data['accuracy_rating'],
+                    form.cleaned_data['comments'],
+                    user=request.user
+                )
 
                 return JsonResponse({'status': 'success', 'message': 'Thank you for your feedback!'})
 
@@ -17,6 +17,7 @@ from .serializers import (
     InsuranceClaimSerializer
 )
 from django.db.models import Q, Sum
+from healthcare.pagination import CreatedAtPagination
 
 
 class IsAdminOrInsuranceStaff(permissions.BasePermission):
@@ -74,6 +75,7 @@ class PatientInsuranceViewSet(viewsets.ModelViewSet):
 
 class BillViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsPatientOrStaff]
+    pagination_class = CreatedAtPagination
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.8 on 2026-10-17 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['-created_at', '-id'], name='bill_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['patient', '-created_at', '-id'], name='bill_patient_created_idx'),
+        ),
+    ]
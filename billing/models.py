@@ -58,6 +58,13 @@ class Bill(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Staff list of all bills, and each patient's own bills
+            models.Index(fields=['-created_at', '-id'], name='bill_created_idx'),
+            models.Index(fields=['patient', '-created_at', '-id'], name='bill_patient_created_idx'),
+        ]
+
     def __str__(self):
         return f"Bill #{self.id} for {self.patient.username}"
 
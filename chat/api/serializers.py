@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from ..models import ChatRoom, Message, AIResponse
+from ..models import ChatRoom, ChatParticipant, Message, AIResponse
 from django.contrib.auth.models import User
 
 
@@ -51,8 +51,13 @@ class ChatRoomSerializer(serializers.ModelSerializer):
         return None
 
     def get_unread_count(self, obj):
+        # Annotated by ChatRoomViewSet; other callers read the membership row
+        if hasattr(obj, 'user_unread_count'):
+            return obj.user_unread_count or 0
         user = self.context.get('request').user
-        return obj.messages.filter(is_read=False).exclude(sender=user).count()
+        return ChatParticipant.objects.filter(chat_room=obj, user=user).values_list(
+            'unread_count', flat=True
+        ).first() or 0
 
 
 class ChatRoomCreateSerializer(serializers.ModelSerializer):
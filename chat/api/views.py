@@ -2,23 +2,57 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from ..models import ChatRoom, Message, AIResponse
+from ..models import ChatRoom, ChatParticipant, Message, AIResponse
 from .serializers import (
     ChatRoomSerializer,
     ChatRoomCreateSerializer,
     MessageSerializer,
     AIResponseSerializer
 )
-from django.db.models import Q, F, Max, Count
+from django.db import transaction
+from django.db.models import Q, F, Count, OuterRef, Subquery
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from ai_model.ml.prediction import get_diagnosis
+from healthcare.pagination import SentAtPagination
 import json
 import logging
+from collections import Counter
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 
+def mark_messages_read(messages):
+    """
+    Flag messages as read and take them off the unread counts of the room members
+
+    is_read is shared by everyone in the room, and unread_count is the number of
+    unread messages from others, so a message read by one member stops counting
+    for every member but its sender.
+
+    Args:
+        messages: Message queryset
+
+    Returns:
+        count: Number of messages that were unread
+    """
+    with transaction.atomic():
+        # Locked so a concurrent reader can't flip (and uncount) the same messages
+        flipped = list(
+            messages.filter(is_read=False).select_for_update().values_list('id', 'chat_room_id', 'sender_id')
+        )
+        if not flipped:
+            return 0
+        Message.objects.filter(pk__in=[pk for pk, _, _ in flipped]).update(is_read=True)
+        # One UPDATE per room and sender
+        for (chat_room_id, sender_id), count in Counter((room, sender) for _, room, sender in flipped).items():
+            ChatParticipant.objects.filter(chat_room_id=chat_room_id).exclude(user_id=sender_id).update(
+                unread_count=Greatest(F('unread_count') - count, 0)
+            )
+    return len(flipped)
+
+
 class IsChatParticipant(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         # Check if user is a participant in the chat room
@@ -42,23 +76,27 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
         return ChatRoomSerializer
 
     def get_queryset(self):
+        # Last message and unread count are stored on the room and the membership,
+        # so a page of rooms costs the same few queries however many there are
+        unread = ChatParticipant.objects.filter(chat_room=OuterRef('pk'), user=self.request.user)
         return ChatRoom.objects.filter(participants=self.request.user).annotate(
-            last_message_time=Max('messages__sent_at')
-        ).order_by(F('last_message_time').desc(nulls_last=True))
+            user_unread_count=Subquery(unread.values('unread_count')[:1])
+        ).select_related('last_message__sender').prefetch_related('participants').order_by(
+            F('last_message_at').desc(nulls_last=True), '-id'
+        )
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
         return context
 
-    @action(detail=True, methods=['get'])
+    @action(detail=True, methods=['get'], pagination_class=SentAtPagination)
     def messages(self, request, pk=None):
         chat_room = self.get_object()
         messages = chat_room.messages.all()
 
         # Mark messages as read
-        unread_messages = messages.filter(is_read=False).exclude(sender=request.user)
-        unread_messages.update(is_read=True)
+        mark_messages_read(messages.exclude(sender=request.user))
 
         # Paginate results
         page = self.paginate_queryset(messages)
@@ -249,8 +287,7 @@ class MessageViewSet(viewsets.ModelViewSet):
     def mark_read(self, request, pk=None):
         message = self.get_object()
 
-        if not message.is_read and message.sender != request.user:
-            message.is_read = True
-            message.save()
+        if message.sender != request.user:
+            mark_messages_read(Message.objects.filter(pk=message.pk))
 
         return Response({"status": "Message marked as read"})
\ No newline at end of file
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.8 on 2026-10-17 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat_room', 'sent_at', 'id'], name='message_room_sent_idx'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.8 on 2026-10-17 13:03
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    ChatParticipant = apps.get_model('chat', 'ChatParticipant')
+    Message = apps.get_model('chat', 'Message')
+
+    newest = Message.objects.filter(chat_room=OuterRef('pk')).order_by('-sent_at', '-id')
+    ChatRoom.objects.update(
+        last_message=Subquery(newest.values('id')[:1]),
+        last_message_at=Subquery(newest.values('sent_at')[:1])
+    )
+
+    # Unread as the room list used to count it: unread messages from someone else
+    for membership in ChatParticipant.objects.all().iterator():
+        unread = Message.objects.filter(chat_room_id=membership.chat_room_id, is_read=False).exclude(
+            sender_id=membership.user_id
+        ).count()
+        if unread:
+            ChatParticipant.objects.filter(pk=membership.pk).update(unread_count=unread)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chat', '0002_message_message_room_sent_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        # The table of the many-to-many field becomes the explicit through model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ChatParticipant',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('chat_room', models.ForeignKey(db_column='chatroom_id', on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='chat.chatroom')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_memberships', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'chat_chatroom_participants',
+                        'unique_together': {('chat_room', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='chatroom',
+                    name='participants',
+                    field=models.ManyToManyField(related_name='chat_rooms', through='chat.ChatParticipant', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chatparticipant',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
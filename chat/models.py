@@ -1,22 +1,48 @@
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from ai_model.models import Diagnosis
 
 
 class ChatRoom(models.Model):
-    participants = models.ManyToManyField(User, related_name='chat_rooms')
+    participants = models.ManyToManyField(User, through='ChatParticipant', related_name='chat_rooms')
     title = models.CharField(max_length=100, blank=True)
     is_ai_chat = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Kept up to date when messages are saved, so room lists don't query the messages
+    last_message = models.ForeignKey(
+        'Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True, db_index=True, editable=False)
 
     def __str__(self):
         return f"Chat {self.id}: {self.title or 'Untitled'}"
 
-    @property
-    def last_message(self):
-        return self.messages.order_by('-sent_at').first()
+
+class ChatParticipant(models.Model):
+    """
+    Membership of a user in a chat room, with the number of messages they haven't read
+
+    unread_count is the number of messages from others in the room that are not
+    read yet. Message.is_read is shared by the room, so once any member reads a
+    message it no longer counts for anyone.
+    """
+    # Columns of the table Django created for the former plain many-to-many field
+    chat_room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='memberships',
+                                  db_column='chatroom_id')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_memberships')
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'chat_chatroom_participants'
+        unique_together = [('chat_room', 'user')]
+
+    def __str__(self):
+        return f"{self.user} in {self.chat_room}"
 
 
 class Message(models.Model):
@@ -30,6 +56,10 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['sent_at']
+        indexes = [
+            # Message pages of a room: WHERE chat_room_id = ? ORDER BY sent_at, id
+            models.Index(fields=['chat_room', 'sent_at', 'id'], name='message_room_sent_idx'),
+        ]
 
     def __str__(self):
         if self.is_ai_message:
@@ -37,6 +67,49 @@ class Message(models.Model):
         return f"Message from {self.sender.username} in {self.chat_room}"
 
 
+@receiver(post_save, sender=Message)
+def update_room_on_message(sender, instance, created, raw=False, **kwargs):
+    """
+    Move the room's last message forward and add one to the unread count of everyone but the sender
+    """
+    if not created or raw:
+        return
+    # The sent_at guard keeps a slower concurrent save from moving last_message back
+    ChatRoom.objects.filter(
+        Q(last_message_at__isnull=True) | Q(last_message_at__lte=instance.sent_at),
+        pk=instance.chat_room_id
+    ).update(last_message=instance, last_message_at=instance.sent_at)
+    ChatParticipant.objects.filter(chat_room_id=instance.chat_room_id).exclude(
+        user_id=instance.sender_id
+    ).update(unread_count=F('unread_count') + 1)
+
+
+@receiver(post_delete, sender=Message)
+def update_room_on_message_delete(sender, instance, origin=None, **kwargs):
+    """
+    Undo what update_room_on_message did for a message that is deleted
+    """
+    # Nothing to keep up to date when the room itself is being deleted
+    if isinstance(origin, ChatRoom) or getattr(origin, 'model', None) is ChatRoom:
+        return
+
+    # SET_NULL has already cleared last_message if this was it; once the room points at
+    # a remaining message (or at none), later deletions in the same batch match no row
+    newest = Message.objects.filter(chat_room=models.OuterRef('pk')).order_by('-sent_at', '-id')
+    ChatRoom.objects.filter(
+        pk=instance.chat_room_id, last_message__isnull=True, last_message_at=instance.sent_at
+    ).update(
+        last_message=models.Subquery(newest.values('id')[:1]),
+        last_message_at=models.Subquery(newest.values('sent_at')[:1])
+    )
+
+    # An unread message was counted for everyone but its sender
+    if not instance.is_read:
+        ChatParticipant.objects.filter(chat_room_id=instance.chat_room_id, unread_count__gt=0).exclude(
+            user_id=instance.sender_id
+        ).update(unread_count=F('unread_count') - 1)
+
+
 class AIResponse(models.Model):
     query = models.TextField()
     response = models.TextField()
@@ -1,3 +1,103 @@
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .models import ChatParticipant, ChatRoom, Message
+
+
+class RoomCounterTests(TestCase):
+    """
+    Last message and unread counts follow messages that are deleted
+    """
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+
+    def _room(self, n_messages):
+        room = ChatRoom.objects.create(title='test')
+        room.participants.add(self.alice, self.bob)
+        for i in range(n_messages):
+            Message.objects.create(chat_room=room, sender=self.bob, content=f'message {i}')
+        return room
+
+    def _unread(self, room, user):
+        return ChatParticipant.objects.get(chat_room=room, user=user).unread_count
+
+    def test_delete_last_and_unread_messages(self):
+        room = self._room(3)
+        first, second, last = room.messages.order_by('sent_at', 'id')
+        self.assertEqual(self._unread(room, self.alice), 3)
+
+        last.delete()
+        room.refresh_from_db()
+        self.assertEqual(room.last_message, second)
+        self.assertEqual(room.last_message_at, second.sent_at)
+        self.assertEqual(self._unread(room, self.alice), 2)
+        self.assertEqual(self._unread(room, self.bob), 0)
+
+        # Read messages were not counted, and counts never go below zero
+        Message.objects.filter(pk=first.pk).update(is_read=True)
+        ChatParticipant.objects.filter(chat_room=room, user=self.alice).update(unread_count=0)
+        room.messages.all().delete()
+        room.refresh_from_db()
+        self.assertIsNone(room.last_message)
+        self.assertIsNone(room.last_message_at)
+        self.assertEqual(self._unread(room, self.alice), 0)
+
+    def test_room_delete_queries_do_not_grow_with_messages(self):
+        counts = []
+        for n_messages in (2, 20):
+            room = self._room(n_messages)
+            with CaptureQueriesContext(connection) as queries:
+                room.delete()
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse(Message.objects.exists())
+
+
+class GroupUnreadTests(TestCase):
+    """
+    A message read by one member stops counting as unread for every member but its sender
+    """
+
+    def setUp(self):
+        self.alice, self.bob, self.carol = (User.objects.create_user(name) for name in ('alice', 'bob', 'carol'))
+        self.room = ChatRoom.objects.create(title='group')
+        self.room.participants.add(self.alice, self.bob, self.carol)
+
+    def _counts(self):
+        counts = dict(ChatParticipant.objects.filter(chat_room=self.room).values_list('user__username', 'unread_count'))
+        # Always the same as counting the unread messages from others
+        for user in (self.alice, self.bob, self.carol):
+            expected = self.room.messages.filter(is_read=False).exclude(sender=user).count()
+            self.assertEqual(counts[user.username], expected, user.username)
+        return counts
+
+    def _client(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_reading_messages(self):
+        for sender in (self.bob, self.bob, self.carol):
+            Message.objects.create(chat_room=self.room, sender=sender, content='hello')
+        self.assertEqual(self._counts(), {'alice': 3, 'bob': 1, 'carol': 2})
+
+        response = self._client(self.alice).get(f'/api/v1/chat/rooms/{self.room.pk}/messages/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._counts(), {'alice': 0, 'bob': 0, 'carol': 0})
+
+    def test_mark_read(self):
+        message = Message.objects.create(chat_room=self.room, sender=self.bob, content='hello')
+        Message.objects.create(chat_room=self.room, sender=self.alice, content='hi')
+        self.assertEqual(self._counts(), {'alice': 1, 'bob': 1, 'carol': 2})
+
+        client = self._client(self.carol)
+        for _ in range(2):
+            response = client.post(f'/api/v1/chat/messages/{message.pk}/mark_read/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self._counts(), {'alice': 0, 'bob': 1, 'carol': 1})
 
-# Create your tests here.
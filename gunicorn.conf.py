@@ -0,0 +1,18 @@
+# gunicorn.conf.py
+# Picked up automatically by `gunicorn healthcare.wsgi` when run from the project root.
+
+
+def when_ready(server):
+    # With --preload the Django app is already loaded in the master; warm up the model
+    # once before the workers are forked when AI_MODEL_WARMUP = 'master'
+    if not server.cfg.preload_app:
+        return
+    from ai_model.ml.warmup import warm_up_if_enabled
+    warm_up_if_enabled('master')
+
+
+def post_worker_init(worker):
+    # The Django app is loaded at this point; warm up the model in each worker
+    # when AI_MODEL_WARMUP = 'worker'
+    from ai_model.ml.warmup import warm_up_if_enabled
+    warm_up_if_enabled('worker')
@@ -0,0 +1,164 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Files under these prefixes are named by a hash of their content
+CONTENT_ADDRESSED_PREFIXES = ('audio/', 'charts/')
+# Name of a content-addressed file (SHA-256 digest). Older files under the same
+# prefixes (diagnosis_<id>_<time>.png, diagnosis_<disease>.mp3) can change in place.
+CONTENT_HASH_NAME_RE = re.compile(r'^[0-9a-f]{64}\.[A-Za-z0-9]+$')
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _is_content_addressed(path):
+    prefixes = getattr(settings, 'MEDIA_CONTENT_ADDRESSED_PREFIXES', CONTENT_ADDRESSED_PREFIXES)
+    return path.startswith(tuple(prefixes)) and CONTENT_HASH_NAME_RE.match(os.path.basename(path)) is not None
+
+
+def _etag(path, stat_result):
+    if _is_content_addressed(path):
+        return f'"{os.path.splitext(os.path.basename(path))[0]}"'
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def _parse_range(header, size):
+    """
+    Byte range of a single-range Range header
+
+    Returns:
+        range: (start, end) with end inclusive, None to serve the whole file
+            (missing, malformed or multi-range header), or False if the range
+            can't be satisfied
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+
+    start, end = match.groups()
+    if not start:
+        # Suffix range: the last N bytes
+        if not end:
+            return None
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def _read_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _set_cache_headers(response, path, etag, stat_result):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat_result.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    if _is_content_addressed(path):
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=getattr(settings, 'MEDIA_CONTENT_ADDRESSED_MAX_AGE', 31536000),
+            immutable=True
+        )
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file from MEDIA_ROOT with conditional GET and byte-range support
+
+    Full responses go through FileResponse, so the WSGI server can use
+    sendfile. With MEDIA_ACCEL_REDIRECT_PREFIX set, the file itself is left to
+    nginx via X-Accel-Redirect (nginx then handles ranges too).
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("File not found")
+
+    try:
+        stat_result = os.stat(full_path)
+    except OSError:
+        raise Http404("File not found")
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404("File not found")
+
+    etag = _etag(path, stat_result)
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+            return _set_cache_headers(HttpResponseNotModified(), path, etag, stat_result)
+    elif not was_modified_since(request.headers.get('If-Modified-Since'), stat_result.st_mtime):
+        return _set_cache_headers(HttpResponseNotModified(), path, etag, stat_result)
+
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', None)
+    if accel_prefix:
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + path.lstrip('/')
+        # Let nginx pick the content type from the file
+        del response['Content-Type']
+        return _set_cache_headers(response, path, etag, stat_result)
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    size = stat_result.st_size
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (if_range is None or if_range.strip() == etag):
+        byte_range = _parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return _set_cache_headers(response, path, etag, stat_result)
+
+    if byte_range is None:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _read_range(open(full_path, 'rb'), start, length),
+            status=206,
+            content_type=content_type
+        )
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return _set_cache_headers(response, path, etag, stat_result)
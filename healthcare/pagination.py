@@ -0,0 +1,134 @@
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over a (timestamp, id) ordering.
+
+    The cursor holds every ordering column of the row it points at, and pages
+    are read with WHERE (created_at, id) < (...) (spelled out with OR, as
+    created_at < t OR (created_at = t AND id < i)) instead of COUNT(*) and
+    OFFSET. Rows sharing a timestamp are told apart by id, so no offset is
+    needed for ties, and deep pages cost the same as the first one when a
+    matching index exists. Responses have next/previous cursor links and no count.
+
+    While API_PAGE_NUMBER_COMPAT is on, clients get the page-number format
+    unless they opt in with ?cursor= (empty for the first page) or an
+    ``X-Pagination: cursor`` header; the next/previous links keep the cursor.
+    API_CURSOR_PAGINATION = False turns cursor pagination off everywhere.
+    """
+    ordering = ('-created_at', '-id')
+    legacy_pagination_class = PageNumberPagination
+    cursor_header = 'X-Pagination'
+    _legacy = None
+
+    def use_legacy(self, request):
+        """
+        Whether this request gets page-number pagination
+        """
+        if not getattr(settings, 'API_CURSOR_PAGINATION', True):
+            return True
+        if not getattr(settings, 'API_PAGE_NUMBER_COMPAT', True):
+            return False
+        opted_in = (self.cursor_query_param in request.query_params
+                    or request.headers.get(self.cursor_header, '').lower() == 'cursor')
+        return not opted_in
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_legacy(request):
+            self._legacy = self.legacy_pagination_class()
+            return self._legacy.paginate_queryset(queryset.order_by(*self.ordering), request, view)
+        self._legacy = None
+
+        # Filter on every ordering column here; CursorPagination itself would
+        # compare the first one only and step over ties with an offset
+        cursor = super().decode_cursor(request)
+        position = cursor.position if cursor is not None else None
+        if position is not None:
+            ordering = self.get_ordering(request, queryset, view)
+            values = self._decode_position(position, ordering)
+            try:
+                queryset = queryset.filter(self._after(ordering, values, cursor.reverse))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+
+        page = super().paginate_queryset(queryset, request, view)
+
+        # decode_cursor hid the position from CursorPagination, so restore the
+        # link back to where this page started
+        if page is not None and position is not None:
+            if cursor.reverse:
+                self.has_next, self.next_position = True, position
+            else:
+                self.has_previous, self.previous_position = True, position
+            self.display_page_controls = self.template is not None
+        return page
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None:
+            return None
+        # Already applied by paginate_queryset
+        return cursor._replace(position=None)
+
+    def _after(self, ordering, values, reverse):
+        """
+        Rows past the cursor position in the direction of the page
+
+        For ('-created_at', '-id') going forward this is
+        created_at <= t AND (created_at < t OR (created_at = t AND id < i));
+        the leading bound lets the database range-scan the index.
+        """
+        condition = Q()
+        equal = {}
+        for order, value in zip(ordering, values):
+            attr = order.lstrip('-')
+            lookup = '__lt' if order.startswith('-') != reverse else '__gt'
+            condition |= Q(**equal, **{attr + lookup: value})
+            equal[attr] = value
+        first = ordering[0].lstrip('-')
+        bound = '__lte' if ordering[0].startswith('-') != reverse else '__gte'
+        return Q(**{first + bound: values[0]}) & condition
+
+    def _decode_position(self, position, ordering):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            attr = order.lstrip('-')
+            value = instance[attr] if isinstance(instance, dict) else getattr(instance, attr)
+            values.append(str(value))
+        return json.dumps(values, separators=(',', ':'))
+
+    def get_paginated_response(self, data):
+        if self._legacy is not None:
+            return self._legacy.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self._legacy is not None:
+            return self._legacy.to_html()
+        return super().to_html()
+
+
+class CreatedAtPagination(KeysetPagination):
+    """Newest first, by (created_at, id)"""
+    ordering = ('-created_at', '-id')
+
+
+class SentAtPagination(KeysetPagination):
+    """Oldest first, by (sent_at, id), the order chat messages are shown in"""
+    ordering = ('sent_at', 'id')
@@ -0,0 +1,57 @@
+import threading
+
+
+class LazySchemaView:
+    """
+    drf_yasg schema view that is only built on the first documentation request.
+
+    get_schema_view pulls in the whole drf_yasg generator stack, which every
+    worker would otherwise pay for when the URLconf is imported.
+    """
+
+    def __init__(self, title, default_version, description, terms_of_service,
+                 contact_email, license_name, public=True):
+        self._info = {
+            'title': title,
+            'default_version': default_version,
+            'description': description,
+            'terms_of_service': terms_of_service,
+        }
+        self._contact_email = contact_email
+        self._license_name = license_name
+        self._public = public
+        self._schema_view = None
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def _get_schema_view(self):
+        if self._schema_view is None:
+            with self._lock:
+                if self._schema_view is None:
+                    from drf_yasg.views import get_schema_view
+                    from drf_yasg import openapi
+                    from rest_framework import permissions
+
+                    self._schema_view = get_schema_view(
+                        openapi.Info(
+                            contact=openapi.Contact(email=self._contact_email),
+                            license=openapi.License(name=self._license_name),
+                            **self._info
+                        ),
+                        public=self._public,
+                        permission_classes=[permissions.AllowAny],
+                    )
+        return self._schema_view
+
+    def with_ui(self, renderer='swagger', cache_timeout=0):
+        """
+        Same as drf_yasg's schema_view.with_ui, resolved on first call
+        """
+        key = (renderer, cache_timeout)
+
+        def view(request, *args, **kwargs):
+            if key not in self._views:
+                self._views[key] = self._get_schema_view().with_ui(renderer, cache_timeout=cache_timeout)
+            return self._views[key](request, *args, **kwargs)
+
+        return view
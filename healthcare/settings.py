@@ -11,10 +11,20 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = 'django-insecure-your-secret-key-here'
 
+# Shared by every worker process on the host (sessions, diagnosis result cache)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    }
+}
+
 # Cấu hình Session
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Sessions are read from the cache and written (to the cache and the database) only
+# when they change, so page views that don't touch the session write nothing
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 SESSION_COOKIE_AGE = 86400  # 1 day in seconds
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_SAVE_EVERY_REQUEST = False
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
@@ -172,6 +182,12 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Serve MEDIA_ROOT from Django (with Range and ETag support). Set
+# MEDIA_ACCEL_REDIRECT_PREFIX to an nginx `internal` location aliased to MEDIA_ROOT
+# (e.g. '/protected-media/') to hand the file transfer to nginx instead.
+MEDIA_SERVE = DEBUG
+MEDIA_ACCEL_REDIRECT_PREFIX = None
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -186,3 +202,94 @@ LOGIN_URL = 'users:login'
 # AI Model settings
 AI_MODEL_PATH = os.path.join(BASE_DIR, 'ai_model', 'ml', 'saved_models')
 
+# Seconds between checks of the model files for changes (hot reload)
+AI_MODEL_REGISTRY_CHECK_INTERVAL = 1.0
+
+# Monte Carlo dropout: samples per prediction and max rows per forward pass
+# (None runs all samples in a single pass)
+AI_MODEL_MC_ITERATIONS = 100
+AI_MODEL_MC_CHUNK_SIZE = None
+
+# Inference engine: 'keras' (TensorFlow), 'numpy' (exported weights, no TensorFlow import)
+# or 'quantized' (NumPy engine with AI_MODEL_QUANTIZATION weights)
+AI_MODEL_ENGINE = 'keras'
+
+# Weight format of the 'quantized' engine: 'int8' (per-column scales) or 'float16'
+AI_MODEL_QUANTIZATION = 'int8'
+
+# Serve binary symptom vectors from a precomputed table of all 2^n inputs,
+# built once per model version with seeded dropout masks
+AI_MODEL_LOOKUP_TABLE = False
+AI_MODEL_LOOKUP_SEED = 0
+
+# Micro-batching: concurrent get_diagnosis calls in one process share a forward pass
+AI_MODEL_BATCHING = False
+AI_MODEL_BATCH_MAX_SIZE = 32
+AI_MODEL_BATCH_MAX_WAIT_MS = 5
+
+# Batch diagnose API: max symptom lists per request and lists per forward pass
+AI_MODEL_BATCH_API_MAX_ITEMS = 1000
+AI_MODEL_BATCH_API_CHUNK_SIZE = 64
+
+# Adaptive MC dropout: draw AI_MODEL_MC_BLOCK_SIZE samples at a time and stop once the
+# standard error of the top class is below AI_MODEL_MC_TOLERANCE (after at least
+# AI_MODEL_MC_MIN_SAMPLES, at most AI_MODEL_MC_ITERATIONS samples)
+AI_MODEL_MC_ADAPTIVE = False
+AI_MODEL_MC_TOLERANCE = 0.01
+AI_MODEL_MC_MIN_SAMPLES = 20
+AI_MODEL_MC_BLOCK_SIZE = 10
+
+# Run the dropout-enabled forward pass of the Keras engine as a traced tf.function
+AI_MODEL_COMPILE_FORWARD = True
+
+# Model warm-up, run from the hooks in gunicorn.conf.py (never by runserver or management
+# commands): None (off), 'master' (once in the gunicorn master before the workers fork;
+# needs --preload) or 'worker' (in every worker). TensorFlow does not survive fork well,
+# so use 'master' with the NumPy engines only.
+AI_MODEL_WARMUP = None
+
+# Chart store: rendered charts are kept under MEDIA_ROOT/charts by a hash of the plotted
+# data, with the most recent AI_MODEL_CHART_CACHE_SIZE images also held in memory
+AI_MODEL_CHART_CACHE_SIZE = 256
+AI_MODEL_CHART_MAX_AGE = 60 * 60 * 24 * 365
+
+# Charts are rendered by AI_MODEL_CHART_RENDER_WORKERS background processes (0 renders in
+# the request thread), with at most AI_MODEL_CHART_RENDER_QUEUE renders queued per worker.
+# A chart URL requested before its render is done waits up to AI_MODEL_CHART_RENDER_TIMEOUT s.
+AI_MODEL_CHART_RENDER_WORKERS = 2
+AI_MODEL_CHART_RENDER_QUEUE = 64
+AI_MODEL_CHART_RENDER_TIMEOUT = 10.0
+
+# Text-to-speech for the diagnosis audio: 'gtts' (Google, needs network access), 'pyttsx3'
+# (offline system voice, needs espeak on Linux) or 'silent' (stand-in for development).
+# Files are cached under MEDIA_ROOT/audio by a hash of the spoken text; with
+# AI_MODEL_TTS_ASYNC they are synthesized on a background thread.
+# `manage.py pregenerate_audio` fills the cache.
+AI_MODEL_TTS_BACKEND = 'gtts'
+AI_MODEL_TTS_LANGUAGE = 'en'
+AI_MODEL_TTS_ASYNC = True
+
+# Symptom/disease ids are cached per process; saves in this process invalidate the cache,
+# other workers pick up renamed or deleted rows after AI_MODEL_CATALOG_TTL seconds
+AI_MODEL_CATALOG_TTL = 300
+
+# Diagnosis probabilities and uncertainties are stored as packed 'float16' or 'float32'
+# arrays next to a ModelVersion row holding the disease names and recommendations
+AI_MODEL_PREDICTION_DTYPE = 'float16'
+
+# Diagnosis history, chat messages, notifications and bills are paged by cursor over
+# (created_at, id) / (sent_at, id) instead of COUNT(*) + OFFSET. With
+# API_PAGE_NUMBER_COMPAT, only clients that opt in with ?cursor= or an
+# "X-Pagination: cursor" header get cursor pages; the rest keep the page-number format.
+API_CURSOR_PAGINATION = True
+API_PAGE_NUMBER_COMPAT = True
+
+# Result pages of anonymous diagnoses are kept in this cache for AI_MODEL_RESULT_CACHE_TIMEOUT
+# seconds and referenced by a signed token in the URL instead of the session
+AI_MODEL_RESULT_CACHE = 'default'
+AI_MODEL_RESULT_CACHE_TIMEOUT = 60 * 60
+
+# Diagnosis trend API (/api/v1/diagnosis-stats/): default and largest date window in days.
+# The rollup it reads is rebuilt with `manage.py backfill_diagnosis_stats`.
+AI_MODEL_STATS_DEFAULT_DAYS = 30
+AI_MODEL_STATS_MAX_DAYS = 366
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import re_path
+from django.utils.http import http_date
+
+from .media import serve_media
+
+urlpatterns = [
+    re_path(r'^media/(?P<path>.*)$', serve_media),
+]
+
+CHART_NAME = 'charts/' + 'ab' * 32 + '.png'
+CONTENT = bytes(range(256)) * 4
+
+
+@override_settings(ROOT_URLCONF=__name__, MEDIA_ACCEL_REDIRECT_PREFIX=None)
+class ServeMediaTests(SimpleTestCase):
+    """
+    Media files are served with byte ranges, validators and the right cache headers
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.root, 'charts'))
+        for name in (CHART_NAME, 'notes.txt'):
+            with open(os.path.join(self.root, name), 'wb') as f:
+                f.write(CONTENT)
+        settings_override = override_settings(MEDIA_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _get(self, path, **headers):
+        response = self.client.get('/media/' + path, headers=headers)
+        self.addCleanup(response.close)
+        return response
+
+    def test_full_file(self):
+        response = self._get('notes.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_range(self):
+        response = self._get('notes.txt', Range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(CONTENT)}')
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[10:20])
+
+        response = self._get('notes.txt', Range='bytes=-5')
+        self.assertEqual(response['Content-Range'], f'bytes {len(CONTENT) - 5}-{len(CONTENT) - 1}/{len(CONTENT)}')
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[-5:])
+
+    def test_unsatisfiable_range(self):
+        response = self._get('notes.txt', Range=f'bytes={len(CONTENT)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_if_range(self):
+        etag = self._get('notes.txt')['ETag']
+        response = self._get('notes.txt', Range='bytes=0-9', If_Range=etag)
+        self.assertEqual(response.status_code, 206)
+
+        # A changed file is sent whole
+        response = self._get('notes.txt', Range='bytes=0-9', If_Range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+
+    def test_not_modified(self):
+        response = self._get(CHART_NAME)
+        self.assertEqual(response['ETag'], '"' + 'ab' * 32 + '"')
+
+        response = self._get(CHART_NAME, If_None_Match=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        mtime = os.stat(os.path.join(self.root, 'notes.txt')).st_mtime
+        response = self._get('notes.txt', If_Modified_Since=http_date(mtime + 60))
+        self.assertEqual(response.status_code, 304)
+        response = self._get('notes.txt', If_Modified_Since=http_date(mtime - 60))
+        self.assertEqual(response.status_code, 200)
+
+    def test_cache_headers(self):
+        cache_control = self._get(CHART_NAME)['Cache-Control']
+        self.assertIn('immutable', cache_control)
+        self.assertIn('max-age=31536000', cache_control)
+
+        # Files that are not named by their content are revalidated
+        self.assertEqual(self._get('notes.txt')['Cache-Control'], 'no-cache')
+        with open(os.path.join(self.root, 'charts', 'diagnosis_1.png'), 'wb') as f:
+            f.write(CONTENT)
+        self.assertEqual(self._get('charts/diagnosis_1.png')['Cache-Control'], 'no-cache')
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect(self):
+        response = self._get(CHART_NAME)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + CHART_NAME)
+        self.assertNotIn('Content-Type', response)
+        self.assertEqual(response.content, b'')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_missing_and_outside_files(self):
+        for path in ('missing.txt', 'charts', '../settings.py', '%2e%2e/settings.py', '/etc/passwd'):
+            with self.subTest(path=path):
+                self.assertEqual(self._get(path).status_code, 404)
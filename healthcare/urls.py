@@ -1,30 +1,26 @@
 # healthcare/urls.py
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
     TokenVerifyView,
 )
 from rest_framework.documentation import include_docs_urls
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework import permissions
-
-# API Documentation
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Healthcare API",
-        default_version='v1',
-        description="API documentation for the Healthcare System",
-        terms_of_service="https://www.example.com/policies/terms/",
-        contact=openapi.Contact(email="contact@healthcare.example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
+from .schema import LazySchemaView
+from .media import serve_media
+
+# API Documentation (drf_yasg is only imported when the docs are requested)
+schema_view = LazySchemaView(
+    title="Healthcare API",
+    default_version='v1',
+    description="API documentation for the Healthcare System",
+    terms_of_service="https://www.example.com/policies/terms/",
+    contact_email="contact@healthcare.example.com",
+    license_name="BSD License",
 )
 
 urlpatterns = [
@@ -54,5 +50,7 @@ urlpatterns = [
     #path('api/redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+if getattr(settings, 'MEDIA_SERVE', settings.DEBUG):
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+    ]
\ No newline at end of file
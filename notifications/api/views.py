@@ -4,11 +4,13 @@ from rest_framework.response import Response
 from ..models import Notification
 from .serializers import NotificationSerializer
 from django.db.models import Q
+from healthcare.pagination import CreatedAtPagination
 
 
 class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtPagination
 
     def get_queryset(self):
         return Notification.objects.filter(recipient=self.request.user)
@@ -24,6 +24,9 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_recipient_idx'),
+        ]
 
     def __str__(self):
         return f"{self.type} notification for {self.recipient.username}: {self.title}"
\ No newline at end of file